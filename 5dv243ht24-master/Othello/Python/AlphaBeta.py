@@ -1,9 +1,17 @@
 import numpy as np
 import time
-import hashlib
 from OthelloAlgorithm import OthelloAlgorithm
 from CountingEvaluator import CountingEvaluator
 from OthelloAction import OthelloAction
+from TranspositionTable import TranspositionTable, EXACT, LOWER, UPPER
+from MoveOrderer import MoveOrderer
+from TimeManager import TimeManager
+from EndgameSolver import EndgameSolver
+import Symmetry
+from SearchStats import MAX_DEPTH, TIME, STOPPED, TIME_BUDGET, ENDGAME_SOLVED
+from logger_config import get_logger, HotPathLogger
+
+_iteration_log = HotPathLogger(get_logger('search'), max_per_second=20)
 
 class AlphaBeta(OthelloAlgorithm):
     """
@@ -11,13 +19,27 @@ class AlphaBeta(OthelloAlgorithm):
     Returns both the updated board state and the best move string.
     """
     OthelloAlgorithm.DefaultDepth = 3
+    ENDGAME_TIME_SHARE = 0.5  # Part of the time the endgame solver may use before the normal search takes over
+    MAX_SEARCH_DEPTH = 60     # Deeper than any game goes: with this depth only the time limit ends the search
 
-    def __init__(self, search_depth=5, evaluator=None):
+    def __init__(self, search_depth=5, evaluator=None, make_unmake=False, verify_keys=False, tt_size_mb=16,
+                 batch_leaves=False, endgame_empties=12, endgame_wld=False, canonical_keys=False, stats=None):
         self.search_depth = search_depth
         self.evaluator = evaluator if evaluator else CountingEvaluator()
-        self.transposition_table = {}  # Initialize the transposition table
-        self.start_time = None         # Track start time as a class-level variable
-        self.time_limit = None         # Track time limit as a class-level variable
+        self.make_unmake = make_unmake  # Walk the tree with apply_move/undo_move instead of cloning positions
+        self.verify_keys = verify_keys  # Debug mode: recompute every Zobrist key from scratch and compare
+        self.batch_leaves = batch_leaves  # Score all children of depth 1 nodes with one evaluate_batch call
+        self.canonical_keys = canonical_keys  # Share table entries between rotations and reflections of a board
+        self.transposition_table = TranspositionTable(tt_size_mb)  # Fixed-size table, kept between moves
+        self.move_orderer = MoveOrderer()  # Killer moves and history, kept between iterations
+        self.endgame_empties = endgame_empties  # Solve positions with this many empty squares or fewer exactly
+        self.endgame_solver = EndgameSolver(wld=endgame_wld)
+        self.endgame_score = None      # Final disc differential for the side to move, if the solver finished
+        self.root_depth = 0            # Depth of the current iteration, to know the ply of a node
+        self.time_manager = TimeManager()  # Deadline, time checks and the decision to start an iteration
+        self.completed_depth = 0       # Depth of the last iteration that finished
+        self.nodes = 0                 # Nodes visited since the last new_search
+        self.stats = stats             # Optional SearchStats, None when statistics are off
 
     def set_evaluator(self, AdvancedEvaluator):
         self.evaluator = AdvancedEvaluator  # Set a different evaluator
@@ -26,16 +48,137 @@ class AlphaBeta(OthelloAlgorithm):
         self.search_depth = depth  # Adjust the search depth for the algorithm
 
     def board_hash(self, position):
-        """Generate a hash for the board position to store in the transposition table."""
-        return hashlib.md5(position.board.tobytes()).hexdigest()
+        """
+        Return the key of the position (board and side to move) for the transposition table.
+        With canonical keys, the 8 symmetric positions share one key and their moves are stored in the canonical
+        orientation. This costs a key computation per node instead of the incrementally updated Zobrist key.
+        :return: A tuple (key, symmetry), the symmetry turning the position into the orientation of the key.
+        """
+        if self.canonical_keys:
+            return position.canonical_key()
+        if self.verify_keys and position.zobrist_key != position.compute_zobrist_key():
+            raise ValueError(f"Zobrist key out of sync for position {position.get_board_string()}")
+        return position.zobrist_key, 0
+
+    def probe(self, board_key, symmetry):
+        """Look up a position in the transposition table, with the best move mapped back to the position."""
+        cached_value = self.transposition_table.probe(board_key)
+        if cached_value is not None and symmetry:
+            cached_score, cached_depth, cached_move, cached_bound = cached_value
+            cached_value = cached_score, cached_depth, Symmetry.from_canonical(cached_move, symmetry), cached_bound
+        return cached_value
+
+    def store(self, board_key, symmetry, depth, score, bound, best_move):
+        """Store a position in the transposition table, with the best move in the orientation of the key."""
+        self.transposition_table.store(board_key, depth, score, bound, Symmetry.transform_action(best_move, symmetry))
+
+    @property
+    def start_time(self):
+        return self.time_manager.start_time
+
+    @property
+    def time_limit(self):
+        return self.time_manager.time_limit
+
+    @property
+    def deadline(self):
+        return self.time_manager.deadline
+
+    @property
+    def stop_requested(self):
+        return self.time_manager.stop_requested
+
+    def start_clock(self, time_limit, start_time=None):
+        """
+        Start the time limit of a search. A search that is already running picks up the new deadline, which
+        is how a ponder search continues as the real search.
+        :param start_time: When the time started counting, in time.monotonic() seconds, if not now (e.g. in
+            another process).
+        """
+        self.time_manager.start(time_limit, start_time)
+
+    def stop(self):
+        """Ask a running search to stop as soon as possible."""
+        self.time_manager.stop()
 
     def time_exceeded(self):
-        """Check if the time limit has been exceeded."""
-        return time.time() - self.start_time > self.time_limit - 0.1  # Safety margin of 0.1s
+        """Check if the time limit has been exceeded. The clock is only read every few calls."""
+        return self.time_manager.time_exceeded()
+
+    def endgame_time_exceeded(self):
+        """Check if the endgame solver has used up its share of the time. The deadline may move while it runs."""
+        start_time, deadline = self.start_time, self.deadline
+        return self.stop_requested or (
+            time.monotonic() > start_time + (deadline - start_time) * self.ENDGAME_TIME_SHARE)
+
+    def solve_endgame(self, position):
+        """
+        Solve the position exactly if few enough squares are empty and the solver finishes in its time.
+        :return: The best move, or None if the position was not solved.
+        """
+        self.endgame_score = None
+        white, black = position.get_bitboards()
+        if 64 - (white | black).bit_count() > self.endgame_empties:
+            return None
+        result = self.endgame_solver.solve(position, self.endgame_time_exceeded)
+        if result is None:
+            return None
+        self.endgame_score, move = result
+        return move
 
     def quick_evaluate(self, position):
         """A simpler evaluation function used for faster evaluation in deeper levels."""
-        return np.count_nonzero(position.board == 'W') - np.count_nonzero(position.board == 'B')
+        white_discs, black_discs = position.disc_counts()
+        return white_discs - black_discs
+
+    def new_search(self):
+        """Prepare the tables for the search of a new position."""
+        self.transposition_table.new_search()  # Age the entries of earlier moves
+        self.move_orderer.new_search()
+        self.time_manager.new_search()
+        self.nodes = 0
+
+    def search_child(self, position, move, depth, alpha, beta, maximizing_player):
+        """
+        Search the position after a move. In make/unmake mode the move is applied to the position itself
+        and taken back afterwards, so no new position is allocated.
+        """
+        if self.make_unmake:
+            position.apply_move(move)
+            result = self.alpha_beta(position, depth, alpha, beta, maximizing_player)
+            position.undo_move()
+            return result
+        return self.alpha_beta(position.make_move(move), depth, alpha, beta, maximizing_player)
+
+    def store_result(self, board_key, symmetry, depth, score, alpha, beta, best_move):
+        """
+        Store a search result in the transposition table. A score outside the (alpha, beta) window is only
+        a bound on the true value of the position.
+        """
+        if score <= alpha:
+            bound = UPPER
+        elif score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.store(board_key, symmetry, depth, score, bound, best_move)
+
+    def batch_leaf_search(self, position, legal_moves, board_key, symmetry, ply, alpha, beta, maximizing_player):
+        """
+        Search a node of depth 1 by evaluating all its children in one batch. The children are all leaves,
+        so this finds the same value as searching them one by one.
+        """
+        children = [position.make_move(move) for move in legal_moves]
+        if self.stats is None:
+            scores = self.evaluator.evaluate_batch(children)
+        else:
+            scores = self.stats.evaluate(self.evaluator.evaluate_batch, children, len(children))
+        best_index = int(np.argmax(scores)) if maximizing_player else int(np.argmin(scores))
+        best_score, best_move = int(scores[best_index]), legal_moves[best_index]
+        if best_score >= beta if maximizing_player else best_score <= alpha:
+            self.move_orderer.record_cutoff(best_move, ply, 1, maximizing_player)
+        self.store_result(board_key, symmetry, 1, best_score, alpha, beta, best_move)
+        return best_score, best_move
 
     def alpha_beta(self, position, depth, alpha, beta, maximizing_player):
         """
@@ -44,100 +187,158 @@ class AlphaBeta(OthelloAlgorithm):
         # Frequent time check at each recursion level
         if self.time_exceeded():
             return None, None
-        
+        self.nodes += 1
+
         # Generate a unique hash for the current board state
-        board_key = self.board_hash(position)
+        board_key, symmetry = self.board_hash(position)
 
         # Check if the board state is already in the transposition table
-        if board_key in self.transposition_table:
-            cached_value = self.transposition_table[board_key]
-            if cached_value['depth'] >= depth:  # Use cached value only if it's from a deeper or equal search
-                return cached_value['score'], cached_value['move']
+        cached_value = self.probe(board_key, symmetry)
+        tt_move = None
+        if cached_value is not None:
+            cached_score, cached_depth, cached_move, cached_bound = cached_value
+            tt_move = cached_move  # Searched first whatever the depth of the entry
+            if self.stats is not None:
+                self.stats.tt_hits += 1
+            if cached_depth >= depth:  # Use cached value only if it's from a deeper or equal search
+                if cached_bound == LOWER:
+                    alpha = max(alpha, cached_score)
+                elif cached_bound == UPPER:
+                    beta = min(beta, cached_score)
+                if cached_bound == EXACT or beta <= alpha:
+                    if self.stats is not None:
+                        self.stats.tt_cutoffs += 1
+                    return cached_score, cached_move
 
         # Terminal or depth condition
         if depth == 0 or position.is_game_over():
             # Use simpler evaluation if depth is deeper to save time
-            eval_score = self.quick_evaluate(position) if depth > 2 else self.evaluator.evaluate(position)
-            self.transposition_table[board_key] = {'score': eval_score, 'move': None, 'depth': depth}
+            evaluate = self.quick_evaluate if depth > 2 else self.evaluator.evaluate
+            eval_score = evaluate(position) if self.stats is None else self.stats.evaluate(evaluate, position)
+            self.store(board_key, symmetry, depth, eval_score, EXACT, None)
             return eval_score, None
 
         legal_moves = position.get_moves()
         if not legal_moves:  # No legal moves available
             eval_score = self.quick_evaluate(position)
-            self.transposition_table[board_key] = {'score': eval_score, 'move': OthelloAction(0, 0, is_pass_move=True), 'depth': depth}
+            self.store(board_key, symmetry, depth, eval_score, EXACT, OthelloAction(0, 0, is_pass_move=True))
             return eval_score, OthelloAction(0, 0, is_pass_move=True)
 
-        # Prioritize moves with quick evaluation for better Alpha-Beta pruning
-        legal_moves.sort(key=lambda move: self.quick_evaluate(position.make_move(move)), reverse=True)
+        # The window the children are searched with decides which kind of bound the result is
+        alpha_orig, beta_orig = alpha, beta
+
+        # Try the most promising moves first for better Alpha-Beta pruning
+        ply = self.root_depth - depth
+        if depth == 1 and self.batch_leaves:
+            return self.batch_leaf_search(position, legal_moves, board_key, symmetry, ply, alpha, beta,
+                                          maximizing_player)
+        legal_moves = self.move_orderer.order(legal_moves, ply, tt_move, maximizing_player)
 
         if maximizing_player:
             max_eval = float('-inf')
             best_move = None
             for move in legal_moves:
-                if self.time_exceeded():
-                    return max_eval, best_move  # Early exit if time is up
+                eval_score, _ = self.search_child(position, move, depth - 1, alpha, beta, False)
 
-                new_position = position.make_move(move)
-                eval_score, _ = self.alpha_beta(new_position, depth - 1, alpha, beta, False)
-
-                if eval_score is None:  # Time exceeded check
-                    return max_eval, best_move
+                if eval_score is None:  # Time is up, the result of this node is incomplete
+                    return None, None
 
                 if eval_score > max_eval:
                     max_eval = eval_score
                     best_move = move
                 alpha = max(alpha, eval_score)
                 if beta <= alpha:
+                    self.move_orderer.record_cutoff(move, ply, depth, maximizing_player)
+                    if self.stats is not None:
+                        self.stats.record_cutoff(move is legal_moves[0])
                     break
 
-            self.transposition_table[board_key] = {'score': max_eval, 'move': best_move, 'depth': depth}
+            self.store_result(board_key, symmetry, depth, max_eval, alpha_orig, beta_orig, best_move)
             return max_eval, best_move
         else:
             min_eval = float('inf')
             best_move = None
             for move in legal_moves:
-                if self.time_exceeded():
-                    return min_eval, best_move  # Early exit if time is up
-
-                new_position = position.make_move(move)
-                eval_score, _ = self.alpha_beta(new_position, depth - 1, alpha, beta, True)
+                eval_score, _ = self.search_child(position, move, depth - 1, alpha, beta, True)
 
-                if eval_score is None:  # Time exceeded check
-                    return min_eval, best_move
+                if eval_score is None:  # Time is up, the result of this node is incomplete
+                    return None, None
 
                 if eval_score < min_eval:
                     min_eval = eval_score
                     best_move = move
                 beta = min(beta, eval_score)
                 if beta <= alpha:
+                    self.move_orderer.record_cutoff(move, ply, depth, maximizing_player)
+                    if self.stats is not None:
+                        self.stats.record_cutoff(move is legal_moves[0])
                     break
 
-            self.transposition_table[board_key] = {'score': min_eval, 'move': best_move, 'depth': depth}
+            self.store_result(board_key, symmetry, depth, min_eval, alpha_orig, beta_orig, best_move)
             return min_eval, best_move
 
-    def iterative_deepening(self, position, max_depth):
+    def iterative_deepening(self, position, max_depth, start_depth=1):
         """
         Perform Iterative Deepening with a time limit and Transposition Tables.
         The search depth is increased incrementally until the maximum depth is reached or time runs out.
+        Positions with few empty squares go to the endgame solver first, and to the normal search only if
+        the solver does not finish in its share of the time.
         """
         best_move = None
+        self.completed_depth = 0
+        start_nodes = self.nodes
+        if self.stats is not None:
+            self.stats.reset()
 
-        for depth in range(1, max_depth + 1):
-            if self.time_exceeded():
-                break  # Stop if time has exceeded
+        # Near the end of the game, read the position out to the end
+        solved_move = self.solve_endgame(position)
+        if solved_move is not None:
+            self.completed_depth = max_depth
+            return self.search_finished(position, solved_move, start_nodes, ENDGAME_SOLVED)
 
-            remaining_time = self.time_limit - (time.time() - self.start_time)
-            if remaining_time < 0.1:  # Stop deeper searches if less than 100ms remaining
+        stop_reason = MAX_DEPTH
+        for depth in range(start_depth, max_depth + 1):
+            # Only start an iteration that is expected to finish in time
+            if not self.time_manager.should_start_iteration():
+                stop_reason = STOPPED if self.stop_requested else TIME_BUDGET
                 break
 
+            self.root_depth = depth
+            if self.stats is not None:
+                self.stats.start_iteration(self.nodes)
+            iteration_start = time.monotonic()
             eval_score, move = self.alpha_beta(position, depth, float('-inf'), float('inf'), position.maxPlayer)
 
             if eval_score is None:
-                return best_move  # Return the best move found so far if time runs out
+                stop_reason = STOPPED if self.stop_requested else TIME
+                break  # Keep the best move found so far if time runs out
 
             if move is not None:
                 best_move = move  # Update best move for this depth
+            self.completed_depth = depth
+            self.time_manager.iteration_done(time.monotonic() - iteration_start, move)
+            if self.stats is not None:
+                self.stats.finish_iteration(depth, self.nodes)
+            if _iteration_log.enabled:
+                _iteration_log("iteration %d done", depth, depth=depth, score=int(eval_score),
+                               move=self.move_string(best_move), nodes=self.nodes - start_nodes)
+
+        if best_move is None:  # Not even depth 1 finished: play the move the ordering heuristics like best
+            legal_moves = position.get_moves()
+            if legal_moves:
+                best_move = self.move_orderer.order(legal_moves, 0, None, position.maxPlayer)[0]
+        return self.search_finished(position, best_move, start_nodes, stop_reason)
 
+    def search_finished(self, position, best_move, start_nodes, stop_reason, **extra):
+        """
+        Write the statistics of a search, if they are collected, and return its best move.
+        :param extra: More fields for the statistics record.
+        """
+        if self.stats is not None:
+            self.stats.finish(position, best_move, self.nodes - start_nodes, stop_reason,
+                              time_limit=self.time_limit, endgame_score=self.endgame_score,
+                              endgame_nodes=self.endgame_solver.nodes if stop_reason == ENDGAME_SOLVED else 0,
+                              **extra)
         return best_move
 
     def evaluate(self, position, time_limit=5):
@@ -145,13 +346,41 @@ class AlphaBeta(OthelloAlgorithm):
         Evaluate the best move using Iterative Deepening with a time limit.
         Initializes the start time and time limit for time management.
         """
-        self.start_time = time.time()  # Set the start time when evaluation begins
-        self.time_limit = time_limit   # Set the time limit
+        self.start_clock(time_limit)  # Set the start time and time limit when evaluation begins
+        self.new_search()
 
         # Perform iterative deepening
         best_move = self.iterative_deepening(position, self.search_depth)
+        return self.move_string(best_move)
 
-        if best_move is not None and not best_move.is_pass_move:
-            return f"({best_move.row},{best_move.col})"
+    @staticmethod
+    def move_string(move):
+        """Format a move as "(row,col)", or "pass" for a pass move or no move at all."""
+        if move is not None and not move.is_pass_move:
+            return f"({move.row},{move.col})"
         else:
             return "pass"
+
+    def principal_variation(self, position, max_length=None):
+        """
+        Follow the best moves stored in the transposition table from a position.
+        :param position: The position to start from. It is not changed.
+        :param max_length: The maximum number of moves, the search depth by default.
+        :return: A list of OthelloAction, the expected moves of both players.
+        """
+        max_length = self.search_depth if max_length is None else max_length
+        variation = []
+        seen = set()
+        while len(variation) < max_length and position.zobrist_key not in seen:
+            seen.add(position.zobrist_key)
+            cached_value = self.probe(*self.board_hash(position))
+            if cached_value is None or cached_value[2] is None:
+                break
+            move = cached_value[2]
+            # Guard against key collisions: only follow moves that are legal here
+            if not any(m.is_pass_move == move.is_pass_move and m.row == move.row and m.col == move.col
+                       for m in position.get_moves()):
+                break
+            variation.append(move)
+            position = position.make_move(move)
+        return variation
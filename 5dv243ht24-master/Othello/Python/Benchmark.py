@@ -0,0 +1,200 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import numpy as np
+from OthelloPosition import OthelloPosition
+from BitboardPosition import BitboardPosition
+from AlphaBeta import AlphaBeta
+from CountingEvaluator import CountingEvaluator, AdvancedEvaluator
+
+# Leaf counts from the start position, passes counted as moves
+PERFT_START = [1, 4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005288]
+
+POSITION_CLASSES = {'OthelloPosition': OthelloPosition, 'BitboardPosition': BitboardPosition}
+EVALUATORS = {'CountingEvaluator': CountingEvaluator, 'AdvancedEvaluator': AdvancedEvaluator}
+
+# Result fields that are measured; the other fields say which test a result belongs to
+MEASUREMENTS = {'nodes', 'seconds', 'nodes_per_second', 'per_second', 'correct', 'move'}
+
+
+def perft(position, depth):
+    """
+    Count the positions reached after depth moves, passes included. A finished game counts as one position.
+    """
+    if depth == 0 or position.is_game_over():
+        return 1
+    return sum(perft(position.make_move(move), depth - 1) for move in position.get_moves())
+
+
+def reference_positions(count=8, seed=5243):
+    """
+    A fixed set of board strings from the opening to the endgame: random games stopped after 8 to 48 moves.
+    """
+    rng = random.Random(seed)
+    positions = []
+    for i in range(count):
+        position = BitboardPosition()
+        position.initialize()
+        for _ in range(8 + 40 * i // max(count - 1, 1)):
+            if position.is_game_over():
+                break
+            position = position.make_move(rng.choice(position.get_moves()))
+        positions.append(position.get_board_string())
+    return positions
+
+
+def timed(function, min_time):
+    """
+    Call a function until min_time seconds have passed.
+    :return: A tuple (calls, seconds).
+    """
+    calls = 0
+    start_time = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= min_time:
+            return calls, elapsed
+
+
+def bench_perft(max_depth):
+    """
+    Perft from the start position with each position class, checked against the known counts. Depths without
+    a known count are reported with correct None.
+    """
+    results = []
+    for name, position_class in POSITION_CLASSES.items():
+        for depth in range(1, max_depth + 1):
+            position = position_class()
+            position.initialize()
+            start_time = time.perf_counter()
+            nodes = perft(position, depth)
+            elapsed = time.perf_counter() - start_time
+            known = PERFT_START[depth] if depth < len(PERFT_START) else None
+            results.append({'position_class': name, 'depth': depth, 'nodes': nodes, 'seconds': elapsed,
+                            'nodes_per_second': nodes / elapsed, 'correct': None if known is None else nodes == known})
+    return results
+
+
+def bench_moves(boards, min_time):
+    """
+    get_moves and make_move throughput of each position class on the reference positions.
+    """
+    results = []
+    for name, position_class in POSITION_CLASSES.items():
+        positions = [position_class(board) for board in boards]
+        moves = [(position, position.get_moves()) for position in positions]
+
+        calls, elapsed = timed(lambda: [position.get_moves() for position in positions], min_time)
+        results.append({'position_class': name, 'operation': 'get_moves',
+                        'per_second': calls * len(positions) / elapsed})
+
+        made = sum(len(position_moves) for _, position_moves in moves)
+        calls, elapsed = timed(lambda: [position.make_move(move) for position, position_moves in moves
+                                        for move in position_moves], min_time)
+        results.append({'position_class': name, 'operation': 'make_move', 'per_second': calls * made / elapsed})
+    return results
+
+
+def bench_evaluators(boards, min_time):
+    """
+    Positions per second of each evaluator, one at a time and in batches.
+    """
+    results = []
+    for position_name, position_class in POSITION_CLASSES.items():
+        positions = [position_class(board) for board in boards]
+        batch = positions * (1024 // len(positions))
+        for name, evaluator_class in EVALUATORS.items():
+            evaluator = evaluator_class()
+            calls, elapsed = timed(lambda: [evaluator.evaluate(position) for position in positions], min_time)
+            results.append({'evaluator': name, 'position_class': position_name, 'mode': 'evaluate',
+                            'per_second': calls * len(positions) / elapsed})
+            calls, elapsed = timed(lambda: evaluator.evaluate_batch(batch), min_time)
+            results.append({'evaluator': name, 'position_class': position_name, 'mode': 'evaluate_batch',
+                            'per_second': calls * len(batch) / elapsed})
+    return results
+
+
+def bench_search(boards, depth):
+    """
+    Fixed-depth AlphaBeta searches of the reference positions, with a fresh engine for every position.
+    Positions are given by their index in boards.
+    """
+    results = []
+    for name, evaluator_class in EVALUATORS.items():
+        for index, board in enumerate(boards):
+            position = OthelloPosition(board)
+            alpha_beta = AlphaBeta(search_depth=depth, evaluator=evaluator_class(), make_unmake=True,
+                                   endgame_empties=0)
+            alpha_beta.start_clock(float('inf'))
+            alpha_beta.new_search()
+            start_time = time.perf_counter()
+            move = alpha_beta.iterative_deepening(position, depth)
+            elapsed = time.perf_counter() - start_time
+            results.append({'evaluator': name, 'position': index, 'depth': depth,
+                            'move': AlphaBeta.move_string(move), 'nodes': alpha_beta.nodes, 'seconds': elapsed,
+                            'nodes_per_second': alpha_beta.nodes / elapsed})
+    return results
+
+
+def run(perft_depth=6, search_depth=4, min_time=1.0):
+    """
+    Run all benchmarks.
+    :return: A dict of the results, ready for JSON.
+    """
+    boards = reference_positions()
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'positions': boards,
+            'perft': bench_perft(perft_depth),
+            'moves': bench_moves(boards, min_time),
+            'evaluators': bench_evaluators(boards, min_time),
+            'search': bench_search(boards, search_depth)}
+
+
+def compare(results, baseline):
+    """
+    Print the speed of each result relative to the same test in a baseline run.
+    """
+    def test(result):
+        return tuple((key, value) for key, value in result.items() if key not in MEASUREMENTS)
+
+    for part in ('perft', 'moves', 'evaluators', 'search'):
+        old_results = {test(old): old for old in baseline.get(part, [])}
+        for new in results[part]:
+            old = old_results.get(test(new))
+            if old is None:
+                continue
+            rate = 'nodes_per_second' if 'nodes_per_second' in new else 'per_second'
+            label = ' '.join(str(value) for _, value in test(new))
+            print(f"{part:10} {label:50} {new[rate] / old[rate]:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark move generation, evaluation and search.")
+    parser.add_argument('--perft-depth', type=int, default=6, help="Deepest perft from the start position")
+    parser.add_argument('--search-depth', type=int, default=4, help="Depth of the fixed-depth searches")
+    parser.add_argument('--min-time', type=float, default=1.0, help="Seconds to repeat each throughput test")
+    parser.add_argument('--output', help="Write the results to this JSON file instead of stdout")
+    parser.add_argument('--compare', metavar='BASELINE', help="Show speedups against an earlier JSON result")
+    args = parser.parse_args()
+
+    results = run(args.perft_depth, args.search_depth, args.min_time)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+        print()
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+    if any(result['correct'] is False for result in results['perft']):
+        sys.exit("perft counts are wrong")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,518 @@
+import numpy as np
+from OthelloAction import OthelloAction
+import Zobrist
+import Symmetry
+
+# Square (row, col) of the 1-based board maps to bit (row - 1) * 8 + (col - 1), so bit 0 is the upper
+# left corner and the bit order matches the 64 board characters of the position string.
+FULL_MASK = 0xFFFFFFFFFFFFFFFF
+NOT_A_FILE = 0xFEFEFEFEFEFEFEFE  # Every square except column 1
+NOT_H_FILE = 0x7F7F7F7F7F7F7F7F  # Every square except column 8
+
+# (shift, mask) for the eight directions. Positive shifts move towards higher bits. The mask removes the
+# squares a shift would wrap onto from the opposite edge of the board.
+DIRECTIONS = (
+    (1, NOT_A_FILE),   # East
+    (-1, NOT_H_FILE),  # West
+    (8, FULL_MASK),    # South
+    (-8, FULL_MASK),   # North
+    (9, NOT_A_FILE),   # South-east
+    (7, NOT_H_FILE),   # South-west
+    (-7, NOT_A_FILE),  # North-east
+    (-9, NOT_H_FILE),  # North-west
+)
+
+_WHITE_CHARS = str.maketrans('OXE', '100')
+_BLACK_CHARS = str.maketrans('OXE', '010')
+
+
+def square_of(row, col):
+    """
+    Bit index of a square on the 1-based board.
+    """
+    return (row - 1) * 8 + (col - 1)
+
+
+def legal_moves_mask(player, opponent):
+    """
+    Compute all legal moves of a player with a Kogge-Stone fill in each of the eight directions.
+    :param player: Bitboard of the discs of the player to move.
+    :param opponent: Bitboard of the discs of the opponent.
+    :return: A bitboard with one bit set for every legal move.
+    """
+    empty = ~(player | opponent) & FULL_MASK
+    moves = 0
+    for amount, mask in DIRECTIONS:
+        pro = opponent & mask
+        if amount > 0:
+            gen = player | (pro & (player << amount))
+            pro &= pro << amount
+            gen |= pro & (gen << (amount * 2))
+            pro &= pro << (amount * 2)
+            gen |= pro & (gen << (amount * 4))
+            moves |= ((gen ^ player) << amount) & mask & empty
+        else:
+            amount = -amount
+            gen = player | (pro & (player >> amount))
+            pro &= pro >> amount
+            gen |= pro & (gen >> (amount * 2))
+            pro &= pro >> (amount * 2)
+            gen |= pro & (gen >> (amount * 4))
+            moves |= ((gen ^ player) >> amount) & mask & empty
+    return moves
+
+
+# The directions again as NumPy values, for the versions of the functions that work on arrays of bitboards
+_ARRAY_DIRECTIONS = tuple((amount > 0, np.uint64(abs(amount)), np.uint64(abs(amount) * 2),
+                           np.uint64(abs(amount) * 4), np.uint64(mask)) for amount, mask in DIRECTIONS)
+
+
+def legal_moves_mask_array(player, opponent):
+    """
+    legal_moves_mask for arrays of bitboards.
+    :param player: uint64 array with the discs of the player to move in each position.
+    :param opponent: uint64 array with the discs of the opponent.
+    :return: A uint64 array with the legal moves of each position.
+    """
+    empty = ~(player | opponent)
+    moves = np.zeros_like(player)
+    for left, shift, shift2, shift4, mask in _ARRAY_DIRECTIONS:
+        pro = opponent & mask
+        if left:
+            gen = player | (pro & (player << shift))
+            pro &= pro << shift
+            gen |= pro & (gen << shift2)
+            pro &= pro << shift2
+            gen |= pro & (gen << shift4)
+            moves |= ((gen ^ player) << shift) & mask & empty
+        else:
+            gen = player | (pro & (player >> shift))
+            pro &= pro >> shift
+            gen |= pro & (gen >> shift2)
+            pro &= pro >> shift2
+            gen |= pro & (gen >> shift4)
+            moves |= ((gen ^ player) >> shift) & mask & empty
+    return moves
+
+
+def popcount_array(bitboards):
+    """
+    The number of set bits of every element of a uint64 array.
+    """
+    bitboards = np.ascontiguousarray(bitboards, dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):  # NumPy 2
+        return np.bitwise_count(bitboards).astype(np.int64)
+    bits = np.unpackbits(bitboards.view(np.uint8)).reshape(bitboards.shape + (64,))
+    return bits.sum(axis=-1, dtype=np.int64)
+
+
+def flips_mask(player, opponent, square):
+    """
+    Compute the discs flipped when the player puts a disc on a square.
+    :param player: Bitboard of the discs of the player to move.
+    :param opponent: Bitboard of the discs of the opponent.
+    :param square: Bit index of the move.
+    :return: A bitboard of the opponent discs that change colour.
+    """
+    move = 1 << square
+    flips = 0
+    for amount, mask in DIRECTIONS:
+        pro = opponent & mask
+        if amount > 0:
+            gen = move | (pro & (move << amount))
+            pro &= pro << amount
+            gen |= pro & (gen << (amount * 2))
+            pro &= pro << (amount * 2)
+            gen |= pro & (gen << (amount * 4))
+            if (gen << amount) & mask & player:
+                flips |= gen ^ move
+        else:
+            amount = -amount
+            gen = move | (pro & (move >> amount))
+            pro &= pro >> amount
+            gen |= pro & (gen >> (amount * 2))
+            pro &= pro >> (amount * 2)
+            gen |= pro & (gen >> (amount * 4))
+            if (gen >> amount) & mask & player:
+                flips |= gen ^ move
+    return flips
+
+
+def flips_mask_array(player, opponent, moves):
+    """
+    flips_mask for arrays of bitboards, with the move given as a bitboard.
+    :param player: uint64 array with the discs of the player to move in each position.
+    :param opponent: uint64 array with the discs of the opponent.
+    :param moves: uint64 array with one bit set for the move in each position, or none for no move.
+    :return: A uint64 array with the discs each move flips.
+    """
+    flips = np.zeros_like(player)
+    for left, shift, shift2, shift4, mask in _ARRAY_DIRECTIONS:
+        pro = opponent & mask
+        if left:
+            gen = moves | (pro & (moves << shift))
+            pro &= pro << shift
+            gen |= pro & (gen << shift2)
+            pro &= pro << shift2
+            gen |= pro & (gen << shift4)
+            closed = (gen << shift) & mask & player
+        else:
+            gen = moves | (pro & (moves >> shift))
+            pro &= pro >> shift
+            gen |= pro & (gen >> shift2)
+            pro &= pro >> shift2
+            gen |= pro & (gen >> shift4)
+            closed = (gen >> shift) & mask & player
+        flips |= np.where(closed != 0, gen ^ moves, np.uint64(0))
+    return flips
+
+
+def moves_to_actions(moves):
+    """
+    Convert a bitboard of moves to a list of OthelloAction in row-major order.
+    """
+    actions = []
+    while moves:
+        low = moves & -moves
+        square = low.bit_length() - 1
+        actions.append(OthelloAction(square // 8 + 1, square % 8 + 1))
+        moves ^= low
+    return actions
+
+
+def derive_value(position, name, compute, update, undo_bits):
+    """
+    The derived method of the position classes.
+    :param undo_bits: Function giving the (move, flips) bitboards of an entry of the undo stack of the position.
+    """
+    value = position._derived.get(name)
+    if value is not None:
+        return value
+    stack = position.undo_stack
+    if update is None or not stack:
+        value = position._derived[name] = compute(*position.get_bitboards())
+        return value
+
+    # The closest earlier position that has the value, or the first one. stack[i][3] holds the values of the
+    # position before move i.
+    start = len(stack) - 1
+    while start and name not in stack[start][3]:
+        start -= 1
+    white_to_move = position.maxPlayer == ((len(stack) - start) % 2 == 0)
+    value = stack[start][3].get(name)
+    if value is None:
+        # None has it: take back all the moves on copies of the discs, and compute it for the first position
+        white, black = position.get_bitboards()
+        white_moved = not position.maxPlayer
+        for move, flips in map(undo_bits, reversed(stack)):
+            if white_moved:
+                white, black = white ^ (flips | move), black | flips
+            else:
+                black, white = black ^ (flips | move), white | flips
+            white_moved = not white_moved
+        value = stack[start][3][name] = compute(white, black)
+
+    # Replay the moves, keeping the value of every position on the way
+    for later in range(start, len(stack)):
+        move, flips = undo_bits(stack[later])
+        if move:
+            value = update(value, white_to_move, move.bit_length() - 1, flips)
+        white_to_move = not white_to_move
+        (stack[later + 1][3] if later + 1 < len(stack) else position._derived)[name] = value
+    return value
+
+
+def _undo_bits(entry):
+    """The (move, flips) bitboards of an undo entry of BitboardPosition."""
+    return entry[0], entry[1]
+
+
+class BitboardPosition(object):
+    """
+    This class represents the board positions with two 64-bit integers, one per colour, and handles the
+    application of moves with shift-and-mask operations. It has the same public interface as OthelloPosition,
+    so the search algorithms and evaluators can use either representation, including the cache of the legal
+    moves, mobility, disc counts and game-over flag of both sides.
+    """
+
+    def __init__(self, board_str=""):
+        """
+        Initializes the board with a given string, or creates the start position if none is provided.
+        :param board_str: A string of length 65 representing the board (1 char for player, 64 for board).
+        """
+        self.BOARD_SIZE = 8
+        self.maxPlayer = True  # True represents White, False represents Black
+        self.white = 0
+        self.black = 0
+        self._derived = {}  # Cached values derived from the discs, emptied whenever a disc changes
+        self._board = None
+        self._board_bits = None
+
+        if board_str and len(board_str) == 65:
+            self.maxPlayer = board_str[0] == 'W'
+            # Reverse the board characters so the first square ends up in the lowest bit
+            cells = board_str[:0:-1]
+            self.white = int(cells.translate(_WHITE_CHARS), 2)
+            self.black = int(cells.translate(_BLACK_CHARS), 2)
+        else:
+            self.initialize()
+
+        self.board_history = []  # Store previous board states to detect cycles
+        self.undo_stack = []  # Moves applied in place, with the discs they flipped
+        self.zobrist_key = self.compute_zobrist_key()  # Kept up to date by the move methods
+
+    @classmethod
+    def from_bitboards(cls, white, black, white_to_move):
+        """
+        Create a position from the bitboards of its discs, without going through the board string.
+        """
+        position = cls.__new__(cls)
+        position.BOARD_SIZE = 8
+        position.maxPlayer = white_to_move
+        position.white = white
+        position.black = black
+        position._derived = {}
+        position._board = None
+        position._board_bits = None
+        position.board_history = []
+        position.undo_stack = []
+        position.zobrist_key = position.compute_zobrist_key()
+        return position
+
+    def initialize(self):
+        """
+        Initializes the starting position on the board and returns the board string.
+        """
+        self.white = (1 << square_of(4, 4)) | (1 << square_of(5, 5))
+        self.black = (1 << square_of(4, 5)) | (1 << square_of(5, 4))
+        self.maxPlayer = True
+        self._derived = {}
+        self.board_history = []
+        self.zobrist_key = self.compute_zobrist_key()
+        return self.get_board_string()
+
+    @property
+    def board(self):
+        """
+        The position as the padded 10x10 array of 'E', 'W' and 'B' used by OthelloPosition. It is only
+        built when somebody asks for it, and rebuilt only when the discs have changed.
+        """
+        if self._board_bits != (self.white, self.black):
+            board = np.full((self.BOARD_SIZE + 2, self.BOARD_SIZE + 2), 'E')
+            inner = board[1:self.BOARD_SIZE + 1, 1:self.BOARD_SIZE + 1]
+            bits = np.array([self.white, self.black], dtype='<u8').view(np.uint8)
+            bits = np.unpackbits(bits, bitorder='little').reshape(2, self.BOARD_SIZE, self.BOARD_SIZE).astype(bool)
+            inner[bits[0]] = 'W'
+            inner[bits[1]] = 'B'
+            self._board = board
+            self._board_bits = (self.white, self.black)
+        return self._board
+
+    def get_board_string(self):
+        """
+        Converts the current board and player's turn back to a 65-character string.
+        :return: A string representing the current player and the board.
+        """
+        white, black = self.white, self.black
+        cells = ['O' if white >> i & 1 else 'X' if black >> i & 1 else 'E' for i in range(64)]
+        return ('W' if self.maxPlayer else 'B') + ''.join(cells)
+
+    def make_move(self, action):
+        """
+        Perform the move suggested by the OthelloAction and return the new board position.
+        :param action: The move to make as an OthelloAction.
+        :return: The BitboardPosition resulting from making the move.
+        """
+        new_position = self.clone()
+        new_position.maxPlayer = not self.maxPlayer
+        new_position.zobrist_key ^= Zobrist.SIDE_KEY
+        if action.is_pass_move:
+            return new_position
+
+        square = square_of(action.row, action.col)
+        move = 1 << square
+        new_position._derived = {}
+        if self.maxPlayer:
+            flips = flips_mask(self.white, self.black, square)
+            new_position.white = self.white | flips | move
+            new_position.black = self.black ^ flips
+            new_position.zobrist_key ^= Zobrist.WHITE_KEYS[square] ^ Zobrist.flips_key(flips)
+        else:
+            flips = flips_mask(self.black, self.white, square)
+            new_position.black = self.black | flips | move
+            new_position.white = self.white ^ flips
+            new_position.zobrist_key ^= Zobrist.BLACK_KEYS[square] ^ Zobrist.flips_key(flips)
+        return new_position
+
+    def apply_move(self, action):
+        """
+        Perform the move suggested by the OthelloAction on this position, without creating a new one.
+        The move can be taken back with undo_move.
+        :param action: The move to make as an OthelloAction.
+        """
+        key = Zobrist.SIDE_KEY
+        if action.is_pass_move:
+            self.undo_stack.append((0, 0, key, self._derived))
+        else:
+            square = square_of(action.row, action.col)
+            move = 1 << square
+            if self.maxPlayer:
+                flips = flips_mask(self.white, self.black, square)
+                self.white |= flips | move
+                self.black ^= flips
+                key ^= Zobrist.WHITE_KEYS[square]
+            else:
+                flips = flips_mask(self.black, self.white, square)
+                self.black |= flips | move
+                self.white ^= flips
+                key ^= Zobrist.BLACK_KEYS[square]
+            key ^= Zobrist.flips_key(flips)
+            # Keep the derived values of this position for undo_move
+            self.undo_stack.append((move, flips, key, self._derived))
+            self._derived = {}
+        self.zobrist_key ^= key
+        self.maxPlayer = not self.maxPlayer
+
+    def undo_move(self):
+        """
+        Take back the last move made with apply_move.
+        """
+        move, flips, key, self._derived = self.undo_stack.pop()
+        self.maxPlayer = not self.maxPlayer
+        self.zobrist_key ^= key
+        if self.maxPlayer:
+            self.white ^= flips | move
+            self.black |= flips
+        else:
+            self.black ^= flips | move
+            self.white |= flips
+
+    def get_bitboards(self):
+        """
+        The white and black discs as two 64-bit integers, with bit (row - 1) * 8 + (col - 1) for each square.
+        :return: A tuple (white, black).
+        """
+        return self.white, self.black
+
+    def compute_zobrist_key(self):
+        """
+        Compute the Zobrist key of the position from scratch.
+        :return: The 64-bit key of the position.
+        """
+        return Zobrist.compute_key(self.white, self.black, self.maxPlayer)
+
+    def canonical_key(self):
+        """
+        The key of the position in its canonical orientation, the same for all its rotations and reflections.
+        :return: A tuple (key, symmetry). Symmetry.transform_action(move, symmetry) maps a move of this
+            position to the canonical orientation, Symmetry.from_canonical(move, symmetry) maps it back.
+        """
+        white, black = self.get_bitboards()
+        return Symmetry.canonical_key(white, black, self.maxPlayer)
+
+    def get_moves(self):
+        """
+        Get all possible moves for the current player.
+        :return: A list of OthelloAction representing all possible moves, a new list on every call.
+        """
+        key = 'white_actions' if self.maxPlayer else 'black_actions'
+        moves = self._derived.get(key)
+        if moves is None:
+            moves = moves_to_actions(self.get_moves_mask()) or [OthelloAction(0, 0, is_pass_move=True)]
+            self._derived[key] = moves
+        return list(moves)
+
+    def get_moves_mask(self, white=None):
+        """
+        Get the legal moves of a player as a bitboard.
+        :param white: True for the moves of white, False for those of black, the player to move by default.
+        """
+        white = self.maxPlayer if white is None else white
+        key = 'white_moves' if white else 'black_moves'
+        moves = self._derived.get(key)
+        if moves is None:
+            moves = legal_moves_mask(self.white, self.black) if white else legal_moves_mask(self.black, self.white)
+            self._derived[key] = moves
+        return moves
+
+    def mobility(self):
+        """
+        The number of legal moves of both players, 0 for a player who has to pass.
+        :return: A tuple (white moves, black moves).
+        """
+        return self.get_moves_mask(True).bit_count(), self.get_moves_mask(False).bit_count()
+
+    def derived(self, name, compute, update=None):
+        """
+        A value that an evaluator derives from the discs, kept like the legal moves until the discs change.
+        :param name: The name of the value.
+        :param compute: Function computing the value from the white and black bitboards.
+        :param update: Optional function (value, white_moved, square, flips) giving the value after a move from
+            the value before it. A position reached with apply_move then updates the value of the closest earlier
+            position that has it, and keeps the value of every position in between, so a search pays one update
+            per node and nothing on undo_move.
+        """
+        return derive_value(self, name, compute, update, _undo_bits)
+
+    def disc_counts(self):
+        """
+        The number of discs of both players.
+        :return: A tuple (white discs, black discs).
+        """
+        counts = self._derived.get('disc_counts')
+        if counts is None:
+            counts = self._derived['disc_counts'] = (self.white.bit_count(), self.black.bit_count())
+        return counts
+
+    def is_repeated_state(self):
+        """
+        Check if the current board state has already occurred.
+        :return: True if this board state has been seen before, False otherwise.
+        """
+        current_board_string = self.get_board_string()
+        if current_board_string in self.board_history:
+            return True
+        self.board_history.append(current_board_string)
+        return False
+
+    def is_game_over(self):
+        """
+        Check if the game is over. The game ends when neither player has a valid move.
+        :return: True if the game is over, False otherwise.
+        """
+        game_over = self._derived.get('game_over')
+        if game_over is None:
+            game_over = self._derived['game_over'] = not self.get_moves_mask(True) and not self.get_moves_mask(False)
+        return game_over
+
+    def clone(self):
+        """
+        Clone the current board and state.
+        :return: A new BitboardPosition object identical to the current one.
+        """
+        new_position = BitboardPosition.__new__(BitboardPosition)
+        new_position.BOARD_SIZE = self.BOARD_SIZE
+        new_position.maxPlayer = self.maxPlayer
+        new_position.white = self.white
+        new_position.black = self.black
+        new_position.zobrist_key = self.zobrist_key
+        new_position._derived = dict(self._derived)
+        new_position._board = None
+        new_position._board_bits = None
+        new_position.board_history = []
+        new_position.undo_stack = []
+        return new_position
+
+    def print_board(self):
+        """
+        Print the current board state.
+        """
+        board_str = "\n".join([" ".join(self.board[row][1:9]) for row in range(1, 9)])
+        print(board_str, flush=True)
+
+    def to_move(self):
+        """
+        Check which player's turn it is.
+        :return: True if it's White's turn, False if it's Black's turn.
+        """
+        return self.maxPlayer
@@ -1,13 +1,37 @@
+import json
 import numpy as np
 from OthelloEvaluator import OthelloEvaluator
+from BitboardPosition import legal_moves_mask, legal_moves_mask_array, popcount_array, square_of
 
 class CountingEvaluator(OthelloEvaluator):
     def evaluate(self, othello_position):
-        # Use numpy to count 'B' and 'W' efficiently in the numpy array
-        black_squares = np.count_nonzero(othello_position.board == 'B')
-        white_squares = np.count_nonzero(othello_position.board == 'W')
+        # The disc counts are cached by the position
+        white_squares, black_squares = othello_position.disc_counts()
         return white_squares - black_squares
 
+    def evaluate_batch(self, othello_positions):
+        # Count the discs of all positions at once on their stacked bitboards
+        bitboards = stack_bitboards(othello_positions)
+        return popcount_array(bitboards[:, 0]) - popcount_array(bitboards[:, 1])
+
+def stack_bitboards(othello_positions):
+    """
+    Stack the bitboards of positions.
+    :return: A uint64 array of shape (number of positions, 2) with the white and black discs.
+    """
+    return np.array([othello_position.get_bitboards() for othello_position in othello_positions],
+                    dtype=np.uint64).reshape(-1, 2)
+
+def row_weight_tables(positional_weights):
+    """
+    Lookup tables for positional scores.
+    :param positional_weights: An array of shape (phases, 8, 8) with the weight of every square in each phase.
+    :return: An array of shape (phases, 8, 256): [phase][r][byte] is the positional weight of the discs in row
+        r + 1 whose bits are set in byte.
+    """
+    byte_bits = (np.arange(256)[:, None] >> np.arange(8)) & 1
+    return np.einsum('bc,prc->prb', byte_bits, positional_weights)
+
 class AdvancedEvaluator(OthelloEvaluator):
     positional_weights = np.array([
         [100, -10, 10, 5, 5, 10, -10, 100],
@@ -25,74 +49,92 @@ class AdvancedEvaluator(OthelloEvaluator):
     x_squares = [(2, 2), (2, 7), (7, 2), (7, 7)]  # Adjusting for 1-based indexing with padding
     c_squares = [(1, 2), (1, 7), (2, 1), (2, 8), (7, 1), (7, 8), (8, 2), (8, 7)]
 
+    # The same squares as bitboards, bit (row - 1) * 8 + (col - 1) for each square
+    corner_mask = sum(1 << square_of(i, j) for i, j in corners)
+    x_square_mask = sum(1 << square_of(i, j) for i, j in x_squares)
+
+    # The positional weights of each game phase. The built-in weights use the same table in every phase, tuned
+    # weights (see load_weights) have a table per phase.
+    phase_positional_weights = np.stack([positional_weights] * 3)
+    row_weight_array = row_weight_tables(phase_positional_weights)
+    row_weights = row_weight_array.tolist()
+
+    # (mobility, positional, corner, X-square penalty, piece) weights of the early, mid and late game
+    phase_weights = np.array([
+        [10, 5, 10, 20, 2],  # Early game: more than 40 empty squares
+        [7, 4, 15, 15, 3],   # Mid-game: more than 20 empty squares
+        [5, 2, 25, 10, 10],  # Late game
+    ])
+    phase_weight_lists = phase_weights.tolist()
+
+    def __init__(self, weights=None):
+        """
+        :param weights: Optional file of tuned weights, written by EvaluatorTuning.py, to use instead of the
+            built-in ones.
+        """
+        if weights is not None:
+            self.load_weights(weights)
+
+    def load_weights(self, path):
+        """
+        Use the weights of a file written by EvaluatorTuning.py: per phase, a positional table and the
+        (mobility, positional, corner, X-square penalty, piece) weights.
+        """
+        with open(path) as file:
+            data = json.load(file)
+        if data.get('evaluator') != 'AdvancedEvaluator':
+            raise ValueError(f"{path} has no weights for AdvancedEvaluator")
+        self.phase_positional_weights = np.array(data['positional'], dtype=np.int64).reshape(3, 8, 8)
+        self.row_weight_array = row_weight_tables(self.phase_positional_weights)
+        self.row_weights = self.row_weight_array.tolist()
+        self.phase_weights = np.array(data['phase_weights'], dtype=np.int64).reshape(3, 5)
+        self.phase_weight_lists = self.phase_weights.tolist()
+
+    @staticmethod
+    def game_phase(empty_squares):
+        """
+        The game phase (0 early, 1 mid, 2 late) from the number of empty squares.
+        """
+        return 0 if empty_squares > 40 else 1 if empty_squares > 20 else 2
+
+    def positional_score(self, discs, phase=0):
+        """
+        Sum of the positional weights of the squares of a bitboard in a game phase, one table lookup per row.
+        """
+        return sum(table[(discs >> shift) & 0xFF] for table, shift in zip(self.row_weights[phase], range(0, 64, 8)))
+
     def evaluate(self, othello_position):
-        black_squares = 0
-        white_squares = 0
-        black_corners = 0
-        white_corners = 0
-        black_positional = 0
-        white_positional = 0
-        black_x_squares = 0
-        white_x_squares = 0
-        empty_squares = 0
+        # The position caches the move masks, which the search has usually asked for already
+        white, black = othello_position.get_bitboards()
+        return self.evaluate_bitboards(white, black, othello_position.mobility())
 
+    def evaluate_bitboards(self, white, black, mobility=None):
+        """
+        Evaluate a position given as the bitboards of the white and black discs.
+        :param mobility: The number of legal moves of white and black, if already known.
+        """
         # Evaluate based on pieces, corners, X-squares, and positional advantage
-        for i in range(1, 9):  # Iterate over the inner 8x8 grid
-            row = othello_position.board[i]  # Fetch row once to avoid repeated indexing
-            for j in range(1, 9):
-                item = row[j]
-                if item == 'W':  # White pieces
-                    white_squares += 1
-                    white_positional += self.positional_weights[i - 1][j - 1]  # Adjust for 0-based index
-                    if (i, j) in self.corners:
-                        white_corners += 1
-                    elif (i, j) in self.x_squares:
-                        white_x_squares += 1  # Track X-squares for additional penalties
-                elif item == 'B':  # Black pieces
-                    black_squares += 1
-                    black_positional += self.positional_weights[i - 1][j - 1]
-                    if (i, j) in self.corners:
-                        black_corners += 1
-                    elif (i, j) in self.x_squares:
-                        black_x_squares += 1  # Track X-squares for penalties
-                else:
-                    empty_squares += 1  # Count empty spaces to assess game stage
+        white_squares = white.bit_count()
+        black_squares = black.bit_count()
+        white_corners = (white & self.corner_mask).bit_count()
+        black_corners = (black & self.corner_mask).bit_count()
+        white_x_squares = (white & self.x_square_mask).bit_count()  # Track X-squares for additional penalties
+        black_x_squares = (black & self.x_square_mask).bit_count()
+        empty_squares = 64 - white_squares - black_squares  # Count empty spaces to assess game stage
+        phase = self.game_phase(empty_squares)
+        white_positional = self.positional_score(white, phase)
+        black_positional = self.positional_score(black, phase)
 
         # Dynamically adjust weights based on how many empty squares are left (i.e., game phase)
-        if empty_squares > 40:  # Early game
-            mobility_weight = 10
-            positional_weight = 5
-            corner_weight = 10
-            x_square_penalty_weight = 20
-            piece_weight = 2
-        elif empty_squares > 20:  # Mid-game
-            mobility_weight = 7
-            positional_weight = 4
-            corner_weight = 15
-            x_square_penalty_weight = 15
-            piece_weight = 3
-        else:  # Late game
-            mobility_weight = 5
-            positional_weight = 2
-            corner_weight = 25
-            x_square_penalty_weight = 10
-            piece_weight = 10
-
-        # Get the moves for both players without repeatedly switching turns
-        current_max_player = othello_position.maxPlayer
-        white_mobility, black_mobility = 0, 0
-
-        # Cache the move count for white and black based on the current player
-        if current_max_player:
-            white_mobility = len(othello_position.get_moves())  # White's legal moves
-            othello_position.maxPlayer = False  # Temporarily switch to Black
-            black_mobility = len(othello_position.get_moves())
-            othello_position.maxPlayer = True  # Switch back
-        else:
-            black_mobility = len(othello_position.get_moves())  # Black's legal moves
-            othello_position.maxPlayer = True  # Temporarily switch to White
-            white_mobility = len(othello_position.get_moves())
-            othello_position.maxPlayer = False  # Switch back
+        mobility_weight, positional_weight, corner_weight, x_square_penalty_weight, piece_weight = \
+            self.phase_weight_lists[phase]
+
+        # Count the moves of both players directly from the move masks. A player without moves has a single
+        # (pass) move, as in get_moves
+        if mobility is None:
+            mobility = legal_moves_mask(white, black).bit_count(), legal_moves_mask(black, white).bit_count()
+        white_mobility = max(mobility[0], 1)
+        black_mobility = max(mobility[1], 1)
 
         # Heuristic calculation with dynamic weights applied
         piece_difference = piece_weight * (white_squares - black_squares)
@@ -111,3 +153,37 @@ class AdvancedEvaluator(OthelloEvaluator):
         )
 
         return evaluation_score
+
+    def evaluate_batch(self, othello_positions):
+        bitboards = stack_bitboards(othello_positions)
+        return self.evaluate_bitboards_array(bitboards[:, 0], bitboards[:, 1])
+
+    def evaluate_bitboards_array(self, white, black):
+        """
+        evaluate_bitboards for uint64 arrays of white and black discs, with the same scores.
+        :return: An int64 array with the evaluation of each position.
+        """
+        white_squares = popcount_array(white)
+        black_squares = popcount_array(black)
+        corner_difference = popcount_array(white & np.uint64(self.corner_mask)) - \
+            popcount_array(black & np.uint64(self.corner_mask))
+        x_square_difference = popcount_array(black & np.uint64(self.x_square_mask)) - \
+            popcount_array(white & np.uint64(self.x_square_mask))
+        empty_squares = 64 - white_squares - black_squares
+        phase = np.where(empty_squares > 40, 0, np.where(empty_squares > 20, 1, 2))
+        positional_difference = np.zeros(white.shape, dtype=np.int64)
+        for row in range(8):
+            shift = np.uint64(8 * row)
+            white_bytes = ((white >> shift) & np.uint64(0xFF)).astype(np.intp)
+            black_bytes = ((black >> shift) & np.uint64(0xFF)).astype(np.intp)
+            positional_difference += self.row_weight_array[phase, row, white_bytes]
+            positional_difference -= self.row_weight_array[phase, row, black_bytes]
+        white_mobility = np.maximum(popcount_array(legal_moves_mask_array(white, black)), 1)
+        black_mobility = np.maximum(popcount_array(legal_moves_mask_array(black, white)), 1)
+
+        weights = self.phase_weights[phase]
+        return (weights[:, 4] * (white_squares - black_squares) +
+                weights[:, 2] * corner_difference +
+                weights[:, 0] * (white_mobility - black_mobility) +
+                weights[:, 1] * positional_difference -
+                weights[:, 3] * x_square_difference)
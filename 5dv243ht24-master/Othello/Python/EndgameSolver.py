@@ -0,0 +1,233 @@
+from OthelloAction import OthelloAction
+from BitboardPosition import FULL_MASK, legal_moves_mask, flips_mask
+
+# The board is split into four 4x4 quadrants for parity ordering. QUADRANT_OF[square] is the quadrant of a square.
+QUADRANT_OF = [(square // 32) * 2 + (square % 8) // 4 for square in range(64)]
+QUADRANT_MASKS = [sum(1 << square for square in range(64) if QUADRANT_OF[square] == q) for q in range(4)]
+
+
+class SolverTimeout(Exception):
+    """
+    Raised inside the solver to abandon a search that ran out of time.
+    """
+    pass
+
+
+def final_score(player, opponent):
+    """
+    The final disc differential of a finished game for the player. Empty squares go to the winner.
+    """
+    player_discs = player.bit_count()
+    opponent_discs = opponent.bit_count()
+    difference = player_discs - opponent_discs
+    empties = 64 - player_discs - opponent_discs
+    if difference > 0:
+        return difference + empties
+    if difference < 0:
+        return difference - empties
+    return 0
+
+
+def parity_order(empty):
+    """
+    The empty squares of a bitboard, those in quadrants with an odd number of empties first. Playing into odd
+    regions tends to leave the last move in each region to the player.
+    """
+    odd, even = [], []
+    for quadrant_mask in QUADRANT_MASKS:
+        region = empty & quadrant_mask
+        squares = odd if region.bit_count() & 1 else even
+        while region:
+            low = region & -region
+            squares.append(low.bit_length() - 1)
+            region ^= low
+    return odd + even
+
+
+class EndgameSolver(object):
+    """
+    Exact endgame search. It plays the position out to the end with a negamax alpha-beta search on bitboards
+    and returns the final disc differential, or only win/loss/draw in WLD mode, which searches with a null
+    window around zero and is much faster.
+
+    Moves are ordered fastest-first (fewest replies for the opponent) while many squares are empty, and by
+    region parity near the end. After the first move of a node, the others are searched with a null window
+    and only searched again if they turn out to be better (principal variation search). Nodes with many
+    empties keep their bounds and best move in a table. The last four empties are searched on a list of the
+    empty squares, without move generation, and the last one has its own function.
+    """
+    CHECK_INTERVAL = 1024  # Nodes between two calls of should_stop
+    FASTEST_FIRST_EMPTIES = 7  # Fastest-first ordering from this many empties up
+    TABLE_EMPTIES = 8  # Nodes with this many empties or more are kept in the table
+    SMALL_EMPTIES = 4  # Empty-list search from this many empties down
+
+    def __init__(self, wld=False):
+        """
+        :param wld: Only find out if the game is won, lost or drawn, instead of the exact disc differential.
+        """
+        self.wld = wld
+        self.nodes = 0
+        self.next_check = 0  # Node count at which should_stop is called next
+        self.should_stop = None
+        self.table = {}  # (player, opponent) -> (lower bound, upper bound, best square)
+
+    def solve(self, position, should_stop=None):
+        """
+        Solve a position.
+        :param position: The position, an OthelloPosition or BitboardPosition.
+        :param should_stop: Optional function returning True when the solver has to give up.
+        :return: A tuple (score, move) with the final disc differential for the player to move (its sign in
+            WLD mode) and the best move as an OthelloAction, or None if the solver had to give up.
+        """
+        white, black = position.get_bitboards()
+        player, opponent = (white, black) if position.maxPlayer else (black, white)
+        self.nodes = 0
+        self.next_check = self.CHECK_INTERVAL
+        self.should_stop = should_stop
+        self.table.clear()
+        alpha, beta = (-1, 1) if self.wld else (-65, 65)
+        try:
+            return self.__solve_root(player, opponent, alpha, beta)
+        except SolverTimeout:
+            return None
+
+    def __solve_root(self, player, opponent, alpha, beta):
+        moves = legal_moves_mask(player, opponent)
+        if not moves:
+            if not legal_moves_mask(opponent, player):
+                return final_score(player, opponent), OthelloAction(0, 0, is_pass_move=True)
+            return -self.search(opponent, player, -beta, -alpha), OthelloAction(0, 0, is_pass_move=True)
+
+        children = self.__fastest_first(player, opponent, moves, None)
+        best_score, best_square = self.__search_children(player, opponent, alpha, beta, children)
+        return best_score, OthelloAction(best_square // 8 + 1, best_square % 8 + 1)
+
+    def __fastest_first(self, player, opponent, moves, first_square):
+        """
+        The moves with their flips, first_square (if any) and then those leaving the opponent the fewest
+        replies first.
+        """
+        children = []
+        while moves:
+            low = moves & -moves
+            square = low.bit_length() - 1
+            moves ^= low
+            flips = flips_mask(player, opponent, square)
+            replies = -1 if square == first_square else legal_moves_mask(opponent ^ flips, player | flips | low).bit_count()
+            children.append((replies, square, flips))
+        children.sort()
+        return [(square, flips) for _, square, flips in children]
+
+    def __search_children(self, player, opponent, alpha, beta, children):
+        """
+        Principal variation search over the ordered children of a node.
+        :return: A tuple (best score, best square).
+        """
+        best_score, best_square = -65, None
+        for square, flips in children:
+            new_player, new_opponent = opponent ^ flips, player | flips | (1 << square)
+            if best_score == -65:
+                score = -self.search(new_player, new_opponent, -beta, -alpha)
+            else:
+                score = -self.search(new_player, new_opponent, -alpha - 1, -alpha)
+                if alpha < score < beta:
+                    score = -self.search(new_player, new_opponent, -beta, -score)
+            if score > best_score:
+                best_score, best_square = score, square
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score, best_square
+
+    def search(self, player, opponent, alpha, beta):
+        """
+        Negamax search to the end of the game.
+        :return: The final disc differential for the player, exact if it is inside (alpha, beta).
+        """
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.next_check = self.nodes + self.CHECK_INTERVAL
+            if self.should_stop and self.should_stop():
+                raise SolverTimeout()
+
+        empty = ~(player | opponent) & FULL_MASK
+        empties = empty.bit_count()
+        if empties <= self.SMALL_EMPTIES:
+            return self.search_small(player, opponent, alpha, beta, parity_order(empty))
+
+        lower, upper, table_square = -64, 64, None
+        if empties >= self.TABLE_EMPTIES:
+            entry = self.table.get((player, opponent))
+            if entry is not None:
+                lower, upper, table_square = entry
+                if lower >= beta:
+                    return lower
+                if upper <= alpha or lower == upper:
+                    return upper
+                alpha, beta = max(alpha, lower), min(beta, upper)
+
+        moves = legal_moves_mask(player, opponent)
+        if not moves:
+            if not legal_moves_mask(opponent, player):
+                return final_score(player, opponent)
+            return -self.search(opponent, player, -beta, -alpha)
+
+        if empties >= self.FASTEST_FIRST_EMPTIES:
+            children = self.__fastest_first(player, opponent, moves, table_square)
+        else:
+            children = [(square, flips_mask(player, opponent, square))
+                        for square in parity_order(empty) if moves >> square & 1]
+        best_score, best_square = self.__search_children(player, opponent, alpha, beta, children)
+
+        if empties >= self.TABLE_EMPTIES:
+            if best_score <= alpha:
+                upper = best_score
+            elif best_score >= beta:
+                lower = best_score
+            else:
+                lower = upper = best_score
+            self.table[(player, opponent)] = (lower, upper, best_square)
+        return best_score
+
+    def search_small(self, player, opponent, alpha, beta, empties):
+        """
+        Search the last few empties, given as a list of squares in the order to try them.
+        """
+        if len(empties) == 1:
+            return self.last_move(player, opponent, empties[0])
+        self.nodes += 1
+
+        best_score = -65
+        for i, square in enumerate(empties):
+            flips = flips_mask(player, opponent, square)
+            if flips:
+                rest = empties[:i] + empties[i + 1:]
+                score = -self.search_small(opponent ^ flips, player | flips | (1 << square), -beta, -alpha, rest)
+                if score > best_score:
+                    best_score = score
+                    if score > alpha:
+                        alpha = score
+                        if alpha >= beta:
+                            break
+
+        if best_score == -65:  # No move: pass if the opponent can move, otherwise the game is over
+            if any(flips_mask(opponent, player, square) for square in empties):
+                return -self.search_small(opponent, player, -beta, -alpha, empties)
+            return final_score(player, opponent)
+        return best_score
+
+    def last_move(self, player, opponent, square):
+        """
+        The final score when a single square is empty.
+        """
+        self.nodes += 1
+        difference = player.bit_count() - opponent.bit_count()
+        flips = flips_mask(player, opponent, square).bit_count()
+        if flips:
+            return difference + 2 * flips + 1
+        flips = flips_mask(opponent, player, square).bit_count()
+        if flips:
+            return difference - 2 * flips - 1
+        # Nobody can move: the empty square goes to the winner
+        return difference + 1 if difference > 0 else difference - 1 if difference < 0 else 0
@@ -0,0 +1,200 @@
+import argparse
+import json
+import time
+import numpy as np
+from BitboardPosition import legal_moves_mask_array, popcount_array
+from CountingEvaluator import AdvancedEvaluator
+from PositionDataset import PositionDataset, HAS_SCORE, HAS_RESULT, CHUNK_SIZE
+import Symmetry
+
+PHASES = 3  # The game phases of AdvancedEvaluator.game_phase
+
+# The squares fall into 10 classes that the symmetries of the board map onto each other. Tuned positional weights
+# are the same for all squares of a class, like the built-in ones.
+SQUARE_CLASS = [min(Symmetry.SQUARE_MAPS[symmetry][square] for symmetry in Symmetry.SYMMETRIES)
+                for square in range(64)]
+CLASS_SQUARES = sorted(set(SQUARE_CLASS))
+CLASS_MASKS = [np.uint64(sum(1 << square for square in range(64) if SQUARE_CLASS[square] == representative))
+               for representative in CLASS_SQUARES]
+
+# The features are white minus black of: mobility, corners, X-squares (negated, as the evaluator subtracts the
+# X-square penalty), discs, and the discs on each square class. The evaluation is their weighted sum.
+FEATURES = ['mobility', 'corners', 'x_squares', 'discs'] + [f"square_{square}" for square in CLASS_SQUARES]
+FIRST_CLASS = 4
+
+# Evaluation units per unit of what the model predicts: a disc of the final result, a point of a search score,
+# or a logit of white winning
+DEFAULT_SCALE = {('ridge', 'result'): 10, ('ridge', 'score'): 1, ('logistic', 'result'): 100}
+
+
+def features(white, black):
+    """
+    The AdvancedEvaluator features of positions.
+    :param white: uint64 array with the white discs of each position.
+    :param black: uint64 array with the black discs.
+    :return: A tuple (features, phases): a float array of shape (positions, len(FEATURES)) and the game phase
+        of each position.
+    """
+    corner_mask, x_square_mask = np.uint64(AdvancedEvaluator.corner_mask), np.uint64(AdvancedEvaluator.x_square_mask)
+    white_squares, black_squares = popcount_array(white), popcount_array(black)
+    columns = [
+        np.maximum(popcount_array(legal_moves_mask_array(white, black)), 1) -
+        np.maximum(popcount_array(legal_moves_mask_array(black, white)), 1),
+        popcount_array(white & corner_mask) - popcount_array(black & corner_mask),
+        popcount_array(black & x_square_mask) - popcount_array(white & x_square_mask),
+        white_squares - black_squares,
+    ]
+    columns += [popcount_array(white & mask) - popcount_array(black & mask) for mask in CLASS_MASKS]
+    empty_squares = 64 - white_squares - black_squares
+    phases = np.where(empty_squares > 40, 0, np.where(empty_squares > 20, 1, 2))
+    return np.stack(columns, axis=1).astype(np.float64), phases
+
+
+def labelled_chunks(dataset, target, size=CHUNK_SIZE):
+    """
+    The features and labels of the records of a dataset that have the target, chunk by chunk.
+    :param target: 'result' for the final disc differential of the game, 'score' for the search score.
+    :return: An iterator of (features, phases, labels) tuples.
+    """
+    flag, field = (HAS_RESULT, 'result') if target == 'result' else (HAS_SCORE, 'score')
+    for records in dataset.chunks(size):
+        records = records[(records['flags'] & flag) != 0]
+        if len(records):
+            x, phases = features(records['white'], records['black'])
+            yield x, phases, records[field].astype(np.float64)
+
+
+def fit_ridge(dataset, target='result', l2=1e-3, size=CHUNK_SIZE):
+    """
+    Fit the weights of each phase by least squares with an L2 penalty, in one pass over the dataset: the normal
+    equations are summed chunk by chunk, so memory does not grow with the dataset.
+    :param l2: The penalty per weight, relative to the mean squared error.
+    :return: A tuple (weights, counts, errors): weights of shape (PHASES, len(FEATURES)) and, per phase, the
+        number of positions and the root mean squared error of the fit.
+    """
+    dimension = len(FEATURES)
+    xtx = np.zeros((PHASES, dimension, dimension))
+    xty = np.zeros((PHASES, dimension))
+    yty = np.zeros(PHASES)
+    counts = np.zeros(PHASES, dtype=np.int64)
+    for x, phases, y in labelled_chunks(dataset, target, size):
+        for phase in range(PHASES):
+            selected = phases == phase
+            xp, yp = x[selected], y[selected]
+            xtx[phase] += xp.T @ xp
+            xty[phase] += xp.T @ yp
+            yty[phase] += yp @ yp
+            counts[phase] += len(yp)
+
+    weights = np.zeros((PHASES, dimension))
+    errors = np.zeros(PHASES)
+    for phase in range(PHASES):
+        n = max(counts[phase], 1)
+        weights[phase] = np.linalg.solve(xtx[phase] / n + l2 * np.eye(dimension), xty[phase] / n)
+        # The squared error expanded in the summed terms: y'y - 2 w'X'y + w'X'Xw
+        squared = yty[phase] - 2 * weights[phase] @ xty[phase] + weights[phase] @ xtx[phase] @ weights[phase]
+        errors[phase] = np.sqrt(max(squared, 0) / n)
+    return weights, counts, errors
+
+
+def fit_logistic(dataset, l2=1e-3, passes=8, size=CHUNK_SIZE):
+    """
+    Fit the weights of each phase to predict the game result by L2-regularized logistic regression: the
+    probability that white wins is sigmoid(weights . features), a draw counting as half a win. Each pass over
+    the dataset sums the gradient and Hessian chunk by chunk and takes one Newton step.
+    :return: A tuple (weights, counts, losses) with, per phase, the number of positions and the mean log loss.
+    """
+    dimension = len(FEATURES)
+    weights = np.zeros((PHASES, dimension))
+    counts = np.zeros(PHASES, dtype=np.int64)
+    losses = np.zeros(PHASES)
+    for _ in range(passes):
+        gradient = np.zeros((PHASES, dimension))
+        hessian = np.zeros((PHASES, dimension, dimension))
+        counts[:] = 0
+        losses[:] = 0
+        for x, phases, y in labelled_chunks(dataset, 'result', size):
+            wins = np.where(y > 0, 1.0, np.where(y < 0, 0.0, 0.5))
+            for phase in range(PHASES):
+                selected = phases == phase
+                xp, yp = x[selected], wins[selected]
+                logits = xp @ weights[phase]
+                p = 1 / (1 + np.exp(-logits))
+                gradient[phase] += xp.T @ (p - yp)
+                hessian[phase] += (xp * (p * (1 - p))[:, None]).T @ xp
+                losses[phase] += np.sum(np.logaddexp(0, logits) - yp * logits)
+                counts[phase] += len(yp)
+        for phase in range(PHASES):
+            n = max(counts[phase], 1)
+            step = np.linalg.solve(hessian[phase] / n + l2 * np.eye(dimension),
+                                   gradient[phase] / n + l2 * weights[phase])
+            weights[phase] -= step
+        losses /= np.maximum(counts, 1)
+    return weights, counts, losses
+
+
+def evaluator_weights(weights, scale):
+    """
+    Turn fitted weights into the integer tables of AdvancedEvaluator.
+    :param weights: Fitted weights of shape (PHASES, len(FEATURES)).
+    :param scale: Evaluation units per unit of the fitted model.
+    :return: A tuple (positional weights of shape (PHASES, 8, 8), phase weights of shape (PHASES, 5)).
+    """
+    scaled = np.rint(np.asarray(weights) * scale).astype(np.int64)
+    positional = scaled[:, FIRST_CLASS:][:, [CLASS_SQUARES.index(SQUARE_CLASS[square]) for square in range(64)]]
+    # (mobility, positional, corner, X-square penalty, piece): the X-square feature is already negated
+    phase_weights = np.stack([scaled[:, 0], np.ones(PHASES, dtype=np.int64), scaled[:, 1], -scaled[:, 2],
+                              scaled[:, 3]], axis=1)
+    return positional.reshape(PHASES, 8, 8), phase_weights
+
+
+def write_weights(path, positional, phase_weights, **info):
+    """
+    Write a weight file that AdvancedEvaluator(weights=path) loads.
+    :param info: More fields for the file, describing how the weights were made.
+    """
+    with open(path, 'w') as file:
+        json.dump(dict(evaluator='AdvancedEvaluator', positional=positional.tolist(),
+                       phase_weights=phase_weights.tolist(), **info), file, indent=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the weights of AdvancedEvaluator on a position dataset.")
+    parser.add_argument('dataset', help="The position dataset (see PositionDataset.py)")
+    parser.add_argument('--output', default='weights.json', help="The weight file to write")
+    parser.add_argument('--target', choices=('result', 'score'), default='result',
+                        help="Fit the final result of the game or the search score of the positions")
+    parser.add_argument('--method', choices=('ridge', 'logistic'), default='ridge',
+                        help="Least squares on the target, or logistic regression on who won (needs --target result)")
+    parser.add_argument('--l2', type=float, default=1e-3, help="The L2 penalty per weight")
+    parser.add_argument('--scale', type=float, help="Evaluation units per disc, score point or logit; by default "
+                                                    "10, 1 and 100")
+    parser.add_argument('--passes', type=int, default=8, help="Newton steps of the logistic regression")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Positions per mini-batch")
+    args = parser.parse_args()
+    if args.method == 'logistic' and args.target != 'result':
+        parser.error("--method logistic needs --target result")
+
+    start_time = time.time()
+    dataset = PositionDataset(args.dataset)
+    if args.method == 'ridge':
+        weights, counts, errors = fit_ridge(dataset, args.target, args.l2, args.chunk_size)
+        error_name = 'rmse'
+    else:
+        weights, counts, errors = fit_logistic(dataset, args.l2, args.passes, args.chunk_size)
+        error_name = 'log_loss'
+    if not counts.any():
+        parser.error(f"{args.dataset} has no positions with a {args.target}")
+
+    scale = args.scale if args.scale is not None else DEFAULT_SCALE[args.method, args.target]
+    positional, phase_weights = evaluator_weights(weights, scale)
+    write_weights(args.output, positional, phase_weights, method=args.method, target=args.target, l2=args.l2,
+                  scale=scale, positions=counts.tolist(), **{error_name: errors.tolist()})
+    for phase in range(PHASES):
+        print(f"phase {phase}: {counts[phase]} positions, {error_name} {errors[phase]:.3f}, "
+              f"(mobility, positional, corner, X-square, piece) = {phase_weights[phase].tolist()}")
+    print(f"Weights written to {args.output} in {time.time() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+import math
+import time
+import numpy as np
+from OthelloAlgorithm import OthelloAlgorithm
+from BitboardPosition import legal_moves_mask, legal_moves_mask_array, flips_mask, flips_mask_array, popcount_array
+from TimeManager import TimeManager
+from TranspositionTable import decode_move, PASS_MOVE
+from AlphaBeta import AlphaBeta
+from MoveOrderer import MoveOrderer
+from logger_config import get_logger
+
+log = get_logger('mcts')
+
+_ONE = np.uint64(1)
+
+
+def random_moves(moves, rng):
+    """
+    Pick a random legal move in each of an array of positions.
+    :param moves: uint64 array with the legal moves of each position.
+    :param rng: A NumPy random Generator.
+    :return: A uint64 array with the bit of the chosen move set, or 0 where there are no moves.
+    """
+    counts = popcount_array(moves)
+    picks = (rng.random(len(moves)) * counts).astype(np.int64)  # The index of the chosen bit among the set ones
+    for i in range(int(picks.max(initial=0))):
+        moves = np.where(picks > i, moves & (moves - _ONE), moves)  # Drop the lowest bit
+    return moves & (~moves + _ONE)
+
+
+def random_playouts(player, opponent, white_to_move, rng):
+    """
+    Play random games from many positions at once, all games one move per step.
+    :param player: uint64 array with the discs of the side to move.
+    :param opponent: uint64 array with the discs of the other side.
+    :param white_to_move: bool array, True where white has the move.
+    :param rng: A NumPy random Generator.
+    :return: A float array with the result of each game for white: 1 win, 0.5 draw, 0 loss.
+    """
+    passed = np.zeros(len(player), dtype=bool)  # The last move of the game was a pass
+    done = np.zeros(len(player), dtype=bool)
+    while True:
+        moves = legal_moves_mask_array(player, opponent)
+        stuck = moves == 0
+        done |= stuck & passed  # Neither side can move
+        if done.all():
+            break
+        passed = stuck
+        move = random_moves(moves, rng)
+        flips = flips_mask_array(player, opponent, move)
+        # A pass is a move that puts no disc: the sides just swap
+        next_player = np.where(done, player, opponent ^ flips)
+        opponent = np.where(done, opponent, player | move | flips)
+        player = next_player
+        white_to_move = white_to_move ^ ~done
+
+    player_discs, opponent_discs = popcount_array(player), popcount_array(opponent)
+    white_margin = np.where(white_to_move, player_discs - opponent_discs, opponent_discs - player_discs)
+    return np.sign(white_margin) * 0.5 + 0.5
+
+
+class MCTS(OthelloAlgorithm):
+    """
+    Monte Carlo Tree Search with the UCT rule and random playouts. No evaluator is needed: the value of a
+    position is the share of random games from it that are won.
+
+    The nodes live in preallocated arrays rather than Python objects: the discs of both sides, the side to move,
+    the parent, the move that led to the node, the first child and number of children (the children of a node
+    are stored together), visits and wins. The wins of a node count for the side that moved into it.
+
+    Every batch selects a number of leaves, adding their visits before the results are known (a virtual loss),
+    so that the leaves of one batch differ. All playouts of the batch are then played as one vectorized batch of
+    games on the NumPy bitboard functions, and the results are backed up.
+
+    The tree is kept between moves. When the next position is a grandchild of the last root (our move and the
+    opponent's answer), its subtree becomes the new tree.
+    """
+    EXPLORATION = 1.0      # Weight of the exploration term of UCT
+    BATCH_LEAVES = 64      # Leaves selected per batch
+    MIN_BATCH_LEAVES = 4   # Leaves of the first batch of a search; the batches grow from there to BATCH_LEAVES
+    FIRST_BATCH_TIME = 0.03  # Seconds a batch of MIN_BATCH_LEAVES is assumed to take until one is measured
+    PLAYOUTS_PER_LEAF = 8  # Random games from every selected leaf
+    MAX_NODES = 1 << 18
+
+    def __init__(self, exploration=EXPLORATION, batch_leaves=BATCH_LEAVES, playouts_per_leaf=PLAYOUTS_PER_LEAF,
+                 max_nodes=MAX_NODES, seed=None):
+        """
+        :param max_nodes: The capacity of the tree. A full tree stops growing, and its leaves get more playouts.
+        :param seed: The seed of the random playouts.
+        """
+        self.exploration = exploration
+        self.batch_leaves = batch_leaves
+        self.playouts_per_leaf = playouts_per_leaf
+        self.max_nodes = max_nodes
+        self.rng = np.random.default_rng(seed)
+        self.evaluator = None
+        self.search_depth = None
+        self.time_manager = TimeManager()
+
+        self.player_array = np.zeros(max_nodes, dtype=np.uint64)
+        self.opponent_array = np.zeros(max_nodes, dtype=np.uint64)
+        self.white_array = np.zeros(max_nodes, dtype=np.uint8)
+        self.expanded_array = np.zeros(max_nodes, dtype=np.uint8)
+        self.move_array = np.zeros(max_nodes, dtype=np.uint8)
+        self.child_count_array = np.zeros(max_nodes, dtype=np.uint8)
+        self.parent_array = np.zeros(max_nodes, dtype=np.int32)
+        self.first_child_array = np.zeros(max_nodes, dtype=np.int32)
+        self.visits_array = np.zeros(max_nodes, dtype=np.float64)
+        self.wins_array = np.zeros(max_nodes, dtype=np.float64)
+        # Element access through memoryviews is much faster than indexing the NumPy arrays directly
+        self.player = memoryview(self.player_array).cast('B').cast('Q')
+        self.opponent = memoryview(self.opponent_array).cast('B').cast('Q')
+        self.white = memoryview(self.white_array)
+        self.expanded = memoryview(self.expanded_array)
+        self.move = memoryview(self.move_array)
+        self.child_count = memoryview(self.child_count_array)
+        self.parent = memoryview(self.parent_array).cast('B').cast('i')
+        self.first_child = memoryview(self.first_child_array).cast('B').cast('i')
+        self.visits = memoryview(self.visits_array).cast('B').cast('d')
+        self.wins = memoryview(self.wins_array).cast('B').cast('d')
+        self.node_count = 0
+        self.root = None
+        self.playouts = 0  # Playouts of the current search
+        self.last_batch = (self.MIN_BATCH_LEAVES, self.FIRST_BATCH_TIME)  # (leaves, seconds) of the last batch
+
+    def set_evaluator(self, othello_evaluator):
+        self.evaluator = othello_evaluator  # Not used: positions are valued by random playouts
+
+    def set_search_depth(self, depth):
+        self.search_depth = depth  # Not used: the search runs until the time is up
+
+    def add_node(self, player, opponent, white, parent, move):
+        """
+        Store a new, unexpanded node.
+        :return: Its index.
+        """
+        node = self.node_count
+        self.node_count += 1
+        self.player[node] = player
+        self.opponent[node] = opponent
+        self.white[node] = white
+        self.parent[node] = parent
+        self.move[node] = move
+        self.expanded[node] = 0
+        self.child_count[node] = 0
+        self.first_child[node] = -1
+        self.visits[node] = 0.0
+        self.wins[node] = 0.0
+        return node
+
+    def expand(self, node):
+        """
+        Add the children of a node, one per legal move, or a pass when there is none but the opponent can move.
+        A finished game stays without children. Nothing happens when the tree is full.
+        """
+        player, opponent = self.player[node], self.opponent[node]
+        moves = legal_moves_mask(player, opponent)
+        count = moves.bit_count() if moves else (1 if legal_moves_mask(opponent, player) else 0)
+        if self.node_count + count > self.max_nodes:
+            return
+        white = 1 - self.white[node]
+        self.first_child[node] = self.node_count if count else -1
+        self.child_count[node] = count
+        self.expanded[node] = 1
+        if not moves and count:
+            self.add_node(opponent, player, white, node, PASS_MOVE)
+        while moves:
+            low = moves & -moves
+            square = low.bit_length() - 1
+            moves ^= low
+            flips = flips_mask(player, opponent, square)
+            self.add_node(opponent ^ flips, player | low | flips, white, node, square)
+
+    def select_child(self, node):
+        """
+        The child with the highest UCT value, or the first one that was never visited.
+        """
+        visits, wins = self.visits, self.wins
+        first = self.first_child[node]
+        log_visits = math.log(max(visits[node], 1.0))
+        exploration = self.exploration
+        best_child, best_value = first, -1.0
+        for child in range(first, first + self.child_count[node]):
+            child_visits = visits[child]
+            if child_visits == 0.0:
+                return child
+            value = wins[child] / child_visits + exploration * math.sqrt(log_visits / child_visits)
+            if value > best_value:
+                best_child, best_value = child, value
+        return best_child
+
+    def select_leaf(self):
+        """
+        Walk down from the root to a leaf, expanding a leaf that was visited before, and add the visits of the
+        coming playouts along the path.
+        """
+        node = self.root
+        while self.expanded[node] and self.child_count[node]:
+            node = self.select_child(node)
+        if not self.expanded[node] and (self.visits[node] > 0.0 or node == self.root):
+            self.expand(node)
+            if self.child_count[node]:
+                node = self.select_child(node)
+
+        playouts, visits, parent = float(self.playouts_per_leaf), self.visits, self.parent
+        ancestor = node
+        while ancestor >= 0:
+            visits[ancestor] += playouts
+            ancestor = parent[ancestor]
+        return node
+
+    def run_batch(self, leaf_count=None):
+        """
+        Select a batch of leaves, play out random games from all of them at once and back up the results.
+        :param leaf_count: The number of leaves, batch_leaves by default.
+        """
+        leaves = [self.select_leaf() for _ in range(leaf_count or self.batch_leaves)]
+        index = np.repeat(np.array(leaves, dtype=np.intp), self.playouts_per_leaf)
+        results = random_playouts(self.player_array[index], self.opponent_array[index],
+                                  self.white_array[index].astype(bool), self.rng)
+        white_wins = results.reshape(len(leaves), self.playouts_per_leaf).sum(axis=1).tolist()
+        self.playouts += len(index)
+
+        playouts, wins, white, parent = float(self.playouts_per_leaf), self.wins, self.white, self.parent
+        for leaf, leaf_white_wins in zip(leaves, white_wins):
+            node = leaf
+            while node >= 0:
+                # The wins of a node belong to the side that moved into it, the side not to move there
+                wins[node] += playouts - leaf_white_wins if white[node] else leaf_white_wins
+                node = parent[node]
+
+    def keep_subtree(self, node):
+        """
+        Make a node the root and drop all nodes outside its subtree, moving the subtree to the front of the
+        arrays. The children of a node stay together and in order.
+        """
+        count = self.node_count
+        parent = self.parent_array[:count]
+        keep = np.zeros(count, dtype=bool)
+        keep[node] = True
+        has_parent = parent >= 0
+        safe_parent = np.where(has_parent, parent, 0)
+        while True:  # Add the children of kept nodes until nothing changes, one level per step
+            grown = keep | (has_parent & keep[safe_parent])
+            if np.array_equal(grown, keep):
+                break
+            keep = grown
+
+        new_index = np.cumsum(keep) - 1
+        kept = int(keep.sum())
+        for array in (self.player_array, self.opponent_array, self.white_array, self.expanded_array,
+                      self.move_array, self.child_count_array, self.visits_array, self.wins_array):
+            array[:kept] = array[:count][keep]
+        old_parent = parent[keep]
+        old_first_child = self.first_child_array[:count][keep]
+        self.parent_array[:kept] = np.where(old_parent >= 0, new_index[np.maximum(old_parent, 0)], -1)
+        self.first_child_array[:kept] = np.where(old_first_child >= 0, new_index[np.maximum(old_first_child, 0)],
+                                                 -1)
+        self.parent[0] = -1
+        self.node_count = kept
+        self.root = 0
+
+    def set_root(self, position):
+        """
+        Start the search from a position, keeping the part of the tree below it if it is the last root, a child
+        or a grandchild of it.
+        """
+        white, black = position.get_bitboards()
+        player, opponent = (white, black) if position.maxPlayer else (black, white)
+        white_to_move = int(position.maxPlayer)
+        if self.root is not None:
+            candidates = [self.root]
+            for _ in range(2):
+                candidates += [child for node in candidates if self.expanded[node]
+                               for child in range(self.first_child[node],
+                                                  self.first_child[node] + self.child_count[node])]
+            for node in candidates:
+                if (self.player[node], self.opponent[node], self.white[node]) == (player, opponent, white_to_move):
+                    self.keep_subtree(node)
+                    return
+        self.node_count = 0
+        self.root = self.add_node(player, opponent, white_to_move, -1, PASS_MOVE)
+
+    def best_move(self):
+        """
+        The most visited move at the root.
+        :return: An OthelloAction, or None if the game is over.
+        """
+        root = self.root
+        if not self.child_count[root]:
+            return None
+        first = self.first_child[root]
+        children = range(first, first + self.child_count[root])
+        return decode_move(self.move[max(children, key=lambda child: self.visits[child])])
+
+    def batch_time(self, leaf_count):
+        """
+        The predicted seconds of a batch, from the last one. A batch costs much the same whatever its size, as
+        the playouts are vectorized, so scaling with the size overestimates, which is the safe side.
+        """
+        last_leaves, last_seconds = self.last_batch
+        return last_seconds * max(1.0, leaf_count / last_leaves)
+
+    def next_batch_size(self, leaf_count):
+        """
+        The number of leaves of the next batch: the largest power of two up to twice the last batch and
+        batch_leaves that is predicted to finish before the deadline, or 0 if not even the smallest does.
+        """
+        remaining = self.time_manager.remaining()
+        size = self.MIN_BATCH_LEAVES
+        if self.time_manager.stop_requested or self.batch_time(size) > remaining:
+            return 0
+        while size < min(2 * leaf_count, self.batch_leaves) and self.batch_time(2 * size) <= remaining:
+            size *= 2
+        return min(size, self.batch_leaves)
+
+    def evaluate(self, othello_position, time_limit=5):
+        """
+        Search until the time limit and return the most visited move. The first batches are small, and a batch
+        is only started if it is predicted to finish in time. Without time for a single batch, the move comes
+        from the tree kept from the last move or, failing that, from the square priors of MoveOrderer.
+        :return: The move string, "(row,col)" or "pass".
+        """
+        self.time_manager.start(time_limit)
+        self.set_root(othello_position)
+        self.playouts = 0
+        reused = self.visits[self.root]
+        leaf_count = self.next_batch_size(self.MIN_BATCH_LEAVES // 2)
+        while leaf_count:
+            start_time = time.monotonic()
+            self.run_batch(leaf_count)
+            self.last_batch = (leaf_count, time.monotonic() - start_time)
+            leaf_count = self.next_batch_size(leaf_count)
+
+        if self.visits[self.root]:
+            move = self.best_move()
+        else:
+            legal_moves = othello_position.get_moves()
+            move = MoveOrderer().order(legal_moves, 0, None, othello_position.maxPlayer)[0] if legal_moves else None
+        log.debug("mcts search done", extra={'fields': {
+            'position': othello_position.get_board_string(), 'move': AlphaBeta.move_string(move),
+            'playouts': self.playouts, 'reused_visits': reused, 'nodes': self.node_count}})
+        return AlphaBeta.move_string(move)
@@ -0,0 +1,317 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from OthelloPosition import OthelloPosition
+from OthelloAction import OthelloAction
+from AlphaBeta import AlphaBeta
+from PVSearch import PVSearch
+from ProbCut import ProbCut
+from MCTS import MCTS
+from PositionDataset import PositionWriter, encode_games
+from CountingEvaluator import CountingEvaluator, AdvancedEvaluator
+from PatternEvaluator import PatternEvaluator
+from Othello import get_best_action
+
+EVALUATORS = {'counting': CountingEvaluator, 'advanced': AdvancedEvaluator, 'pattern': PatternEvaluator}
+SEARCHES = ('alphabeta', 'pvs', 'mcts')
+COMMAND_SLACK = 2.0  # Seconds an external engine may take beyond the time limit (process start-up) before it forfeits
+
+
+class EngineSpec(object):
+    """
+    A player of a match: either a search configuration run in-process, or an external command called like
+    othello.sh, with the position and the time limit as arguments, printing the move.
+
+    Written as comma-separated key=value pairs, for instance "evaluator=advanced,depth=6,time=0.5" or
+    "name=old,command=./othello.sh {position} {time} 0". The command comes last and runs to the end of the text,
+    so it may contain commas. {position} and {time} in it are replaced by the arguments; without them both are
+    appended. Keys: name, engine (alphabeta, pvs or mcts, which uses neither evaluator nor depth), evaluator
+    (counting, advanced or pattern; counting by default, or the evaluator the probcut parameters were fitted
+    for), depth (a cap on the search depth; without it the engine deepens until its time is up, like
+    othello.sh), time (seconds, instead of the time limit of the match), book (an opening book file), probcut (a
+    ProbCut parameter file, for pvs), weights (a file of tuned weights for the evaluator, built with
+    EvaluatorTuning.py or PatternEvaluator.py) and command.
+    """
+
+    def __init__(self, name=None, evaluator=None, depth=None, time_limit=None, book='', command=None,
+                 engine='alphabeta', probcut='', weights=''):
+        fitted = ProbCut.load(probcut).evaluator if probcut else None
+        if evaluator is None:
+            evaluator = next((key for key, evaluator_class in EVALUATORS.items()
+                              if evaluator_class.__name__ == fitted), 'counting')
+        if evaluator not in EVALUATORS:
+            raise ValueError(f"Unknown evaluator {evaluator}, expected one of {', '.join(EVALUATORS)}")
+        if engine not in SEARCHES:
+            raise ValueError(f"Unknown engine {engine}, expected one of {', '.join(SEARCHES)}")
+        if probcut and engine != 'pvs':
+            raise ValueError("probcut needs engine=pvs")
+        if probcut and EVALUATORS[evaluator].__name__ != fitted:
+            raise ValueError(f"{probcut} is fitted for {fitted}, not for evaluator={evaluator}")
+        if weights and evaluator == 'counting':
+            raise ValueError("weights needs evaluator=advanced or evaluator=pattern")
+        self.engine = engine
+        self.probcut = probcut
+        self.weights = weights
+        self.evaluator = evaluator
+        self.depth = depth if depth else AlphaBeta.MAX_SEARCH_DEPTH  # Without a depth, the time limit decides
+        self.time_limit = time_limit
+        self.book = book
+        self.command = command
+        prefix = '' if engine == 'alphabeta' else engine + '-'
+        suffix = (f'-d{depth}' if depth else '') + ('-mpc' if probcut else '') + ('-tuned' if weights else '')
+        if name:
+            self.name = name
+        elif command:
+            self.name = os.path.basename(shlex.split(command)[0])
+        else:
+            self.name = 'mcts' if engine == 'mcts' else f"{prefix}{evaluator}{suffix}"
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Read an engine from its "key=value,..." form. A text without "=" is taken as a command.
+        """
+        if '=' not in text:
+            return cls(command=text)
+        command = None
+        if text.startswith('command='):
+            text, command = '', text[len('command='):]
+        elif ',command=' in text:
+            text, command = text.split(',command=', 1)
+        options = dict(part.split('=', 1) for part in text.split(',')) if text else {}
+        unknown = set(options) - {'name', 'engine', 'evaluator', 'depth', 'time', 'book', 'probcut', 'weights',
+                                  'command'}
+        if unknown:
+            raise ValueError(f"Unknown engine option {', '.join(sorted(unknown))} in {text}")
+        return cls(name=options.get('name'), evaluator=options.get('evaluator'),
+                   depth=int(options['depth']) if 'depth' in options else None,
+                   time_limit=float(options['time']) if 'time' in options else None,
+                   book=options.get('book', ''), command=command,
+                   engine=options.get('engine', 'alphabeta'), probcut=options.get('probcut', ''),
+                   weights=options.get('weights', ''))
+
+    def player(self):
+        """
+        Create the player: a function from (position, time limit) to a move string.
+        """
+        if self.command:
+            command = shlex.split(self.command)
+            if not any('{position}' in word or '{time}' in word for word in command):
+                command += ['{position}', '{time}']
+
+            def play(position, time_limit):
+                # othello.sh and the Java engines expect whole seconds
+                seconds = int(time_limit) if time_limit == int(time_limit) else time_limit
+                arguments = [word.replace('{position}', position.get_board_string()).replace('{time}', str(seconds))
+                             for word in command]
+                try:
+                    result = subprocess.run(arguments, capture_output=True, text=True,
+                                            timeout=time_limit + COMMAND_SLACK)
+                except subprocess.TimeoutExpired:
+                    return f"no answer within {time_limit + COMMAND_SLACK:g}s"
+                lines = result.stdout.split()
+                return lines[-1] if lines else f"no output (exit code {result.returncode})"
+            return play
+
+        evaluator = EVALUATORS[self.evaluator](self.weights) if self.weights else EVALUATORS[self.evaluator]()
+        if self.engine == 'mcts':
+            alpha_beta = MCTS()
+        elif self.engine == 'pvs':
+            probcut = ProbCut.load(self.probcut) if self.probcut else None
+            alpha_beta = PVSearch(search_depth=self.depth, evaluator=evaluator, probcut=probcut)
+        else:
+            alpha_beta = AlphaBeta(search_depth=self.depth, evaluator=evaluator, make_unmake=True)
+        return lambda position, time_limit: get_best_action(position, time_limit, alpha_beta, self.book)
+
+
+def random_opening(plies, seed):
+    """
+    A position after a number of random moves from the start position.
+    :return: A tuple (position, list of move strings).
+    """
+    rng = random.Random(seed)
+    position = OthelloPosition()
+    position.initialize()
+    moves = []
+    for _ in range(plies):
+        if position.is_game_over():
+            break
+        move = rng.choice(position.get_moves())
+        moves.append(AlphaBeta.move_string(move))
+        position = position.make_move(move)
+    return position, moves
+
+
+def play_game(white, black, time_limit, opening_plies=0, seed=0):
+    """
+    Play one game. An illegal move or an answer that is not a move loses the game for the side that made it.
+    :param white: The EngineSpec playing white.
+    :param black: The EngineSpec playing black.
+    :param time_limit: The time limit per move in seconds, for engines without their own.
+    :param opening_plies: The number of random moves played before the engines take over.
+    :param seed: The seed of the random opening.
+    :return: A dict describing the game. Its result is the final disc differential for white.
+    """
+    position, moves = random_opening(opening_plies, seed)
+    players = {True: (white, white.player()), False: (black, black.player())}
+    times = {True: [], False: []}  # Milliseconds per move
+    forfeit = None
+
+    while not position.is_game_over():
+        spec, player = players[position.maxPlayer]
+        limit = spec.time_limit if spec.time_limit is not None else time_limit
+        start_time = time.monotonic()
+        answer = player(position, limit)
+        times[position.maxPlayer].append((time.monotonic() - start_time) * 1000)
+
+        try:
+            move = OthelloAction.from_string(answer)
+        except ValueError:
+            move = None
+        legal_moves = position.get_moves() or [OthelloAction(0, 0, is_pass_move=True)]
+        if move is None or not any(m.is_pass_move == move.is_pass_move and m.row == move.row and m.col == move.col
+                                   for m in legal_moves):
+            forfeit = {'side': 'white' if position.maxPlayer else 'black', 'answer': answer,
+                       'position': position.get_board_string()}
+            break
+        moves.append(answer)
+        position = position.make_move(move)
+
+    white_discs, black_discs = (bitboard.bit_count() for bitboard in position.get_bitboards())
+    result = white_discs - black_discs
+    if forfeit:
+        result = -64 if forfeit['side'] == 'white' else 64
+    return {'white': white.name, 'black': black.name, 'seed': seed, 'result': result, 'forfeit': forfeit,
+            'moves': moves, 'final_position': position.get_board_string(),
+            'white_ms': times[True], 'black_ms': times[False]}
+
+
+def elo_difference(score):
+    """
+    The Elo difference that makes a player expect the given score (0-1) against the opponent.
+    """
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def summarize(games, engine, opponent):
+    """
+    Results of one engine against another.
+    :return: A dict with wins, draws, losses, the score, and the Elo difference with its 95% interval.
+    """
+    scores = []
+    for game in games:
+        if {game['white'], game['black']} != {engine, opponent}:
+            continue
+        result = game['result'] if game['white'] == engine else -game['result']
+        scores.append(1.0 if result > 0 else 0.5 if result == 0 else 0.0)
+    n = len(scores)
+    if n == 0:
+        return None
+    mean = sum(scores) / n
+    deviation = math.sqrt(sum((s - mean) ** 2 for s in scores) / n)
+    margin = 1.96 * deviation / math.sqrt(n)
+    return {'engine': engine, 'opponent': opponent, 'games': n,
+            'wins': scores.count(1.0), 'draws': scores.count(0.5), 'losses': scores.count(0.0),
+            'score': mean, 'elo': elo_difference(mean),
+            'elo_low': elo_difference(mean - margin), 'elo_high': elo_difference(mean + margin)}
+
+
+def time_summary(games, engine):
+    """
+    Move times of an engine over all games: mean and maximum in milliseconds.
+    """
+    times = [ms for game in games for side in ('white', 'black') if game[side] == engine
+             for ms in game[side + '_ms']]
+    return {'engine': engine, 'moves': len(times), 'mean_ms': sum(times) / len(times) if times else 0,
+            'max_ms': max(times, default=0)}
+
+
+def run_match(engines, games_per_pair, time_limit, opening_plies=4, seed=0, jobs=None, on_game=None):
+    """
+    Play every pair of engines against each other. Each random opening is played twice, with the colours
+    swapped, so both engines get the same openings with both colours.
+    :param engines: A list of EngineSpec.
+    :param games_per_pair: The number of games per pair of engines, rounded up to an even number.
+    :param jobs: The number of games played at the same time, all cores by default.
+    :param on_game: Optional function called with each finished game.
+    :return: The list of games, as returned by play_game.
+    """
+    tasks = []
+    for pair_index, (first, second) in enumerate(itertools.combinations(engines, 2)):
+        for opening in range((games_per_pair + 1) // 2):
+            opening_seed = seed + 1000003 * pair_index + opening
+            tasks.append((first, second, time_limit, opening_plies, opening_seed))
+            tasks.append((second, first, time_limit, opening_plies, opening_seed))
+
+    games = []
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        for future in as_completed([executor.submit(play_game, *task) for task in tasks]):
+            game = future.result()
+            games.append(game)
+            if on_game:
+                on_game(game)
+    return games
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play Othello engines against each other.",
+                                     epilog=EngineSpec.__doc__)
+    parser.add_argument('engines', nargs='+', help="Two or more engines, see below")
+    parser.add_argument('--games', type=int, default=20, help="Games per pair of engines")
+    parser.add_argument('--time', type=float, default=1.0, help="Time limit per move in seconds")
+    parser.add_argument('--opening-plies', type=int, default=4, help="Random moves at the start of each game")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random openings")
+    parser.add_argument('--jobs', type=int, default=None, help="Games played at the same time, all cores by default")
+    parser.add_argument('--output', help="Write every game as a JSON line to this file")
+    parser.add_argument('--dataset', help="Write the positions of every game to this position dataset file "
+                                          "(see PositionDataset.py)")
+    args = parser.parse_args()
+
+    engines = [EngineSpec.parse(text) for text in args.engines]
+    names = [engine.name for engine in engines]
+    if len(engines) < 2 or len(set(names)) != len(names):
+        parser.error("Give at least two engines, with different names")
+
+    output = open(args.output, 'w') if args.output else None
+    dataset = PositionWriter(args.dataset) if args.dataset else None
+    game_ids = itertools.count()
+
+    def on_game(game):
+        print(f"{game['white']} - {game['black']}: {game['result']:+d}"
+              + (f" ({game['forfeit']['side']} forfeits)" if game['forfeit'] else ""), file=sys.stderr)
+        if output:
+            output.write(json.dumps(game) + '\n')
+            output.flush()
+        if dataset:
+            for records in encode_games([game], next(game_ids)):
+                dataset.write(records)
+
+    try:
+        games = run_match(engines, args.games, args.time, args.opening_plies, args.seed, args.jobs, on_game)
+    finally:
+        if output:
+            output.close()
+        if dataset:
+            dataset.close()
+
+    for engine, opponent in itertools.combinations(names, 2):
+        summary = summarize(games, engine, opponent)
+        print(f"{engine} vs {opponent}: +{summary['wins']} ={summary['draws']} -{summary['losses']} "
+              f"({100 * summary['score']:.1f}%), Elo {summary['elo']:+.0f} "
+              f"[{summary['elo_low']:+.0f}, {summary['elo_high']:+.0f}]")
+    for engine in names:
+        timing = time_summary(games, engine)
+        print(f"{engine}: {timing['moves']} moves, mean {timing['mean_ms']:.0f} ms, max {timing['max_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
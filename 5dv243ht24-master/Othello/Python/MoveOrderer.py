@@ -0,0 +1,75 @@
+from CountingEvaluator import AdvancedEvaluator
+from TranspositionTable import encode_move
+
+# Static prior of every square, from the positional weights: corners first, X-squares last
+SQUARE_PRIORS = [int(weight) for weight in AdvancedEvaluator.positional_weights.flatten()] + [0]  # + pass
+
+# Ordering classes, far apart so that they dominate the history score
+TT_MOVE_SCORE = 1 << 40
+KILLER_SCORES = (1 << 39, 1 << 38)
+
+
+class MoveOrderer(object):
+    """
+    Orders the moves of a node for the AlphaBeta search without making them. The best move from the
+    transposition table (the principal variation move) comes first, then the killer moves of the ply, i.e.
+    the last moves that caused a cutoff at the same distance from the root, then moves by their history
+    score (how much they have caused cutoffs anywhere in the tree), and finally by the static square priors.
+    """
+    KILLERS_PER_PLY = 2
+    MAX_PLY = 128
+
+    def __init__(self):
+        self.killers = [[None] * self.KILLERS_PER_PLY for _ in range(self.MAX_PLY)]
+        self.history = [[0] * 65, [0] * 65]  # Per side (0 black, 1 white) and square
+
+    def new_search(self):
+        """
+        Prepare for the search of a new position. Killers are forgotten and the history fades.
+        """
+        for killers in self.killers:
+            killers[:] = [None] * self.KILLERS_PER_PLY
+        for side in self.history:
+            side[:] = [score >> 1 for score in side]
+
+    def order(self, moves, ply, tt_move, white_to_move):
+        """
+        Sort moves from most to least promising.
+        :param moves: The legal moves as a list of OthelloAction.
+        :param ply: The distance from the root of the search.
+        :param tt_move: The best move stored in the transposition table, or None.
+        :param white_to_move: True if white has the move.
+        :return: A new, sorted list.
+        """
+        if len(moves) < 2:
+            return moves
+        tt_square = encode_move(tt_move)
+        killers = self.killers[ply] if ply < self.MAX_PLY else ()
+        history = self.history[white_to_move]
+
+        def score(move):
+            square = encode_move(move)
+            if square == tt_square:
+                return TT_MOVE_SCORE
+            for killer, killer_score in zip(killers, KILLER_SCORES):
+                if square == killer:
+                    return killer_score
+            return (history[square] << 8) + SQUARE_PRIORS[square]
+
+        return sorted(moves, key=score, reverse=True)
+
+    def record_cutoff(self, move, ply, depth, white_to_move):
+        """
+        Remember a move that caused a beta cutoff.
+        :param move: The move, an OthelloAction.
+        :param ply: The distance from the root of the search.
+        :param depth: The remaining depth of the node. Deep cutoffs count more.
+        :param white_to_move: True if white made the move.
+        """
+        square = encode_move(move)
+        self.history[white_to_move][square] += depth * depth
+        if ply < self.MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != square:
+                killers[1] = killers[0]
+                killers[0] = square
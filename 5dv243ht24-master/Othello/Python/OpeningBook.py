@@ -0,0 +1,150 @@
+import argparse
+import os
+import time
+import numpy as np
+from AlphaBeta import AlphaBeta
+from CountingEvaluator import AdvancedEvaluator
+from OthelloPosition import OthelloPosition
+from BitboardPosition import legal_moves_mask
+from TranspositionTable import encode_move, decode_move, PASS_MOVE
+import Symmetry
+
+# One book entry. The key is the canonical key of the position (see OthelloPosition.canonical_key), the move is a
+# square of the canonical orientation (or PASS_MOVE), the score is from white's point of view.
+BOOK_DTYPE = np.dtype([('key', '<u8'), ('score', '<i4'), ('move', 'u1'), ('depth', 'u1')])
+
+# The book the engine uses unless told otherwise
+DEFAULT_BOOK = os.environ.get('OTHELLO_BOOK', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           'opening_book.npy'))
+
+
+class OpeningBook(object):
+    """
+    A read-only opening book: a .npy file of BOOK_DTYPE entries sorted by key. The file is memory-mapped, so
+    opening it costs nothing and a lookup (a binary search on the keys) only touches a few pages.
+
+    Positions are stored in their canonical orientation, so one entry covers all 8 symmetric positions.
+    """
+    _open_books = {}  # Books opened by open(), by path
+
+    def __init__(self, path=DEFAULT_BOOK):
+        self.entries = np.load(path, mmap_mode='r')
+        if self.entries.dtype != BOOK_DTYPE:
+            raise ValueError(f"{path} is not an opening book")
+        self.keys = self.entries['key']
+
+    @classmethod
+    def open(cls, path=DEFAULT_BOOK):
+        """
+        Open a book if the file exists. Each file is only mapped once per process.
+        :return: The OpeningBook, or None if there is no such file.
+        """
+        if path not in cls._open_books:
+            cls._open_books[path] = cls(path) if os.path.exists(path) else None
+        return cls._open_books[path]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def probe(self, position):
+        """
+        Look up a position.
+        :param position: An OthelloPosition or BitboardPosition.
+        :return: A tuple (move, score, depth) with the move as an OthelloAction for the position as given,
+            or None if the position is not in the book or its book move is not legal there (a key collision).
+        """
+        key, symmetry = position.canonical_key()
+        index = int(np.searchsorted(self.keys, np.uint64(key)))
+        if index == len(self.keys) or int(self.keys[index]) != key:
+            return None
+        entry = self.entries[index]
+        move = Symmetry.from_canonical(decode_move(int(entry['move'])), symmetry)
+        code = encode_move(move)
+
+        white, black = position.get_bitboards()
+        player, opponent = (white, black) if position.maxPlayer else (black, white)
+        moves = legal_moves_mask(player, opponent)
+        if not (moves >> code & 1 if code < 64 else code == PASS_MOVE and not moves):
+            return None
+        return move, int(entry['score']), int(entry['depth'])
+
+    def lookup(self, position):
+        """
+        The book move for a position.
+        :return: The move as an OthelloAction, or None if the position is not in the book.
+        """
+        found = self.probe(position)
+        return found[0] if found else None
+
+
+def write_book(path, entries):
+    """
+    Write a book file.
+    :param entries: A dict from canonical key to (move code, score, depth), the move in canonical orientation.
+    """
+    book = np.zeros(len(entries), dtype=BOOK_DTYPE)
+    for i, (key, (move, score, depth)) in enumerate(sorted(entries.items())):
+        book[i] = (key, score, move, depth)
+    np.save(path, book)
+
+
+def build_book(full_plies=4, plies=12, depth=6, alpha_beta=None, log=None):
+    """
+    Search the openings. Every move is followed for the first full_plies moves of the game, after that only
+    the best move, up to plies moves.
+    :param depth: The search depth for each position.
+    :param alpha_beta: The AlphaBeta engine to search with, by default one with the AdvancedEvaluator.
+    :param log: Optional function called with a progress message for every position.
+    :return: A dict from canonical key to (move code, score, depth), as write_book takes it.
+    """
+    if alpha_beta is None:
+        alpha_beta = AlphaBeta(search_depth=depth, evaluator=AdvancedEvaluator(), make_unmake=True,
+                               endgame_empties=0)
+    start = OthelloPosition()
+    start.initialize()
+    entries = {}
+    frontier = [start]
+    for ply in range(plies):
+        next_frontier = []
+        for position in frontier:
+            if position.is_game_over():
+                continue
+            key, symmetry = position.canonical_key()
+            if key in entries:
+                continue
+
+            alpha_beta.start_clock(float('inf'))
+            alpha_beta.new_search()
+            move = alpha_beta.iterative_deepening(position, depth)
+            cached_value = alpha_beta.probe(*alpha_beta.board_hash(position))
+            if cached_value is not None:
+                score = cached_value[0]
+                entries[key] = (encode_move(Symmetry.transform_action(move, symmetry)), score,
+                                alpha_beta.completed_depth)
+                if log:
+                    log(f"ply {ply} {position.get_board_string()} {AlphaBeta.move_string(move)} {score}")
+            elif log:  # The root entry was replaced, or the search did not store one: no score to book
+                log(f"ply {ply} {position.get_board_string()} {AlphaBeta.move_string(move)} not booked, no score")
+
+            for child_move in position.get_moves() if ply < full_plies else [move]:
+                next_frontier.append(position.make_move(child_move))
+        frontier = next_frontier
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book for the Othello engine.")
+    parser.add_argument('--output', default=DEFAULT_BOOK, help="The book file to write")
+    parser.add_argument('--full-plies', type=int, default=4, help="Follow every move for this many plies")
+    parser.add_argument('--plies', type=int, default=12, help="Follow the best move up to this many plies")
+    parser.add_argument('--depth', type=int, default=6, help="The search depth for each position")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    entries = build_book(args.full_plies, args.plies, args.depth, log=print)
+    write_book(args.output, entries)
+    print(f"{len(entries)} positions written to {args.output} in {time.time() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,24 @@
+import argparse
 import sys
 from OthelloPosition import OthelloPosition
 from AlphaBeta import AlphaBeta
+from OpeningBook import OpeningBook, DEFAULT_BOOK
 
-def get_best_action(othello_position, time_limit):
+def get_best_action(othello_position, time_limit, alpha_beta=None, book_path=DEFAULT_BOOK):
     """
     This function calculates the best move for the current player using AlphaBeta pruning.
     Ensures the move is either "pass" or in the correct format "(row,col)".
+    A long-lived caller can pass its own AlphaBeta instance to keep the transposition table between moves.
+    Positions found in the opening book at book_path (if the file exists) are answered without a search.
     """
-    alpha_beta = AlphaBeta()  # Initialize AlphaBeta algorithm
+    book = OpeningBook.open(book_path) if book_path else None
+    book_move = book.lookup(othello_position) if book else None
+    if book_move is not None:
+        return AlphaBeta.move_string(book_move)
+
+    if alpha_beta is None:
+        # Initialize AlphaBeta algorithm, deepening until the time is up
+        alpha_beta = AlphaBeta(search_depth=AlphaBeta.MAX_SEARCH_DEPTH, make_unmake=True)
     move_str = alpha_beta.evaluate(othello_position, time_limit)  # Pass the position and time limit
 
     # Validate the move string to ensure it's either "pass" or "(row,col)"
@@ -21,12 +32,125 @@ def get_best_action(othello_position, time_limit):
         raise ValueError(f"Invalid move string: {move_str}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Othello engine. Prints the best move for a position.")
+    parser.add_argument('position', nargs='?', help="The 65-character board position")
+    parser.add_argument('time_limit', nargs='?', type=float, help="The time limit in seconds")
+    parser.add_argument('--serve', nargs='?', const='', metavar='SOCKET',
+                        help="Run as a long-lived engine answering requests on a Unix socket")
+    parser.add_argument('--stdin', action='store_true',
+                        help="Run as a long-lived engine answering '<position> <time_limit>' lines on stdin")
+    parser.add_argument('--ponder', action='store_true',
+                        help="With --serve or --stdin, keep searching on the opponent's time")
+    parser.add_argument('--engine', choices=('alphabeta', 'pvs', 'mcts'), default='alphabeta',
+                        help="The search: alpha-beta, principal variation search with aspiration windows, or "
+                             "Monte Carlo Tree Search")
+    parser.add_argument('--probcut', nargs='?', const='', metavar='FILE',
+                        help="With --engine pvs, prune selectively with Multi-ProbCut parameters from FILE "
+                             "(built with ProbCut.py; the default file if no FILE is given). The evaluator is the "
+                             "one the parameters were fitted for")
+    parser.add_argument('--evaluator', choices=('counting', 'advanced', 'pattern'),
+                        help="The evaluation of the search: disc count (the default), AdvancedEvaluator or "
+                             "PatternEvaluator")
+    parser.add_argument('--weights', metavar='FILE',
+                        help="Tuned weights for the evaluator, built with EvaluatorTuning.py for advanced (the "
+                             "default with --weights) or PatternEvaluator.py for pattern")
+    parser.add_argument('--depth', type=int, default=AlphaBeta.MAX_SEARCH_DEPTH,
+                        help="The maximum search depth; by default the search deepens until the time is up")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of processes searching in parallel (Lazy SMP), 0 for all cores")
+    parser.add_argument('--stats', metavar='FILE',
+                        help="Append statistics of every search to FILE as JSON lines ('-' for stderr)")
+    parser.add_argument('--log', metavar='FILE',
+                        help="Write diagnostics to FILE as JSON lines, from a background thread")
+    parser.add_argument('--log-level', default='INFO',
+                        help="Log level, or per component, e.g. 'INFO,search=DEBUG,server=WARNING'")
+    parser.add_argument('--book', default=DEFAULT_BOOK,
+                        help="The opening book file (built with OpeningBook.py), '' to play without a book")
+    args = parser.parse_args()
+    if args.ponder and args.workers != 1:
+        parser.error("--ponder needs --workers 1")
+    if args.engine != 'alphabeta' and args.workers != 1:
+        parser.error(f"--engine {args.engine} needs --workers 1")
+    if args.engine == 'mcts' and (args.ponder or args.stats or args.evaluator or args.weights
+                                  or args.depth != AlphaBeta.MAX_SEARCH_DEPTH):
+        parser.error("--engine mcts does not support --ponder, --stats, --evaluator, --weights or --depth")
+    if args.depth < 1:
+        parser.error("--depth must be at least 1")
+    if args.weights and args.evaluator == 'counting':
+        parser.error("--weights needs --evaluator advanced or pattern")
+    if args.probcut is not None and args.engine != 'pvs':
+        parser.error("--probcut needs --engine pvs")
+
+    if args.log:
+        import logger_config
+        level, levels = logger_config.parse_levels(args.log_level)
+        logger_config.configure(args.log, level or 'INFO', levels)
+
+    stats_file = None
+    if args.stats:
+        stats_file = sys.stderr if args.stats == '-' else open(args.stats, 'a')
+
+    probcut = None
+    if args.probcut is not None:
+        from ProbCut import ProbCut, DEFAULT_PROBCUT
+        probcut = ProbCut.load(args.probcut or DEFAULT_PROBCUT)
+
+    evaluator = None
+    if args.evaluator == 'pattern':
+        from PatternEvaluator import PatternEvaluator
+        evaluator = PatternEvaluator(args.weights)
+    elif args.evaluator == 'advanced' or args.weights:
+        from CountingEvaluator import AdvancedEvaluator
+        evaluator = AdvancedEvaluator(args.weights)
+    elif args.evaluator == 'counting':
+        from CountingEvaluator import CountingEvaluator
+        evaluator = CountingEvaluator()
+    elif probcut is not None:
+        from ProbCut import EVALUATORS  # The evaluator the ProbCut parameters were fitted for
+        if probcut.evaluator not in EVALUATORS:
+            parser.error(f"The ProbCut parameters are fitted for an unknown evaluator {probcut.evaluator}")
+        evaluator = EVALUATORS[probcut.evaluator]()
+    if probcut is not None and probcut.evaluator != type(evaluator).__name__:
+        parser.error(f"The ProbCut parameters are fitted for {probcut.evaluator}, not for --evaluator "
+                     f"{args.evaluator}")
+
+    def new_algorithm():
+        """
+        Make the search the options ask for. A server makes one per request it answers at the same time.
+        """
+        stats = None
+        if stats_file:
+            from SearchStats import SearchStats
+            stats = SearchStats(stats_file)
+        if args.workers != 1:
+            from ParallelAlphaBeta import ParallelAlphaBeta
+            return ParallelAlphaBeta(workers=args.workers, search_depth=args.depth, evaluator=evaluator,
+                                     stats=stats)
+        if args.engine == 'pvs':
+            from PVSearch import PVSearch
+            return PVSearch(search_depth=args.depth, evaluator=evaluator, probcut=probcut, stats=stats)
+        if args.engine == 'mcts':
+            from MCTS import MCTS
+            return MCTS()
+        return AlphaBeta(search_depth=args.depth, evaluator=evaluator, make_unmake=True, stats=stats)
+
+    algorithm = new_algorithm()
+
+    if args.serve is not None or args.stdin:
+        from OthelloServer import OthelloServer, DEFAULT_SOCKET
+        server = OthelloServer(algorithm, ponder=args.ponder, book_path=args.book, new_engine=new_algorithm)
+        if args.stdin:
+            server.serve_stdin()
+        else:
+            server.serve_socket(args.serve or DEFAULT_SOCKET)
+        return
+
     # Read the command line arguments: board position and time limit
-    if len(sys.argv) < 3:
+    if args.position is None or args.time_limit is None:
         raise ValueError("Insufficient arguments. Usage: python Othello.py <position> <time_limit>")
-    
-    position = sys.argv[1]  # The 65-character board position
-    time_limit = int(sys.argv[2])  # The time limit in seconds
+
+    position = args.position  # The 65-character board position
+    time_limit = args.time_limit  # The time limit in seconds
 
     # Ensure the position is the correct length (65 characters for an Othello board)
     if len(position) != 65:
@@ -34,9 +158,9 @@ def main():
 
     # Initialize the Othello position with the provided board state
     othello_position = OthelloPosition(position)
-    
+
     # Get the best action (this will be a move string)
-    move_str = get_best_action(othello_position, time_limit)
+    move_str = get_best_action(othello_position, time_limit, algorithm, args.book)
 
     # Output only the move, in the required format (either "pass" or "(row,col)")
     print(move_str, flush=True)
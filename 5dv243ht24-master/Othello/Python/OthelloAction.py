@@ -18,6 +18,18 @@ class OthelloAction(object):
         self.is_pass_move = is_pass_move
         self.value = 0
 
+    @staticmethod
+    def from_string(move_str):
+        """
+        Creates an OthelloAction from the engine output format, "pass" or "(row,col)".
+        :param move_str: The move as a string
+        :return: The OthelloAction
+        """
+        if move_str.strip().lower() == "pass":
+            return OthelloAction(0, 0, is_pass_move=True)
+        row, col = map(int, move_str.strip().strip("()").split(','))
+        return OthelloAction(row, col)
+
     def print_move(self):
         """
         Prints the move in the format (3,6) or Pass.
@@ -0,0 +1,89 @@
+import glob
+import hashlib
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def code_version():
+    """
+    A hash of the engine code: the path of this directory and the contents of its Python files. Another
+    checkout, or the same one after an edit, gets another hash.
+    """
+    directory = os.path.dirname(os.path.realpath(__file__))
+    digest = hashlib.sha1(directory.encode())
+    for path in sorted(glob.glob(os.path.join(directory, '*.py'))):
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+# The socket the engine listens on unless told otherwise. One per user and version of the code, so engines of
+# different users, checkouts or versions on the same machine do not answer each other's requests; a server
+# of old code is left to shut itself down when idle. OthelloServer takes it from here, as this module does not
+# import NumPy.
+DEFAULT_SOCKET = os.environ.get('OTHELLO_ENGINE_SOCKET', os.path.join(
+    tempfile.gettempdir(), f"othello-engine-{os.getuid()}-{code_version()}.sock"))
+
+# Seconds of the time limit the server is not given, so that the client can still answer in-process if the
+# server does not answer: starting Python and importing the engine take about 0.3 s. At most half of the limit.
+FALLBACK_RESERVE = 0.5
+
+
+def request_move(position, time_limit, path=DEFAULT_SOCKET):
+    """
+    Ask the engine server for a move. The server answers before its time limit, so that is how long the
+    client waits.
+    :return: The answer of the server.
+    :raises OSError: If there is no server or it did not answer in time.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(time_limit)
+        sock.connect(path)
+        sock.sendall(f"{position} {time_limit}\n".encode('ascii'))
+        with sock.makefile('rb') as answer:
+            line = answer.readline().decode('ascii').strip()
+    if not line or line.startswith('error'):
+        raise OSError(f"Engine server could not answer: {line}")
+    return line
+
+
+def start_server(path=DEFAULT_SOCKET):
+    """
+    Start an engine server in the background. It keeps running after this process exits.
+    """
+    othello = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Othello.py')
+    subprocess.Popen([sys.executable, othello, '--serve', path], start_new_session=True,
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main():
+    # Same arguments as Othello.py: board position and time limit
+    if len(sys.argv) < 3:
+        raise ValueError("Insufficient arguments. Usage: python OthelloClient.py <position> <time_limit>")
+
+    start = time.monotonic()
+    position = sys.argv[1]
+    time_limit = float(sys.argv[2])
+
+    try:
+        move_str = request_move(position, time_limit - min(FALLBACK_RESERVE, time_limit / 2))
+    except OSError:
+        # No engine yet (or it failed): answer this move ourselves, in the time that is left (without any,
+        # the search answers the move the ordering heuristics like best), then start an engine for the next
+        # moves. Starting it first would slow this answer down, as it imports the same modules.
+        from Othello import get_best_action
+        from OthelloPosition import OthelloPosition
+        remaining = max(time_limit - (time.monotonic() - start), 0)
+        print(get_best_action(OthelloPosition(position), remaining), flush=True)
+        start_server()
+        return
+
+    print(move_str, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+import numpy as np
 
 
 class OthelloEvaluator(ABC):
@@ -19,3 +20,11 @@ class OthelloEvaluator(ABC):
         :return: An integer representing a heuristic evaluation of the position
         """
         pass
+
+    def evaluate_batch(self, othello_positions):
+        """
+        Evaluate many OthelloPositions at once. Evaluators that can share work between positions override this.
+        :param othello_positions: A sequence of OthelloPosition
+        :return: A NumPy array with the evaluation of each position
+        """
+        return np.array([self.evaluate(othello_position) for othello_position in othello_positions], dtype=np.int64)
@@ -1,9 +1,16 @@
 import numpy as np
 from OthelloAction import OthelloAction
+from BitboardPosition import legal_moves_mask, moves_to_actions, derive_value
+import Zobrist
+import Symmetry
 
 class OthelloPosition(object):
     """
     This class represents the board positions and handles the application of moves.
+
+    What is derived from the discs (bitboards, legal moves and mobility of both sides, disc counts and whether
+    the game is over) is computed when first asked for and kept until the discs change. It is kept per colour,
+    so it does not depend on the side to move and survives pass moves.
     """
 
     def __init__(self, board_str=""):
@@ -13,6 +20,7 @@ class OthelloPosition(object):
         """
         self.BOARD_SIZE = 8
         self.maxPlayer = True  # True represents White, False represents Black
+        self._derived = {}  # Cached values derived from the discs, emptied whenever a disc changes
         self.board = np.array([['E' for col in range(self.BOARD_SIZE + 2)] for row in range(self.BOARD_SIZE + 2)])
         
         if board_str and len(board_str) == 65:  # Ensure the board string is exactly 65 characters long
@@ -28,6 +36,8 @@ class OthelloPosition(object):
             self.initialize()  # Initialize the starting position
 
         self.board_history = []  # Store previous board states to detect cycles
+        self.undo_stack = []  # Moves applied in place, with the discs they flipped
+        self.zobrist_key = self.compute_zobrist_key()  # Kept up to date by the move methods
 
     def initialize(self):
         """
@@ -38,7 +48,9 @@ class OthelloPosition(object):
         self.board[self.BOARD_SIZE // 2][self.BOARD_SIZE // 2 + 1] = 'B'
         self.board[self.BOARD_SIZE // 2 + 1][self.BOARD_SIZE // 2] = 'B'
         self.maxPlayer = True
+        self._derived = {}
         self.board_history = []  # Reset board history when game starts
+        self.zobrist_key = self.compute_zobrist_key()
         return self.get_board_string()  # Now returns the 65-character board string
 
     def get_board_string(self):
@@ -59,6 +71,7 @@ class OthelloPosition(object):
         if action.is_pass_move:
             new_position = self.clone()
             new_position.maxPlayer = not self.maxPlayer
+            new_position.zobrist_key ^= Zobrist.SIDE_KEY
             return new_position
 
         row, col = action.row, action.col
@@ -68,112 +81,169 @@ class OthelloPosition(object):
         new_position.board[row][col] = 'W' if self.maxPlayer else 'B'
 
         # Flip the opponent's discs in all valid directions
-        new_position.__flip_discs(row, col)
+        flipped = new_position.__flip_discs(row, col)
+        new_position._derived = {}
 
         # Switch the player
         new_position.maxPlayer = not self.maxPlayer
 
+        new_position.zobrist_key ^= self.__move_key(row, col, flipped)
         return new_position
 
-    def get_moves(self):
+    def apply_move(self, action):
         """
-        Get all possible moves for the current player.
-        :return: A list of OthelloAction representing all possible moves.
-        """
-        moves = []
-        for i in range(1, self.BOARD_SIZE + 1):
-            for j in range(1, self.BOARD_SIZE + 1):
-                if self.__is_candidate(i, j) and self.__is_move(i, j):
-                    move = OthelloAction(i, j)
-                    moves.append(move)
-        if not moves:
-            moves.append(OthelloAction(0, 0, is_pass_move=True))
-        return moves
+        Perform the move suggested by the OthelloAction on this position, without creating a new one.
+        The move can be taken back with undo_move.
+        :param action: The move to make as an OthelloAction.
+        """
+        if action.is_pass_move:
+            self.undo_stack.append((0, 0, (), self._derived))
+            self.zobrist_key ^= Zobrist.SIDE_KEY
+        else:
+            row, col = action.row, action.col
+            self.board[row][col] = 'W' if self.maxPlayer else 'B'
+            flipped = self.__flip_discs(row, col)
+            # Keep the derived values of this position for undo_move
+            self.undo_stack.append((row, col, flipped, self._derived))
+            self._derived = {}
+            self.zobrist_key ^= self.__move_key(row, col, flipped)
+        self.maxPlayer = not self.maxPlayer
 
-    def __flip_discs(self, row, col):
+    def undo_move(self):
         """
-        Flip the opponent's discs in all directions from the (row, col).
+        Take back the last move made with apply_move.
         """
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
-        for dr, dc in directions:
-            self.__flip_in_direction(row, col, dr, dc)
+        row, col, flipped, self._derived = self.undo_stack.pop()
+        self.maxPlayer = not self.maxPlayer
+        if row:
+            opponent = 'B' if self.maxPlayer else 'W'
+            self.board[row][col] = 'E'
+            for flip_r, flip_c in flipped:
+                self.board[flip_r][flip_c] = opponent
+            self.zobrist_key ^= self.__move_key(row, col, flipped)
+        else:
+            self.zobrist_key ^= Zobrist.SIDE_KEY
 
-    def __flip_in_direction(self, row, col, dr, dc):
+    def __move_key(self, row, col, flipped):
         """
-        Flip opponent's discs in a specific direction, if valid flipping sequence exists.
+        The Zobrist key change of a move by the player to move: the placed disc, every flipped disc and
+        the change of the side to move.
         """
-        opponent = 'B' if self.maxPlayer else 'W'
-        player = 'W' if self.maxPlayer else 'B'
-        r, c = row + dr, col + dc
-        discs_to_flip = []
+        square = (row - 1) * 8 + (col - 1)
+        key = Zobrist.SIDE_KEY ^ (Zobrist.WHITE_KEYS[square] if self.maxPlayer else Zobrist.BLACK_KEYS[square])
+        for flip_r, flip_c in flipped:
+            key ^= Zobrist.FLIP_KEYS[(flip_r - 1) * 8 + (flip_c - 1)]
+        return key
 
-        while 1 <= r <= self.BOARD_SIZE and 1 <= c <= self.BOARD_SIZE and self.board[r][c] == opponent:
-            discs_to_flip.append((r, c))
-            r += dr
-            c += dc
+    def get_bitboards(self):
+        """
+        The white and black discs as two 64-bit integers, with bit (row - 1) * 8 + (col - 1) for each square.
+        :return: A tuple (white, black).
+        """
+        bitboards = self._derived.get('bitboards')
+        if bitboards is None:
+            inner = self.board[1:self.BOARD_SIZE + 1, 1:self.BOARD_SIZE + 1]
+            white = int.from_bytes(np.packbits(inner == 'W', bitorder='little').tobytes(), 'little')
+            black = int.from_bytes(np.packbits(inner == 'B', bitorder='little').tobytes(), 'little')
+            bitboards = self._derived['bitboards'] = (white, black)
+        return bitboards
 
-        if 1 <= r <= self.BOARD_SIZE and 1 <= c <= self.BOARD_SIZE and self.board[r][c] == player:
-            for flip_r, flip_c in discs_to_flip:
-                self.board[flip_r][flip_c] = player
+    def compute_zobrist_key(self):
+        """
+        Compute the Zobrist key of the position from scratch.
+        :return: The 64-bit key of the position.
+        """
+        white, black = self.get_bitboards()
+        return Zobrist.compute_key(white, black, self.maxPlayer)
 
-    def __is_candidate(self, row, col):
+    def canonical_key(self):
         """
-        Check if a position is a candidate for a move (empty and has neighboring opponent discs).
-        :param row: The row of the board position.
-        :param col: The column of the board position.
-        :return: True if it is a candidate for a move.
+        The key of the position in its canonical orientation, the same for all its rotations and reflections.
+        :return: A tuple (key, symmetry). Symmetry.transform_action(move, symmetry) maps a move of this
+            position to the canonical orientation, Symmetry.from_canonical(move, symmetry) maps it back.
         """
-        if self.board[row][col] != 'E':  # The cell must be empty to be a candidate
-            return False
-        return self.__has_neighbour(row, col)
+        white, black = self.get_bitboards()
+        return Symmetry.canonical_key(white, black, self.maxPlayer)
+
+    def get_moves(self):
+        """
+        Get all possible moves for the current player.
+        :return: A list of OthelloAction representing all possible moves, a new list on every call.
+        """
+        key = 'white_actions' if self.maxPlayer else 'black_actions'
+        moves = self._derived.get(key)
+        if moves is None:
+            moves = moves_to_actions(self.get_moves_mask()) or [OthelloAction(0, 0, is_pass_move=True)]
+            self._derived[key] = moves
+        return list(moves)
+
+    def get_moves_mask(self, white=None):
+        """
+        Get the legal moves of a player as a bitboard.
+        :param white: True for the moves of white, False for those of black, the player to move by default.
+        """
+        white = self.maxPlayer if white is None else white
+        key = 'white_moves' if white else 'black_moves'
+        moves = self._derived.get(key)
+        if moves is None:
+            white_discs, black_discs = self.get_bitboards()
+            moves = legal_moves_mask(white_discs, black_discs) if white else legal_moves_mask(black_discs, white_discs)
+            self._derived[key] = moves
+        return moves
 
-    def __is_move(self, row, col):
+    def mobility(self):
         """
-        Check if placing a disc at (row, col) is a valid move.
-        :param row: The row of the board position.
-        :param col: The column of the board position.
-        :return: True if placing a disc at (row, col) is a valid move.
+        The number of legal moves of both players, 0 for a player who has to pass.
+        :return: A tuple (white moves, black moves).
         """
-        if row < 1 or row > self.BOARD_SIZE or col < 1 or col > self.BOARD_SIZE:
-            return False
-        return self.__check_move_in_all_directions(row, col)
+        return self.get_moves_mask(True).bit_count(), self.get_moves_mask(False).bit_count()
 
-    def __has_neighbour(self, row, col):
+    def derived(self, name, compute, update=None):
         """
-        Check if the position has neighboring discs.
-        :param row: The row of the board position.
-        :param col: The column of the board position.
-        :return: True if it has neighboring discs.
+        A value that an evaluator derives from the discs, kept like the legal moves until the discs change.
+        :param name: The name of the value.
+        :param compute: Function computing the value from the white and black bitboards.
+        :param update: Optional function (value, white_moved, square, flips) giving the value after a move from
+            the value before it. A position reached with apply_move then updates the value of the closest earlier
+            position that has it, and keeps the value of every position in between, so a search pays one update
+            per node and nothing on undo_move.
         """
-        for dr in [-1, 0, 1]:
-            for dc in [-1, 0, 1]:
-                if dr == 0 and dc == 0:
-                    continue
-                if self.board[row + dr][col + dc] != 'E':
-                    return True
-        return False
+        return derive_value(self, name, compute, update, self.__undo_bits)
 
-    def __check_move_in_all_directions(self, row, col):
+    @staticmethod
+    def __undo_bits(entry):
+        """The (move, flips) bitboards of an undo entry."""
+        row, col, flipped, _ = entry
+        if not row:
+            return 0, 0
+        return 1 << ((row - 1) * 8 + (col - 1)), sum(1 << ((r - 1) * 8 + (c - 1)) for r, c in flipped)
+
+    def disc_counts(self):
         """
-        Check if placing a disc at (row, col) will flip opponent discs in any direction.
-        :param row: The row of the board position.
-        :param col: The column of the board position.
-        :return: True if placing a disc at (row, col) is a valid move.
+        The number of discs of both players.
+        :return: A tuple (white discs, black discs).
+        """
+        counts = self._derived.get('disc_counts')
+        if counts is None:
+            white, black = self.get_bitboards()
+            counts = self._derived['disc_counts'] = (white.bit_count(), black.bit_count())
+        return counts
+
+    def __flip_discs(self, row, col):
+        """
+        Flip the opponent's discs in all directions from the (row, col).
+        :return: A list of the flipped squares.
         """
         directions = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+        flipped = []
         for dr, dc in directions:
-            if self.__can_flip_in_direction(row, col, dr, dc):
-                return True
-        return False
+            flipped.extend(self.__flip_in_direction(row, col, dr, dc))
+        return flipped
 
-    def __can_flip_in_direction(self, row, col, dr, dc):
+    def __flip_in_direction(self, row, col, dr, dc):
         """
-        Check if placing a disc at (row, col) will flip opponent discs in the given direction.
-        :param row: The row of the board position.
-        :param col: The column of the board position.
-        :param dr: Row direction.
-        :param dc: Column direction.
-        :return: True if placing a disc will flip opponent discs in the given direction.
+        Flip opponent's discs in a specific direction, if valid flipping sequence exists.
+        :return: A list of the flipped squares.
         """
         opponent = 'B' if self.maxPlayer else 'W'
         player = 'W' if self.maxPlayer else 'B'
@@ -186,9 +256,10 @@ class OthelloPosition(object):
             c += dc
 
         if 1 <= r <= self.BOARD_SIZE and 1 <= c <= self.BOARD_SIZE and self.board[r][c] == player:
-            return True
-
-        return False
+            for flip_r, flip_c in discs_to_flip:
+                self.board[flip_r][flip_c] = player
+            return discs_to_flip
+        return []
 
     def is_repeated_state(self):
         """
@@ -206,24 +277,24 @@ class OthelloPosition(object):
         Check if the game is over. The game ends when neither player has a valid move.
         :return: True if the game is over, False otherwise.
         """
-        current_player_moves = self.get_moves()
-
-        # Switch to the other player
-        self.maxPlayer = not self.maxPlayer
-        other_player_moves = self.get_moves()
-        self.maxPlayer = not self.maxPlayer
-
-        return len(current_player_moves) == 1 and current_player_moves[0].is_pass_move and \
-               len(other_player_moves) == 1 and other_player_moves[0].is_pass_move
+        game_over = self._derived.get('game_over')
+        if game_over is None:
+            game_over = self._derived['game_over'] = not self.get_moves_mask(True) and not self.get_moves_mask(False)
+        return game_over
 
     def clone(self):
         """
         Clone the current board and state.
         :return: A new OthelloPosition object identical to the current one.
         """
-        new_position = OthelloPosition()
+        new_position = OthelloPosition.__new__(OthelloPosition)
+        new_position.BOARD_SIZE = self.BOARD_SIZE
         new_position.board = np.copy(self.board)
         new_position.maxPlayer = self.maxPlayer
+        new_position.zobrist_key = self.zobrist_key
+        new_position._derived = dict(self._derived)
+        new_position.board_history = []
+        new_position.undo_stack = []
         return new_position
 
     def print_board(self):
@@ -0,0 +1,171 @@
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from OthelloAction import OthelloAction
+from OthelloPosition import OthelloPosition
+from AlphaBeta import AlphaBeta
+from Othello import get_best_action
+from OpeningBook import DEFAULT_BOOK
+from Ponderer import Ponderer
+from OthelloClient import DEFAULT_SOCKET
+from logger_config import get_logger
+
+log = get_logger('server')
+
+# The server shuts itself down when it has not been asked for a move for this many seconds
+IDLE_TIMEOUT = 600
+
+
+class OthelloServer(object):
+    """
+    A long-lived engine. It answers one move request per line, "<position> <time_limit>", with a line holding
+    the move ("pass" or "(row,col)"), and keeps its AlphaBeta instances, with their transposition tables,
+    between requests. Lines that cannot be answered get "error <message>".
+
+    On a socket, requests that arrive at the same time (games played in parallel) are answered at the same
+    time, each by an idle engine, and new engines are made when all are busy. With pondering on, the engine
+    keeps searching the expected next position after each answer; that only helps a single game, so requests
+    are then answered one at a time.
+    """
+
+    def __init__(self, alpha_beta=None, ponder=False, book_path=DEFAULT_BOOK, new_engine=None):
+        """
+        :param alpha_beta: The engine, an AlphaBeta searching until the time is up by default.
+        :param new_engine: Makes another engine for requests that arrive while all engines are busy, the same
+            as the default engine if not given.
+        """
+        self.new_engine = new_engine if new_engine else lambda: AlphaBeta(search_depth=AlphaBeta.MAX_SEARCH_DEPTH,
+                                                                          make_unmake=True)
+        self.alpha_beta = alpha_beta if alpha_beta else self.new_engine()
+        self.book_path = book_path
+        self.ponderer = Ponderer(self.alpha_beta) if ponder else None
+        self.last_answer = None  # (position, move string) of the last answered request, for pondering
+        self.idle_engines = [self.alpha_beta]
+        self.engines_lock = threading.Lock()
+
+    def handle_line(self, line):
+        """
+        Answer one request line.
+        :param line: "<position> <time_limit>".
+        :return: The answer line, without the newline.
+        """
+        parts = line.split()
+        if len(parts) != 2:
+            return self.__error("expected '<position> <time_limit>'", line)
+        position, time_limit = parts
+        if len(position) != 65:
+            return self.__error(f"invalid position string length {len(position)}", line)
+        try:
+            time_limit = float(time_limit)
+        except ValueError:
+            return self.__error(f"invalid time limit {time_limit}", line)
+
+        start_time = time.monotonic()
+        othello_position = OthelloPosition(position)
+        move = self.ponderer.finish(othello_position, time_limit) if self.ponderer else None
+        if move is not None:
+            move_str = AlphaBeta.move_string(move)
+        else:
+            alpha_beta = self.__acquire_engine()
+            try:
+                move_str = get_best_action(othello_position, time_limit, alpha_beta, self.book_path)
+            finally:
+                self.__release_engine(alpha_beta)
+        if self.ponderer:
+            self.last_answer = (othello_position, move_str)
+        log.info("answered %s", move_str, extra={'fields': {
+            'position': position, 'time_limit': time_limit, 'move': move_str, 'ponder_hit': move is not None,
+            'ms': round((time.monotonic() - start_time) * 1000, 1)}})
+        return move_str
+
+    def __acquire_engine(self):
+        """
+        Take an idle engine, or make one if all are busy.
+        """
+        with self.engines_lock:
+            if self.idle_engines:
+                return self.idle_engines.pop()
+        log.info("all engines busy, starting another")
+        return self.new_engine()
+
+    def __release_engine(self, alpha_beta):
+        with self.engines_lock:
+            self.idle_engines.append(alpha_beta)
+
+    @staticmethod
+    def __error(message, line):
+        log.warning("bad request: %s", message, extra={'fields': {'request': line.strip()}})
+        return f"error {message}"
+
+    def answer_sent(self):
+        """
+        Called once the answer has reached the client. Starts pondering on the opponent's time.
+        """
+        if self.ponderer and self.last_answer:
+            position, move_str = self.last_answer
+            self.ponderer.start(position, OthelloAction.from_string(move_str))
+        self.last_answer = None
+
+    def serve_stdin(self, stdin=sys.stdin, stdout=sys.stdout):
+        """
+        Answer requests read from stdin until it is closed or a line says "quit".
+        """
+        for line in stdin:
+            if line.strip() == 'quit':
+                break
+            if line.strip():
+                print(self.handle_line(line), file=stdout, flush=True)
+                self.answer_sent()
+        if self.ponderer:
+            self.ponderer.stop()
+
+    def serve_socket(self, path=DEFAULT_SOCKET, idle_timeout=IDLE_TIMEOUT):
+        """
+        Answer requests on a Unix socket, one connection per request, until nobody has asked for a move
+        for idle_timeout seconds. Each connection is handled in a thread, except when pondering.
+        """
+        if os.path.exists(path):
+            if is_serving(path):
+                return  # Another engine already listens on this socket
+            os.unlink(path)  # Left behind by an engine that did not shut down cleanly
+
+        engine = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline().decode('ascii', errors='replace')
+                self.wfile.write((engine.handle_line(line) + '\n').encode('ascii'))
+                self.wfile.flush()
+                engine.answer_sent()
+
+        server_class = socketserver.UnixStreamServer if self.ponderer else socketserver.ThreadingUnixStreamServer
+        with server_class(path, RequestHandler) as server:
+            server.timeout = idle_timeout
+            server.timed_out = False
+
+            def handle_timeout():
+                server.timed_out = True
+            server.handle_timeout = handle_timeout
+
+            try:
+                while not server.timed_out:
+                    server.handle_request()
+            finally:
+                if self.ponderer:
+                    self.ponderer.stop()
+                os.unlink(path)
+
+
+def is_serving(path):
+    """
+    Check if an engine is listening on a socket.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+            return True
+        except OSError:
+            return False
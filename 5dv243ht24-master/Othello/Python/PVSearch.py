@@ -0,0 +1,240 @@
+import time
+from AlphaBeta import AlphaBeta
+from TranspositionTable import EXACT, LOWER, UPPER
+from SearchStats import MAX_DEPTH, TIME, STOPPED, TIME_BUDGET, ENDGAME_SOLVED
+from logger_config import get_logger, HotPathLogger
+
+_iteration_log = HotPathLogger(get_logger('search'), max_per_second=20)
+
+
+class PVSearch(AlphaBeta):
+    """
+    Principal variation search in negamax form: scores are seen from the side to move, so one loop serves both
+    players. The first move of a node is searched with the full window, the others with a null window
+    (alpha, alpha + 1) that only proves them worse; a move that turns out better is searched again with the
+    full window. Each iteration of iterative deepening starts with an aspiration window around the score of
+    the last iteration of the same parity (two depths back, as the score of the side to move swings between
+    odd and even depths), which is widened when the score falls outside it.
+
+    The transposition table, move ordering, time management, endgame solver and statistics are those of
+    AlphaBeta. Scores in the table are from the side to move, so a table must not be shared with an AlphaBeta
+    search. The tree is walked with apply_move/undo_move.
+
+    The principal variation of the last finished iteration is kept in `pv`. Nodes on it never end on a table
+    entry, so the variation reaches the full depth.
+
+    With ProbCut parameters (see ProbCut.py) the search is selective: at null window nodes of the calibrated
+    depths, a shallow search predicts the deep result, and the node is cut when the prediction is outside the
+    window with high confidence.
+    """
+    ASPIRATION_WINDOW = 50  # Half width of the first aspiration window, in evaluator units
+    ASPIRATION_GROWTH = 4   # Factor the window grows by on every failed search
+    MAX_PLY = 128
+
+    def __init__(self, search_depth=5, evaluator=None, tt_size_mb=16, endgame_empties=12, endgame_wld=False,
+                 aspiration_window=ASPIRATION_WINDOW, probcut=None, stats=None):
+        """
+        :param aspiration_window: Half width of the first aspiration window, None to search every iteration
+            with the full window.
+        :param probcut: ProbCut parameters fitted for the evaluator, None for a full-width search.
+        :raises ValueError: If the ProbCut parameters were fitted for another evaluator, as its margins are in
+            that evaluator's units.
+        """
+        super().__init__(search_depth=search_depth, evaluator=evaluator, make_unmake=True, tt_size_mb=tt_size_mb,
+                         endgame_empties=endgame_empties, endgame_wld=endgame_wld, stats=stats)
+        if probcut is not None and probcut.evaluator != type(self.evaluator).__name__:
+            raise ValueError(f"The ProbCut parameters are fitted for {probcut.evaluator}, not for "
+                             f"{type(self.evaluator).__name__}")
+        self.aspiration_window = aspiration_window
+        self.probcut = probcut
+        self.pv_lines = [[] for _ in range(self.MAX_PLY + 1)]  # Best line found below the node at each ply
+        self.pv = []          # Principal variation of the last finished iteration, a list of OthelloAction
+        self.score = None     # Its score, from the side to move at the root
+        self.scores = []      # Scores of the finished iterations of the current search
+        self.researches = 0   # Null window searches that had to be repeated with the full window
+        self.probcuts = 0     # Nodes cut by ProbCut
+
+    def new_search(self):
+        super().new_search()
+        self.pv = []
+        self.score = None
+        self.scores = []
+        self.researches = 0
+        self.probcuts = 0
+
+    def leaf_score(self, position, depth):
+        """
+        The evaluation of a leaf from the side to move, with the evaluators of AlphaBeta.
+        """
+        evaluate = self.quick_evaluate if depth > 2 else self.evaluator.evaluate
+        score = evaluate(position) if self.stats is None else self.stats.evaluate(evaluate, position)
+        return int(score) if position.maxPlayer else -int(score)
+
+    def pvs(self, position, depth, alpha, beta, ply):
+        """
+        Search a position.
+        :param ply: The distance from the root.
+        :return: The score from the side to move, or None if the time ran out.
+        """
+        if self.time_exceeded():
+            return None
+        self.nodes += 1
+        pv_node = beta - alpha > 1
+        self.pv_lines[ply] = []
+
+        board_key, symmetry = self.board_hash(position)
+        cached_value = self.probe(board_key, symmetry)
+        tt_move = None
+        if cached_value is not None:
+            cached_score, cached_depth, tt_move, cached_bound = cached_value
+            if self.stats is not None:
+                self.stats.tt_hits += 1
+            if cached_depth >= depth and not pv_node and (
+                    cached_bound == EXACT or
+                    cached_bound == LOWER and cached_score >= beta or
+                    cached_bound == UPPER and cached_score <= alpha):
+                if self.stats is not None:
+                    self.stats.tt_cutoffs += 1
+                return cached_score
+
+        if depth == 0 or position.is_game_over() or ply >= self.MAX_PLY:
+            score = self.leaf_score(position, depth)
+            self.store(board_key, symmetry, depth, score, EXACT, None)
+            return score
+
+        if self.probcut is not None and not pv_node:
+            cut = self.probcut_search(position, depth, alpha, beta, ply)
+            if cut is not None:
+                return cut
+
+        white_to_move = position.maxPlayer
+        legal_moves = self.move_orderer.order(position.get_moves(), ply, tt_move, white_to_move)
+        alpha_orig = alpha
+        best_score, best_move = float('-inf'), None
+        for index, move in enumerate(legal_moves):
+            position.apply_move(move)
+            if index == 0:
+                score = self.pvs(position, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                score = self.pvs(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if score is not None and alpha < -score < beta:  # Better than the first move: find out how much
+                    self.researches += 1
+                    score = self.pvs(position, depth - 1, -beta, -alpha, ply + 1)
+            position.undo_move()
+            if score is None:  # Time is up, the result of this node is incomplete
+                return None
+            score = -score
+
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    self.pv_lines[ply] = [move] + self.pv_lines[ply + 1]
+                    if alpha >= beta:
+                        self.move_orderer.record_cutoff(move, ply, depth, white_to_move)
+                        if self.stats is not None:
+                            self.stats.record_cutoff(index == 0)
+                        break
+
+        self.store_result(board_key, symmetry, depth, best_score, alpha_orig, beta, best_move)
+        return best_score
+
+    def probcut_search(self, position, depth, alpha, beta, ply):
+        """
+        Try to cut a null window node with a shallow search.
+        :return: beta or alpha if the node is cut, otherwise None. None also when the time ran out, which the
+            normal search of the node finds out at once.
+        """
+        cut = self.probcut.cut(depth, 64 - sum(position.disc_counts()))
+        if cut is None:
+            return None
+        shallow, a, b, margin = cut
+        bound = self.probcut.high_bound(beta, a, b, margin)
+        score = self.pvs(position, shallow, bound - 1, bound, ply)
+        if score is not None and score >= bound:
+            self.probcuts += 1
+            return beta
+        bound = self.probcut.low_bound(alpha, a, b, margin)
+        score = self.pvs(position, shallow, bound, bound + 1, ply)
+        if score is not None and score <= bound:
+            self.probcuts += 1
+            return alpha
+        return None
+
+    def aspiration_search(self, position, depth):
+        """
+        Search the root with a window around the score of two iterations back, widening it on the side the score
+        fell out of until the score is inside.
+        :return: The score from the side to move, or None if the time ran out.
+        """
+        if len(self.scores) < 2 or self.aspiration_window is None:
+            return self.pvs(position, depth, float('-inf'), float('inf'), 0)
+
+        window = self.aspiration_window
+        alpha, beta = self.scores[-2] - window, self.scores[-2] + window
+        while True:
+            score = self.pvs(position, depth, alpha, beta, 0)
+            if score is None:
+                return None
+            window *= self.ASPIRATION_GROWTH
+            if score <= alpha:
+                alpha = score - window
+            elif score >= beta:
+                beta = score + window
+            else:
+                return score
+
+    def iterative_deepening(self, position, max_depth, start_depth=1):
+        """
+        Iterative deepening with aspiration windows. Positions with few empty squares go to the endgame solver
+        first, as in AlphaBeta.
+        :return: The best move as an OthelloAction.
+        """
+        best_move = None
+        self.completed_depth = 0
+        self.scores = []
+        start_nodes = self.nodes
+        if self.stats is not None:
+            self.stats.reset()
+
+        solved_move = self.solve_endgame(position)
+        if solved_move is not None:
+            self.completed_depth = max_depth
+            self.pv, self.score = [solved_move], self.endgame_score
+            return self.search_finished(position, solved_move, start_nodes, ENDGAME_SOLVED)
+
+        stop_reason = MAX_DEPTH
+        for depth in range(start_depth, max_depth + 1):
+            if not self.time_manager.should_start_iteration():
+                stop_reason = STOPPED if self.stop_requested else TIME_BUDGET
+                break
+
+            self.root_depth = depth
+            if self.stats is not None:
+                self.stats.start_iteration(self.nodes)
+            iteration_start = time.monotonic()
+            score = self.aspiration_search(position, depth)
+
+            if score is None:
+                stop_reason = STOPPED if self.stop_requested else TIME
+                break  # Keep the result of the last finished iteration
+
+            self.score = score
+            self.scores.append(score)
+            self.pv = self.pv_lines[0]
+            if self.pv:
+                best_move = self.pv[0]
+            self.completed_depth = depth
+            self.time_manager.iteration_done(time.monotonic() - iteration_start, best_move)
+            if self.stats is not None:
+                self.stats.finish_iteration(depth, self.nodes)
+            if _iteration_log.enabled:
+                _iteration_log("iteration %d done", depth, depth=depth,
+                               score=score if position.maxPlayer else -score, nodes=self.nodes - start_nodes,
+                               pv=' '.join(self.move_string(move) for move in self.pv))
+
+        if best_move is None:  # Not even depth 1 finished: play the move the ordering heuristics like best
+            best_move = self.move_orderer.order(position.get_moves(), 0, None, position.maxPlayer)[0]
+        return self.search_finished(position, best_move, start_nodes, stop_reason, researches=self.researches,
+                                    probcuts=self.probcuts,
+                                    pv=' '.join(self.move_string(move) for move in self.pv))
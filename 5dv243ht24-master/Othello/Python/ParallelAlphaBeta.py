@@ -0,0 +1,169 @@
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from OthelloAlgorithm import OthelloAlgorithm
+from AlphaBeta import AlphaBeta
+from CountingEvaluator import CountingEvaluator
+from TranspositionTable import TranspositionTable, encode_move, decode_move, NO_MOVE
+
+# State of a helper process, set up once by _init_helper
+_helper = None
+_helper_memory = []
+
+
+class _HelperAlphaBeta(AlphaBeta):
+    """
+    The AlphaBeta search of a helper process. It also stops when the main process raises the shared stop flag.
+    """
+
+    def __init__(self, stop_flag, **kwargs):
+        super().__init__(**kwargs)
+        self.stop_flag = stop_flag
+
+    def time_exceeded(self):
+        return self.stop_flag[0] or AlphaBeta.time_exceeded(self)
+
+
+def _init_helper(table_name, control_name, tt_size_mb, search_depth, evaluator):
+    """
+    Attach a helper process to the shared transposition table and stop flag.
+    """
+    global _helper
+    table_memory = shared_memory.SharedMemory(name=table_name)
+    control_memory = shared_memory.SharedMemory(name=control_name)
+    _helper_memory.extend([table_memory, control_memory])  # Keep the mappings alive
+    _helper = _HelperAlphaBeta(control_memory.buf, search_depth=search_depth, evaluator=evaluator,
+                               make_unmake=True, tt_size_mb=0)
+    _helper.transposition_table = TranspositionTable(tt_size_mb, buffer=table_memory.buf)
+
+
+def _helper_search(position_class, board_string, start_time, time_limit, age, start_depth):
+    """
+    Run one helper search.
+    :return: A tuple (completed depth, encoded best move).
+    """
+    _helper.new_search()  # Forget the iterations and killer moves of the last move
+    _helper.transposition_table.age = age  # Share the age of the main search
+    _helper.start_clock(time_limit, start_time)
+    best_move = _helper.iterative_deepening(position_class(board_string), _helper.search_depth, start_depth)
+    return _helper.completed_depth, encode_move(best_move)
+
+
+def _release(executor, table, memory):
+    """
+    Shut the helpers down and free the shared memory.
+    """
+    executor.shutdown(wait=True, cancel_futures=True)
+    table.release()
+    for block in memory:
+        block.close()
+        block.unlink()
+
+
+class ParallelAlphaBeta(OthelloAlgorithm):
+    """
+    Lazy SMP: the main process and a number of helper processes run the same iterative deepening AlphaBeta
+    search on the root position, all reading and writing one transposition table in shared memory. The
+    helpers fill the table with results the main search then finds, and every other helper starts one
+    depth ahead. The answer is the best move of the deepest finished iteration of any process.
+
+    All processes use the deadline of the main search. When the main search is done, the helpers are told to
+    stop through a shared flag. By default the depth is not capped, so the extra processes are used to search
+    deeper in the same time.
+    """
+
+    def __init__(self, workers=None, search_depth=AlphaBeta.MAX_SEARCH_DEPTH, evaluator=None, tt_size_mb=64,
+                 stats=None):
+        """
+        :param workers: The number of processes searching, including the main process. All cores by default.
+        :param stats: Optional SearchStats for the search of the main process.
+        """
+        self.workers = max(1, workers if workers else os.cpu_count() or 1)
+        self.search_depth = search_depth
+        self.evaluator = evaluator if evaluator else CountingEvaluator()
+        self.tt_size_mb = tt_size_mb
+        self.stats = stats
+        self.alpha_beta = None
+        self.executor = None
+        self.stop_flag = None
+        self._finalizer = None
+        self.completed_depth = 0  # Depth of the deepest iteration any process finished in the last search
+        self.helper_depths = []   # Depth of the last iteration each helper finished in the last search
+
+    def set_evaluator(self, othello_evaluator):
+        self.close()  # The helpers are started with the evaluator
+        self.evaluator = othello_evaluator
+
+    def set_search_depth(self, depth):
+        self.close()
+        self.search_depth = depth
+
+    def __start(self):
+        """
+        Create the shared memory and start the helper processes.
+        """
+        table_memory = shared_memory.SharedMemory(create=True, size=TranspositionTable.memory_size(self.tt_size_mb))
+        control_memory = shared_memory.SharedMemory(create=True, size=8)
+        control_memory.buf[0] = 0
+        self.stop_flag = control_memory.buf
+
+        self.alpha_beta = AlphaBeta(search_depth=self.search_depth, evaluator=self.evaluator, make_unmake=True,
+                                    tt_size_mb=0, stats=self.stats)
+        table = TranspositionTable(self.tt_size_mb, buffer=table_memory.buf)
+        table.clear()
+        self.alpha_beta.transposition_table = table
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers - 1, initializer=_init_helper,
+            initargs=(table_memory.name, control_memory.name, self.tt_size_mb, self.search_depth, self.evaluator))
+        self._finalizer = weakref.finalize(self, _release, self.executor, table, [table_memory, control_memory])
+
+    def close(self):
+        """
+        Stop the helper processes and free the shared memory.
+        """
+        self.stop_flag = None
+        self.alpha_beta = None
+        if self._finalizer is not None:
+            self._finalizer()
+            self._finalizer = None
+            self.executor = None
+
+    def evaluate(self, position, time_limit=5):
+        """
+        Evaluate the best move with all processes, within the time limit.
+        :return: The move as "(row,col)" or "pass".
+        """
+        if self.workers == 1:
+            if self.alpha_beta is None:
+                self.alpha_beta = AlphaBeta(search_depth=self.search_depth, evaluator=self.evaluator,
+                                            make_unmake=True, tt_size_mb=self.tt_size_mb, stats=self.stats)
+            move_str = self.alpha_beta.evaluate(position, time_limit)
+            self.completed_depth = self.alpha_beta.completed_depth
+            return move_str
+        if self.executor is None:
+            self.__start()
+
+        main = self.alpha_beta
+        main.start_clock(time_limit)
+        main.new_search()
+        self.stop_flag[0] = 0
+
+        board_string = position.get_board_string()
+        helpers = [self.executor.submit(_helper_search, type(position), board_string, main.start_time, time_limit,
+                                        main.transposition_table.age, 1 + i % 2)
+                   for i in range(self.workers - 1)]
+
+        best_move = main.iterative_deepening(position, self.search_depth)
+        best_depth = main.completed_depth if best_move is not None else 0
+
+        self.stop_flag[0] = 1
+        self.helper_depths = []
+        for helper in helpers:
+            depth, move = helper.result()
+            self.helper_depths.append(depth)
+            if depth > best_depth and move != NO_MOVE:
+                best_depth, best_move = depth, decode_move(move)
+        self.completed_depth = best_depth
+        return AlphaBeta.move_string(best_move)
@@ -0,0 +1,282 @@
+import argparse
+import time
+import numpy as np
+from OthelloEvaluator import OthelloEvaluator
+from CountingEvaluator import AdvancedEvaluator, stack_bitboards
+from BitboardPosition import legal_moves_mask_array, popcount_array, square_of
+from PositionDataset import PositionDataset, HAS_RESULT, HAS_SCORE
+import Symmetry
+
+# The patterns, each with its squares in the order of the base-3 digits of its index, lowest first. Every
+# pattern is used in all the orientations the symmetries of the board give it, which share its weight table.
+PATTERNS = [
+    ('edge_2x', [(1, col) for col in range(1, 9)] + [(2, 2), (2, 7)]),
+    ('corner_3x3', [(row, col) for row in range(1, 4) for col in range(1, 4)]),
+    ('corner_2x5', [(row, col) for row in range(1, 3) for col in range(1, 6)]),
+    ('row_2', [(2, col) for col in range(1, 9)]),
+    ('row_3', [(3, col) for col in range(1, 9)]),
+    ('row_4', [(4, col) for col in range(1, 9)]),
+    ('diagonal_8', [(i, i) for i in range(1, 9)]),
+    ('diagonal_7', [(i, i + 1) for i in range(1, 8)]),
+    ('diagonal_6', [(i, i + 2) for i in range(1, 7)]),
+    ('diagonal_5', [(i, i + 3) for i in range(1, 6)]),
+    ('diagonal_4', [(i, i + 4) for i in range(1, 5)]),
+]
+
+EMPTY, WHITE, BLACK = 0, 1, 2  # The digit of a square
+PHASES = 6
+PHASE_EMPTIES = 10  # Phase p has 10 * p + 1 to 10 * p + 10 empty squares (phase 0 also the full board)
+
+
+def _instances():
+    """
+    Every orientation of every pattern.
+    :return: A list of (pattern number, list of squares) tuples.
+    """
+    instances = []
+    for pattern, (_, cells) in enumerate(PATTERNS):
+        seen = set()
+        for symmetry in Symmetry.SYMMETRIES:
+            squares = [Symmetry.SQUARE_MAPS[symmetry][square_of(row, col)] for row, col in cells]
+            if frozenset(squares) not in seen:
+                seen.add(frozenset(squares))
+                instances.append((pattern, squares))
+    return instances
+
+
+INSTANCES = _instances()
+PATTERN_SIZES = [3 ** len(cells) for _, cells in PATTERNS]
+PATTERN_OFFSETS = np.concatenate([[0], np.cumsum(PATTERN_SIZES)[:-1]]).tolist()
+MOBILITY = sum(PATTERN_SIZES)  # The index of the mobility weight, after the pattern tables
+WEIGHTS_PER_PHASE = MOBILITY + 1
+
+# The indices of a position are positions in the weight table of a phase: the offset of the table of the pattern
+# plus the base-3 number of the squares. INSTANCE_OFFSETS are the indices of the empty board.
+INSTANCE_OFFSETS = [PATTERN_OFFSETS[pattern] for pattern, _ in INSTANCES]
+# SQUARE_POWERS[square] lists (instance, 3 ** digit) for every pattern instance that has the square
+SQUARE_POWERS = [[(instance, 3 ** squares.index(square)) for instance, (_, squares) in enumerate(INSTANCES)
+                  if square in squares] for square in range(64)]
+# Index changes of a move of white (True) or black (False): the placed disc, and a disc flipped to the mover
+PLACE_DELTAS = {white: [[(instance, power * (WHITE if white else BLACK)) for instance, power in powers]
+                        for powers in SQUARE_POWERS] for white in (True, False)}
+FLIP_DELTAS = {white: [[(instance, power * (WHITE - BLACK if white else BLACK - WHITE)) for instance, power in powers]
+                       for powers in SQUARE_POWERS] for white in (True, False)}
+# INDEX_MATRIX[square, instance] is the power of the square in the instance, for the indices of many positions
+INDEX_MATRIX = np.zeros((64, len(INSTANCES)), dtype=np.int64)
+for _square, _powers in enumerate(SQUARE_POWERS):
+    for _instance, _power in _powers:
+        INDEX_MATRIX[_square, _instance] = _power
+
+
+def compute_indices(white, black):
+    """
+    The pattern indices of a position, from scratch.
+    :return: A list with the index of every pattern instance.
+    """
+    indices = list(INSTANCE_OFFSETS)
+    for discs, deltas in ((white, PLACE_DELTAS[True]), (black, PLACE_DELTAS[False])):
+        while discs:
+            low = discs & -discs
+            for instance, delta in deltas[low.bit_length() - 1]:
+                indices[instance] += delta
+            discs ^= low
+    return indices
+
+
+def update_indices(indices, white_moved, square, flips):
+    """
+    The pattern indices after a move, from the indices before it.
+    """
+    indices = list(indices)
+    for instance, delta in PLACE_DELTAS[white_moved][square]:
+        indices[instance] += delta
+    flip_deltas = FLIP_DELTAS[white_moved]
+    while flips:
+        low = flips & -flips
+        for instance, delta in flip_deltas[low.bit_length() - 1]:
+            indices[instance] += delta
+        flips ^= low
+    return indices
+
+
+def indices_array(white, black):
+    """
+    compute_indices for uint64 arrays of white and black discs.
+    :return: An int64 array of shape (positions, instances).
+    """
+    white_bits = np.unpackbits(np.ascontiguousarray(white, dtype='<u8').view(np.uint8), bitorder='little')
+    black_bits = np.unpackbits(np.ascontiguousarray(black, dtype='<u8').view(np.uint8), bitorder='little')
+    digits = (white_bits.astype(np.int64) * WHITE + black_bits * BLACK).reshape(-1, 64)
+    return digits @ INDEX_MATRIX + np.array(INSTANCE_OFFSETS)
+
+
+def phase_of(empty_squares):
+    """
+    The phase of a position with a number of empty squares.
+    """
+    return max(empty_squares - 1, 0) // PHASE_EMPTIES
+
+
+def default_weights():
+    """
+    Weights that score a position like AdvancedEvaluator: the value each disc has there (positional, corner,
+    X-square and piece weights) is shared out between the pattern instances that have its square.
+    :return: An int16 array of shape (PHASES, WEIGHTS_PER_PHASE).
+    """
+    advanced = AdvancedEvaluator()
+    cover = np.array([len(powers) for powers in SQUARE_POWERS], dtype=np.float64)
+    corners = np.zeros(64)
+    corners[[square_of(row, col) for row, col in advanced.corners]] = 1
+    x_squares = np.zeros(64)
+    x_squares[[square_of(row, col) for row, col in advanced.x_squares]] = 1
+
+    weights = np.zeros((PHASES, WEIGHTS_PER_PHASE), dtype=np.int16)
+    for phase in range(PHASES):
+        advanced_phase = advanced.game_phase(phase * PHASE_EMPTIES + 1)
+        mobility, positional, corner, x_square, piece = advanced.phase_weight_lists[advanced_phase]
+        # The score of a white disc on each square, per pattern instance that has the square
+        value = (piece + positional * advanced.phase_positional_weights[advanced_phase].reshape(64) +
+                 corner * corners + x_square * x_squares) / cover
+        for pattern, (_, cells) in enumerate(PATTERNS):
+            squares = [square_of(row, col) for row, col in cells]
+            digits = (np.arange(3 ** len(squares))[:, None] // 3 ** np.arange(len(squares))) % 3
+            signs = np.where(digits == WHITE, 1.0, np.where(digits == BLACK, -1.0, 0.0))
+            offset = PATTERN_OFFSETS[pattern]
+            weights[phase, offset:offset + PATTERN_SIZES[pattern]] = np.rint(signs @ value[squares])
+        weights[phase, MOBILITY] = mobility
+    return weights
+
+
+def load_weights(path):
+    """
+    Read a weight file: a .npy file with an int16 array of shape (PHASES, WEIGHTS_PER_PHASE).
+    """
+    weights = np.load(path)
+    if weights.dtype != np.int16 or weights.shape != (PHASES, WEIGHTS_PER_PHASE):
+        raise ValueError(f"{path} is not a pattern weight file")
+    return weights
+
+
+class PatternEvaluator(OthelloEvaluator):
+    """
+    Scores a position as the sum of table lookups, one per pattern instance (edges, corner regions, rows and
+    diagonals, with each square empty, white or black as a base-3 digit of the index), plus a mobility term.
+    There is a weight table per phase of PHASE_EMPTIES empty squares.
+
+    The pattern indices are kept by the position (see its derived method): a position reached with apply_move
+    updates the indices of the position before with the squares the move changed.
+    """
+
+    def __init__(self, weights=None):
+        """
+        :param weights: A weight file written by train() or PatternEvaluator.py, or an array of weights. The
+            default weights are derived from those of AdvancedEvaluator.
+        """
+        if weights is None:
+            weights = default_weights()
+        elif isinstance(weights, str):
+            weights = load_weights(weights)
+        self.weights = np.asarray(weights, dtype=np.int16)
+        self.weight_lists = self.weights.tolist()  # Python lists are faster to index one at a time
+        self.weight_array = self.weights.astype(np.int64)
+
+    def evaluate(self, othello_position):
+        indices = othello_position.derived('patterns', compute_indices, update_indices)
+        white_discs, black_discs = othello_position.disc_counts()
+        weights = self.weight_lists[phase_of(64 - white_discs - black_discs)]
+        # A player without moves has a single (pass) move, as in AdvancedEvaluator
+        white_moves, black_moves = othello_position.mobility()
+        return sum(map(weights.__getitem__, indices)) + weights[MOBILITY] * (max(white_moves, 1) - max(black_moves, 1))
+
+    def evaluate_batch(self, othello_positions):
+        bitboards = stack_bitboards(othello_positions)
+        return self.evaluate_bitboards_array(bitboards[:, 0], bitboards[:, 1])
+
+    def evaluate_bitboards_array(self, white, black):
+        """
+        Evaluate uint64 arrays of white and black discs.
+        :return: An int64 array with the evaluation of each position.
+        """
+        phases, indices, mobility = features(white, black)
+        return self.weight_array[phases[:, None], indices].sum(axis=1) + self.weight_array[phases, MOBILITY] * mobility
+
+
+def features(white, black):
+    """
+    What the evaluation of positions depends on.
+    :return: A tuple (phases, indices, mobility): the phase of each position, the pattern indices (positions x
+        instances) and white's mobility minus black's.
+    """
+    empty_squares = 64 - popcount_array(white) - popcount_array(black)
+    phases = np.maximum(empty_squares - 1, 0) // PHASE_EMPTIES
+    mobility = (np.maximum(popcount_array(legal_moves_mask_array(white, black)), 1) -
+                np.maximum(popcount_array(legal_moves_mask_array(black, white)), 1))
+    return phases, indices_array(white, black), mobility
+
+
+def train(dataset, weights=None, target='result', scale=10, epochs=4, learning_rate=0.01, batch_size=4096,
+          log=None):
+    """
+    Fit the weights to the labelled positions of a dataset by mini-batch gradient descent on the squared error.
+    The step of every weight is normalized by how often it occurs in the batch, so rare patterns move as fast as
+    common ones.
+    :param dataset: A PositionDataset.
+    :param weights: The weights to start from, the default weights if None.
+    :param target: 'result' to fit the final result of the game times scale, 'score' for the search score.
+    :param log: Optional function called with the root mean squared error of every epoch.
+    :return: The int16 weights.
+    """
+    flag, field = (HAS_RESULT, 'result') if target == 'result' else (HAS_SCORE, 'score')
+    factor = scale if target == 'result' else 1
+    fitted = (default_weights() if weights is None else np.asarray(weights)).astype(np.float64)
+    flat = fitted.reshape(-1)
+    for epoch in range(epochs):
+        squared, count = 0.0, 0
+        for records in dataset.chunks(batch_size):
+            records = records[(records['flags'] & flag) != 0]
+            if not len(records):
+                continue
+            phases, indices, mobility = features(records['white'], records['black'])
+            cells = phases[:, None] * WEIGHTS_PER_PHASE + indices
+            mobility_cells = phases * WEIGHTS_PER_PHASE + MOBILITY
+            targets = records[field].astype(np.float64) * factor
+            errors = flat[cells].sum(axis=1) + flat[mobility_cells] * mobility - targets
+            squared += float(errors @ errors)
+            count += len(errors)
+
+            gradient = np.bincount(cells.reshape(-1), np.repeat(errors, cells.shape[1]), minlength=flat.size)
+            occurrences = np.bincount(cells.reshape(-1), minlength=flat.size)
+            mobility_gradient = np.bincount(mobility_cells, errors * mobility, minlength=flat.size)
+            mobility_norm = np.bincount(mobility_cells, mobility * mobility, minlength=flat.size)
+            flat -= learning_rate * gradient / np.maximum(occurrences, 1)
+            flat -= learning_rate * mobility_gradient / np.maximum(mobility_norm, 1)
+        if log:
+            log(f"epoch {epoch + 1}: rmse {np.sqrt(squared / max(count, 1)):.2f} on {count} positions")
+    return np.clip(np.rint(fitted), -32768, 32767).astype(np.int16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a weight file for PatternEvaluator.")
+    parser.add_argument('output', help="The weight file to write (.npy)")
+    parser.add_argument('--dataset', help="Train on this position dataset (see PositionDataset.py); without it "
+                                          "the weights derived from AdvancedEvaluator are written")
+    parser.add_argument('--start', help="A weight file to start training from, instead of the default weights")
+    parser.add_argument('--target', choices=('result', 'score'), default='result',
+                        help="Fit the final result of the game or the search score of the positions")
+    parser.add_argument('--scale', type=float, default=10, help="Evaluation units per disc of the final result")
+    parser.add_argument('--epochs', type=int, default=4)
+    parser.add_argument('--learning-rate', type=float, default=0.01)
+    parser.add_argument('--batch-size', type=int, default=4096)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    weights = load_weights(args.start) if args.start else default_weights()
+    if args.dataset:
+        weights = train(PositionDataset(args.dataset), weights, args.target, args.scale, args.epochs,
+                        args.learning_rate, args.batch_size, log=print)
+    np.save(args.output, weights)
+    print(f"{weights.size} weights written to {args.output} in {time.time() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import threading
+
+
+class Ponderer(object):
+    """
+    Searches on the opponent's time. After the engine has answered a move, the Ponderer plays the answer and
+    the opponent's expected reply (from the principal variation) and searches the resulting position in a
+    background thread, without a time limit. When the real position arrives, a ponder hit gives the running
+    search the real time limit and lets it finish its iterative deepening. A miss stops it at once.
+
+    The AlphaBeta instance must not be used by anybody else while a ponder search is running.
+    """
+
+    def __init__(self, alpha_beta):
+        self.alpha_beta = alpha_beta
+        self.thread = None
+        self.board_string = None  # The position being pondered
+        self.best_move = None
+
+    def start(self, position, move):
+        """
+        Start pondering after the engine played a move.
+        :param position: The position the engine was asked about.
+        :param move: The OthelloAction the engine answered with.
+        """
+        self.stop()
+        after_move = position.make_move(move)
+        variation = self.alpha_beta.principal_variation(after_move, 1)
+        if not variation or after_move.is_game_over():
+            return
+
+        ponder_position = after_move.make_move(variation[0])
+        self.board_string = ponder_position.get_board_string()
+        self.best_move = None
+        self.alpha_beta.start_clock(float('inf'))
+        self.alpha_beta.new_search()
+        self.thread = threading.Thread(target=self.__search, args=(ponder_position,), daemon=True)
+        self.thread.start()
+
+    def __search(self, position):
+        self.best_move = self.alpha_beta.iterative_deepening(position, self.alpha_beta.search_depth)
+
+    def finish(self, position, time_limit):
+        """
+        Handle the real position. On a ponder hit, wait for the ponder search to complete under the time limit.
+        On a miss, stop it.
+        :param position: The position the engine now has to move in.
+        :param time_limit: The time limit for the move in seconds.
+        :return: The best move as an OthelloAction on a ponder hit, otherwise None.
+        """
+        if self.thread is None:
+            return None
+        if position.get_board_string() != self.board_string:
+            self.stop()
+            return None
+
+        self.alpha_beta.start_clock(time_limit)
+        self.thread.join()
+        self.thread = None
+        return self.best_move
+
+    def stop(self):
+        """
+        Stop the ponder search, if there is one, and wait for it to return.
+        """
+        if self.thread is not None:
+            self.alpha_beta.stop()
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,265 @@
+import argparse
+import itertools
+import json
+import time
+import numpy as np
+from BitboardPosition import BitboardPosition
+from OthelloAction import OthelloAction
+from TranspositionTable import encode_move, NO_MOVE
+
+# One position. The discs are bitboards with bit (row - 1) * 8 + (col - 1) for each square, side is 1 when white
+# is to move. Score (a search score) and result (the final disc differential of the game) are from white's point
+# of view, the move is a square, PASS_MOVE or NO_MOVE as TranspositionTable.encode_move gives it. The flags say
+# which of score, result and game are set. The fields are packed, 28 bytes per record.
+POSITION_DTYPE = np.dtype([('white', '<u8'), ('black', '<u8'), ('score', '<i4'), ('game', '<u4'),
+                           ('result', 'i1'), ('move', 'u1'), ('side', 'u1'), ('flags', 'u1')])
+
+HAS_SCORE = 1
+HAS_RESULT = 2
+HAS_GAME = 4
+
+CHUNK_SIZE = 1 << 16  # Records per chunk when reading and converting
+
+# Which bytes may appear as the side to move and as a square of a board string
+_SIDE_CHARS = np.zeros(256, dtype=bool)
+_SIDE_CHARS[list(b'WB')] = True
+_CELL_CHARS = np.zeros(256, dtype=bool)
+_CELL_CHARS[list(b'OXE')] = True
+
+
+class PositionDataset(object):
+    """
+    A read-only file of positions: a .npy file of POSITION_DTYPE records, written by PositionWriter. The file
+    is memory-mapped, so opening it costs nothing and the chunks handed out are views of the file, not copies.
+    """
+
+    def __init__(self, path):
+        self.records = np.load(path, mmap_mode='r')
+        if self.records.dtype != POSITION_DTYPE:
+            raise ValueError(f"{path} is not a position dataset")
+
+    def __len__(self):
+        return len(self.records)
+
+    def chunks(self, size=CHUNK_SIZE, start=0, stop=None):
+        """
+        Go through the records in consecutive slices.
+        :param size: The number of records per chunk; the last one may be shorter.
+        :param start: The first record.
+        :param stop: The record after the last one, the end of the file by default.
+        :return: An iterator of structured arrays of POSITION_DTYPE.
+        """
+        stop = len(self.records) if stop is None else min(stop, len(self.records))
+        for begin in range(start, stop, size):
+            yield self.records[begin:min(begin + size, stop)]
+
+    def position(self, index):
+        """
+        The position of a record, as a BitboardPosition.
+        """
+        return to_position(self.records[index])
+
+
+class PositionWriter(object):
+    """
+    Appends records to a dataset file as they come, so a dataset never has to fit in memory. The .npy header is
+    written with a count of zero and corrected by close(); NumPy pads the header so the count fits in place.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.file = open(path, 'wb')
+        self.header_size = self._write_header()
+
+    def _write_header(self):
+        self.file.seek(0)
+        np.lib.format.write_array_header_1_0(self.file, {'descr': np.lib.format.dtype_to_descr(POSITION_DTYPE),
+                                                         'fortran_order': False, 'shape': (self.count,)})
+        return self.file.tell()
+
+    def write(self, records):
+        """
+        Append records.
+        :param records: A structured array of POSITION_DTYPE.
+        """
+        if records.dtype != POSITION_DTYPE:
+            raise ValueError(f"Expected records of POSITION_DTYPE, got {records.dtype}")
+        self.file.write(np.ascontiguousarray(records).tobytes())
+        self.count += len(records)
+
+    def close(self):
+        if self.file.closed:
+            return
+        end = self.file.tell()
+        if self._write_header() != self.header_size:
+            raise ValueError(f"The header of {self.path} does not fit {self.count} records")
+        self.file.seek(end)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def from_strings(board_strings):
+    """
+    Records for positions in the 65-character format of get_board_string, without score, result or game.
+    All strings are converted at once.
+    :param board_strings: A sequence of strings, or a NumPy string array.
+    :return: A structured array of POSITION_DTYPE.
+    """
+    strings = np.asarray(board_strings)
+    if strings.size == 0:
+        return np.zeros(0, dtype=POSITION_DTYPE)
+    if strings.dtype.kind not in 'US' or strings.dtype.itemsize != 65 * (4 if strings.dtype.kind == 'U' else 1):
+        raise ValueError("Board strings must be exactly 65 characters long")
+    chars = np.ascontiguousarray(strings.astype('S65')).reshape(-1).view(np.uint8).reshape(-1, 65)
+    side, cells = chars[:, 0], chars[:, 1:]
+    if not (_SIDE_CHARS[side].all() and _CELL_CHARS[cells].all()):
+        raise ValueError("Board strings must be 'W' or 'B' followed by 64 of 'O', 'X' and 'E'")
+
+    records = np.zeros(len(chars), dtype=POSITION_DTYPE)
+    records['white'] = np.packbits(cells == ord('O'), axis=1, bitorder='little').view('<u8')[:, 0]
+    records['black'] = np.packbits(cells == ord('X'), axis=1, bitorder='little').view('<u8')[:, 0]
+    records['side'] = side == ord('W')
+    records['move'] = NO_MOVE
+    return records
+
+
+def to_strings(records):
+    """
+    The 65-character board strings of records, all converted at once.
+    :return: A NumPy array of strings.
+    """
+    count = len(records)
+    white = np.unpackbits(np.ascontiguousarray(records['white'], dtype='<u8').view(np.uint8),
+                          bitorder='little').reshape(count, 64).astype(bool)
+    black = np.unpackbits(np.ascontiguousarray(records['black'], dtype='<u8').view(np.uint8),
+                          bitorder='little').reshape(count, 64).astype(bool)
+    chars = np.full((count, 65), ord('E'), dtype=np.uint8)
+    chars[:, 0] = np.where(records['side'] != 0, ord('W'), ord('B'))
+    chars[:, 1:][white] = ord('O')
+    chars[:, 1:][black] = ord('X')
+    return chars.view('S65')[:, 0].astype('U65')
+
+
+def to_position(record):
+    """
+    The position of one record, as a BitboardPosition.
+    """
+    return BitboardPosition.from_bitboards(int(record['white']), int(record['black']), bool(record['side']))
+
+
+def encode_positions(positions, scores=None, moves=None, results=None, game=None):
+    """
+    Records for positions.
+    :param positions: A sequence of OthelloPosition or BitboardPosition.
+    :param scores: Optional search scores from white's point of view, one per position.
+    :param moves: Optional best moves as OthelloAction (or None), one per position.
+    :param results: Optional final disc differentials for white, one per position.
+    :param game: Optional game id of all the positions.
+    :return: A structured array of POSITION_DTYPE.
+    """
+    records = np.zeros(len(positions), dtype=POSITION_DTYPE)
+    if not len(positions):
+        return records
+    bitboards = np.array([position.get_bitboards() for position in positions], dtype=np.uint64)
+    records['white'], records['black'] = bitboards[:, 0], bitboards[:, 1]
+    records['side'] = [position.maxPlayer for position in positions]
+    records['move'] = NO_MOVE if moves is None else [encode_move(move) for move in moves]
+    flags = 0
+    if scores is not None:
+        records['score'] = scores
+        flags |= HAS_SCORE
+    if results is not None:
+        records['result'] = results
+        flags |= HAS_RESULT
+    if game is not None:
+        records['game'] = game
+        flags |= HAS_GAME
+    records['flags'] = flags
+    return records
+
+
+def encode_game(moves, result, game):
+    """
+    Records for the positions of a game, each with the move played and the final result.
+    :param moves: The moves of the game from the start position, as move strings ("(row,col)" or "pass").
+    :param result: The final disc differential for white.
+    :param game: The game id.
+    """
+    position = BitboardPosition()
+    positions, actions = [], []
+    for move in moves:
+        action = OthelloAction.from_string(move)
+        positions.append(position)
+        actions.append(action)
+        position = position.make_move(action)
+    return encode_positions(positions, moves=actions, results=[result] * len(positions), game=game)
+
+
+def encode_games(games, first_game=0):
+    """
+    Records for the games of a match, as MatchRunner writes them. Forfeited games are left out, as their results
+    say nothing about the positions.
+    :param games: An iterable of game dicts with the moves and the result.
+    :param first_game: The game id of the first game; the others are numbered on.
+    :return: An iterator of record arrays, one per game.
+    """
+    for game_id, game in enumerate(games, first_game):
+        if not game.get('forfeit'):
+            yield encode_game(game['moves'], game['result'], game_id)
+
+
+def read_games(path):
+    """
+    The games of a JSON lines file written by MatchRunner --output.
+    """
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_board_strings(path, size=CHUNK_SIZE):
+    """
+    Records for a text file with a board string per line, optionally followed by a score for white.
+    :return: An iterator of record arrays of up to size records.
+    """
+    with open(path) as file:
+        while True:
+            parts = [line.split() for line in (file.readline() for _ in range(size)) if line.strip()]
+            if not parts:
+                return
+            records = from_strings([part[0] for part in parts])
+            scored = np.array([len(part) > 1 for part in parts])
+            records['score'][scored] = [int(part[1]) for part in parts if len(part) > 1]
+            records['flags'][scored] |= HAS_SCORE
+            yield records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a binary position dataset from games and board strings.")
+    parser.add_argument('output', help="The dataset file to write (.npy)")
+    parser.add_argument('--games', nargs='*', default=[], metavar='FILE',
+                        help="JSON lines files of games written by MatchRunner.py --output")
+    parser.add_argument('--positions', nargs='*', default=[], metavar='FILE',
+                        help="Text files with a board string per line, optionally followed by a score for white")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    with PositionWriter(args.output) as writer:
+        games = itertools.chain.from_iterable(read_games(path) for path in args.games)
+        for records in encode_games(games):
+            writer.write(records)
+        for path in args.positions:
+            for records in read_board_strings(path):
+                writer.write(records)
+    print(f"{writer.count} positions written to {args.output} in {time.time() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+import numpy as np
+from CountingEvaluator import CountingEvaluator, AdvancedEvaluator
+from OthelloPosition import OthelloPosition
+from PVSearch import PVSearch
+
+# The parameters the engine uses unless told otherwise
+DEFAULT_PROBCUT = os.environ.get('OTHELLO_PROBCUT', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 'probcut.json'))
+
+EVALUATORS = {'CountingEvaluator': CountingEvaluator, 'AdvancedEvaluator': AdvancedEvaluator}
+
+# Deep search depth: shallow search depth that predicts it. The shallow depth has the same parity, as scores
+# swing between odd and even depths.
+DEFAULT_PAIRS = {3: 1, 4: 2, 5: 1, 6: 2, 7: 3}
+
+
+class ProbCut(object):
+    """
+    Multi-ProbCut parameters: for some search depths, a shallower search whose score predicts the deep score
+    as a * shallow + b, with the standard deviation sigma of the error, per game phase. A phase is a range of
+    PHASE_EMPTIES empty squares.
+
+    A node searched with a null window (alpha, alpha + 1) is cut when a shallow search shows the deep score is
+    outside the window with high confidence: at least beta if the shallow score is at least
+    (beta + confidence * sigma - b) / a, at most alpha if it is at most (alpha - confidence * sigma - b) / a.
+
+    The parameters are fitted for one evaluator with calibrate() and kept in a JSON file.
+    """
+    PHASE_EMPTIES = 12
+    CONFIDENCE = 1.0  # Standard deviations the prediction has to clear the window by
+
+    def __init__(self, cuts, evaluator='AdvancedEvaluator', phase_empties=PHASE_EMPTIES, confidence=CONFIDENCE):
+        """
+        :param cuts: A list of dicts with the keys depth, shallow, phase, a, b, sigma and samples.
+        :param evaluator: The name of the evaluator the parameters were fitted for.
+        """
+        self.cuts = cuts
+        self.evaluator = evaluator
+        self.phase_empties = phase_empties
+        self.confidence = confidence
+        # By depth: the shallow depth and, per phase, (a, b, margin) or None
+        self.table = {}
+        phases = 64 // phase_empties + 1
+        for cut in cuts:
+            shallow, by_phase = self.table.setdefault(cut['depth'], (cut['shallow'], [None] * phases))
+            if cut['shallow'] == shallow and cut['a'] > 0:
+                by_phase[cut['phase']] = (cut['a'], cut['b'], confidence * cut['sigma'])
+
+    @classmethod
+    def load(cls, path=DEFAULT_PROBCUT, confidence=CONFIDENCE):
+        with open(path) as file:
+            data = json.load(file)
+        return cls(data['cuts'], data['evaluator'], data['phase_empties'], confidence)
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump({'evaluator': self.evaluator, 'phase_empties': self.phase_empties, 'cuts': self.cuts},
+                      file, indent=1)
+
+    def cut(self, depth, empties):
+        """
+        The cut to try at a node.
+        :param depth: The remaining depth of the node.
+        :param empties: The number of empty squares.
+        :return: A tuple (shallow depth, a, b, margin), or None if there is no cut for the node.
+        """
+        entry = self.table.get(depth)
+        if entry is None:
+            return None
+        parameters = entry[1][empties // self.phase_empties]
+        return None if parameters is None else (entry[0],) + parameters
+
+    @staticmethod
+    def high_bound(beta, a, b, margin):
+        """The shallow score at and above which the deep score is predicted to be at least beta."""
+        return math.ceil((beta + margin - b) / a)
+
+    @staticmethod
+    def low_bound(alpha, a, b, margin):
+        """The shallow score at and below which the deep score is predicted to be at most alpha."""
+        return math.floor((alpha - margin - b) / a)
+
+
+def sample_positions(count, seed=0, min_plies=4, max_plies=56):
+    """
+    Positions of random games, stopped after a random number of moves, so all phases are covered.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = OthelloPosition()
+        position.initialize()
+        for _ in range(rng.randint(min_plies, max_plies)):
+            if position.is_game_over():
+                break
+            position = position.make_move(rng.choice(position.get_moves()))
+        if not position.is_game_over():
+            positions.append(position)
+    return positions
+
+
+def search_scores(position, max_depth, evaluator):
+    """
+    The scores of full-width searches of a position at depths 0 to max_depth, from the side to move.
+    """
+    search = PVSearch(search_depth=max_depth, evaluator=evaluator, endgame_empties=0, aspiration_window=None)
+    search.start_clock(float('inf'))
+    search.new_search()
+    search.iterative_deepening(position, max_depth)
+    return [search.leaf_score(position, 0)] + search.scores
+
+
+def fit(samples, pairs=None, phase_empties=ProbCut.PHASE_EMPTIES, min_samples=20):
+    """
+    Fit the deep score against the shallow score for every depth pair and phase by least squares.
+    :param samples: A list of (empty squares, scores by depth) tuples, as search_scores gives them.
+    :param pairs: A dict from deep depth to shallow depth.
+    :param min_samples: Phases with fewer positions get no cut.
+    :return: A list of cuts as ProbCut takes them.
+    """
+    pairs = DEFAULT_PAIRS if pairs is None else pairs
+    cuts = []
+    for depth, shallow in sorted(pairs.items()):
+        for phase in range(64 // phase_empties + 1):
+            data = np.array([(scores[shallow], scores[depth]) for empties, scores in samples
+                             if empties // phase_empties == phase and len(scores) > depth], dtype=float)
+            if len(data) < min_samples:
+                continue
+            a, b = np.polyfit(data[:, 0], data[:, 1], 1)
+            sigma = float(np.std(data[:, 1] - (a * data[:, 0] + b)))
+            cuts.append({'depth': depth, 'shallow': shallow, 'phase': phase, 'a': float(a), 'b': float(b),
+                         'sigma': sigma, 'samples': len(data)})
+    return cuts
+
+
+def calibrate(count=200, pairs=None, evaluator='AdvancedEvaluator', seed=0, log=None):
+    """
+    Fit ProbCut parameters on random positions.
+    :param count: The number of positions.
+    :param log: Optional function called with a progress message for every position.
+    :return: A ProbCut.
+    """
+    pairs = DEFAULT_PAIRS if pairs is None else pairs
+    evaluator_instance = EVALUATORS[evaluator]()
+    samples = []
+    for index, position in enumerate(sample_positions(count, seed)):
+        white, black = position.get_bitboards()
+        scores = search_scores(position, max(pairs), evaluator_instance)
+        samples.append((64 - (white | black).bit_count(), scores))
+        if log:
+            log(f"{index + 1}/{count} {position.get_board_string()} {scores}")
+    return ProbCut(fit(samples, pairs), evaluator)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit Multi-ProbCut parameters for the PVS engine.")
+    parser.add_argument('--output', default=DEFAULT_PROBCUT, help="The parameter file to write")
+    parser.add_argument('--positions', type=int, default=200, help="The number of random positions to search")
+    parser.add_argument('--pairs', default=','.join(f"{deep}:{shallow}" for deep, shallow in DEFAULT_PAIRS.items()),
+                        help="Depth pairs as deep:shallow,...")
+    parser.add_argument('--evaluator', choices=sorted(EVALUATORS), default='AdvancedEvaluator')
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random positions")
+    args = parser.parse_args()
+
+    pairs = {int(deep): int(shallow) for deep, shallow in (pair.split(':') for pair in args.pairs.split(','))}
+    start_time = time.time()
+    probcut = calibrate(args.positions, pairs, args.evaluator, args.seed, log=print)
+    probcut.save(args.output)
+    for cut in probcut.cuts:
+        print(f"depth {cut['depth']} from {cut['shallow']}, phase {cut['phase']}: a={cut['a']:.3f} "
+              f"b={cut['b']:.1f} sigma={cut['sigma']:.1f} ({cut['samples']} positions)")
+    print(f"{len(probcut.cuts)} cuts written to {args.output} in {time.time() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
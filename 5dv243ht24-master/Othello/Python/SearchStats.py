@@ -0,0 +1,118 @@
+import json
+import time
+
+# Why iterative deepening stopped
+MAX_DEPTH = 'max_depth'        # The last iteration finished
+TIME = 'time'                  # The deadline passed
+STOPPED = 'stopped'            # Another thread asked the search to stop
+TIME_BUDGET = 'time_budget'    # Too little time was left to start the next iteration
+ENDGAME_SOLVED = 'endgame_solved'  # The endgame solver found the exact result
+
+
+class SearchStats(object):
+    """
+    Collects statistics about the searches of an AlphaBeta instance and writes one JSON line per search.
+    Give it to AlphaBeta(stats=...). Without one, AlphaBeta only checks for None where it would record
+    something.
+
+    Per search: nodes and time of every iteration, the effective branching factor, transposition table
+    probes, hits and cutoffs (hits that ended the node), beta cutoffs and how many of them came from the
+    first move tried, evaluator calls and time, and why iterative deepening stopped.
+    """
+
+    def __init__(self, output=None):
+        """
+        :param output: A file to write the JSON lines to, or None to only keep the last record.
+        """
+        self.output = output
+        self.last_record = None
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the counts of the current search.
+        """
+        self.start_time = time.perf_counter()
+        self.iterations = []  # Per finished iteration: (depth, nodes, seconds)
+        self.iteration_start = (self.start_time, 0)
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.evaluations = 0
+        self.evaluation_time = 0.0
+
+    def start_iteration(self, nodes):
+        """
+        Called before an iteration, with the node count of the search so far.
+        """
+        self.iteration_start = (time.perf_counter(), nodes)
+
+    def finish_iteration(self, depth, nodes):
+        """
+        Called after a finished iteration, with the node count of the search so far.
+        """
+        start_time, start_nodes = self.iteration_start
+        self.iterations.append((depth, nodes - start_nodes, time.perf_counter() - start_time))
+
+    def record_cutoff(self, first_move):
+        """
+        Count a beta cutoff.
+        :param first_move: True if the move that caused it was the first one searched.
+        """
+        self.cutoffs += 1
+        self.first_move_cutoffs += first_move
+
+    def evaluate(self, function, argument, count=1):
+        """
+        Call an evaluation function, counting the calls and the time spent.
+        :param count: The number of positions the call evaluates.
+        """
+        start_time = time.perf_counter()
+        result = function(argument)
+        self.evaluation_time += time.perf_counter() - start_time
+        self.evaluations += count
+        return result
+
+    def finish(self, position, move, nodes, stop_reason, **extra):
+        """
+        Finish the record of a search, write it and start counting the next one.
+        :param position: The searched position.
+        :param move: The chosen move as an OthelloAction, or None.
+        :param nodes: The nodes visited in the search.
+        :param stop_reason: Why iterative deepening stopped.
+        :param extra: More fields for the record.
+        :return: The record, a dict.
+        """
+        elapsed = time.perf_counter() - self.start_time
+        nodes_by_depth = {depth: iteration_nodes for depth, iteration_nodes, _ in self.iterations}
+        depth = self.iterations[-1][0] if self.iterations else 0
+        total_nodes = sum(nodes_by_depth.values())
+        record = {
+            'position': position.get_board_string(),
+            'move': None if move is None else 'pass' if move.is_pass_move else f"({move.row},{move.col})",
+            'depth': depth,
+            'stop_reason': stop_reason,
+            'seconds': elapsed,
+            'nodes': nodes,
+            'nodes_per_second': nodes / elapsed if elapsed > 0 else 0.0,
+            'iterations': [{'depth': d, 'nodes': n, 'seconds': s} for d, n, s in self.iterations],
+            # Nodes of an iteration over those of the one before, and the average over the whole search
+            'branching': [n / nodes_by_depth[d - 1] for d, n, _ in self.iterations
+                          if nodes_by_depth.get(d - 1)],
+            'ebf': total_nodes ** (1 / depth) if depth and total_nodes else 0.0,
+            'tt_probes': nodes,
+            'tt_hits': self.tt_hits,
+            'tt_cutoffs': self.tt_cutoffs,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoff_ratio': self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+            'evaluations': self.evaluations,
+            'evaluation_seconds': self.evaluation_time,
+        }
+        record.update(extra)
+        self.last_record = record
+        if self.output is not None:
+            self.output.write(json.dumps(record) + '\n')
+            self.output.flush()
+        self.reset()
+        return record
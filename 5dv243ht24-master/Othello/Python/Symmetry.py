@@ -0,0 +1,101 @@
+import Zobrist
+from OthelloAction import OthelloAction
+
+# The 8 symmetries of the board (rotations and reflections) are numbered 0-7. Symmetry t transposes the board
+# if t & 4, then mirrors the columns if t & 1, then mirrors the rows if t & 2. Symmetry 0 is the identity.
+SYMMETRIES = range(8)
+
+
+def flip_vertical(bitboard):
+    """
+    Mirror the rows of a bitboard: row 1 becomes row 8.
+    """
+    return int.from_bytes(bitboard.to_bytes(8, 'little'), 'big')
+
+
+def mirror_horizontal(bitboard):
+    """
+    Mirror the columns of a bitboard: column 1 becomes column 8.
+    """
+    bitboard = ((bitboard >> 1) & 0x5555555555555555) | ((bitboard & 0x5555555555555555) << 1)
+    bitboard = ((bitboard >> 2) & 0x3333333333333333) | ((bitboard & 0x3333333333333333) << 2)
+    return ((bitboard >> 4) & 0x0F0F0F0F0F0F0F0F) | ((bitboard & 0x0F0F0F0F0F0F0F0F) << 4)
+
+
+def transpose(bitboard):
+    """
+    Mirror a bitboard in the (1,1)-(8,8) diagonal: square (row, col) goes to (col, row).
+    """
+    t = 0x0F0F0F0F00000000 & (bitboard ^ (bitboard << 28))
+    bitboard ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (bitboard ^ (bitboard << 14))
+    bitboard ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (bitboard ^ (bitboard << 7))
+    bitboard ^= t ^ (t >> 7)
+    return bitboard
+
+
+def transform(bitboard, symmetry):
+    """
+    Apply a symmetry to a bitboard.
+    """
+    if symmetry & 4:
+        bitboard = transpose(bitboard)
+    if symmetry & 1:
+        bitboard = mirror_horizontal(bitboard)
+    if symmetry & 2:
+        bitboard = flip_vertical(bitboard)
+    return bitboard
+
+
+# SQUARE_MAPS[t][square] is the square a square goes to under symmetry t, INVERSE[t] the symmetry undoing t
+SQUARE_MAPS = [[transform(1 << square, t).bit_length() - 1 for square in range(64)] for t in SYMMETRIES]
+INVERSE = [next(u for u in SYMMETRIES if all(SQUARE_MAPS[u][SQUARE_MAPS[t][square]] == square
+                                             for square in range(64)))
+           for t in SYMMETRIES]
+
+
+def canonical_form(white, black):
+    """
+    The canonical orientation of a board: the smallest (white, black) pair among its 8 symmetries.
+    :return: A tuple (white, black, symmetry), with the symmetry that turns the board into its canonical form.
+    """
+    best = (white, black, 0)
+    for symmetry in range(1, 8):
+        candidate = (transform(white, symmetry), transform(black, symmetry), symmetry)
+        if candidate < best:
+            best = candidate
+    return best
+
+
+def canonical_key(white, black, white_to_move):
+    """
+    The Zobrist key of the canonical form of a position, the same for all its symmetric positions.
+    :return: A tuple (key, symmetry), with the symmetry that turns the position into its canonical form.
+    """
+    white, black, symmetry = canonical_form(white, black)
+    return Zobrist.compute_key(white, black, white_to_move), symmetry
+
+
+def transform_square(square, symmetry):
+    """
+    Map a square number (0-63), or PASS_MOVE/NO_MOVE which are left unchanged, through a symmetry.
+    """
+    return SQUARE_MAPS[symmetry][square] if square < 64 else square
+
+
+def transform_action(action, symmetry):
+    """
+    Map an OthelloAction (or None) through a symmetry.
+    """
+    if action is None or action.is_pass_move or not symmetry:
+        return action
+    square = SQUARE_MAPS[symmetry][(action.row - 1) * 8 + (action.col - 1)]
+    return OthelloAction(square // 8 + 1, square % 8 + 1)
+
+
+def from_canonical(action, symmetry):
+    """
+    Map a move of the canonical orientation back to the position whose canonical_key gave the symmetry.
+    """
+    return transform_action(action, INVERSE[symmetry])
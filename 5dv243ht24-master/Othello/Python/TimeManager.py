@@ -0,0 +1,134 @@
+import time
+
+
+class TimeManager(object):
+    """
+    The clock of a search. The deadline is the time limit minus a margin for returning the move: the hard limit
+    at which a search stops, throwing away an unfinished iteration. The soft target is SOFT_SHARE of the way to
+    it. Both are set together by start(), so that another thread can move them while the search runs
+    (pondering).
+
+    Reading the clock is the expensive part of a time check, so time_exceeded() only reads it every
+    CHECK_INTERVAL calls. Iterative deepening asks should_start_iteration() before each depth: an iteration
+    is predicted to take as long as the last one times the growth seen over the last iterations, and is
+    only started if it is predicted to finish before the soft target. When the best move changed in the last
+    iteration, the next one may run up to the deadline instead, to settle the move; an iteration predicted
+    to overrun the deadline is never started.
+
+    The clock is time.monotonic(), which on Linux is shared by all processes of the machine, so a start time
+    can be handed to another process.
+    """
+    CHECK_INTERVAL = 16      # Calls of time_exceeded between two clock reads, a few ms of search
+    MAX_MARGIN = 0.1         # Seconds kept in reserve to return the move, for long time limits
+    MARGIN_SHARE = 0.05      # Reserve as a part of the time limit, for short time limits
+    MIN_MARGIN = 0.02
+    DEFAULT_BRANCHING = 4.0  # Growth of the iteration time assumed until two iterations are measured
+    MIN_BRANCHING, MAX_BRANCHING = 1.5, 20.0
+    SOFT_SHARE = 0.8         # Part of the time to the deadline that iterations normally have to finish in
+    MIN_MEASURED_TIME = 0.001  # Iterations faster than this do not give a useful branching factor
+
+    def __init__(self):
+        self.start_time = None
+        self.time_limit = None
+        self.deadline = float('inf')
+        self.soft_deadline = float('inf')
+        self.stop_requested = False
+        self.countdown = 0           # Calls of time_exceeded until the next clock read
+        self.out_of_time = False     # Result of the last clock read
+        self.iteration_times = []    # Seconds of every finished iteration of the current search
+        self.best_moves = []         # Best move of every finished iteration
+
+    @classmethod
+    def margin(cls, time_limit):
+        """
+        The reserve for returning the move under a time limit.
+        """
+        return min(cls.MAX_MARGIN, max(cls.MIN_MARGIN, cls.MARGIN_SHARE * time_limit))
+
+    def start(self, time_limit, start_time=None):
+        """
+        Start the time of a search, or move the deadline of a running one.
+        :param start_time: When the time started counting, in time.monotonic() seconds, if not now.
+        """
+        start_time = time.monotonic() if start_time is None else start_time
+        self.start_time = start_time
+        self.time_limit = time_limit
+        deadline = start_time + time_limit - self.margin(time_limit)
+        self.soft_deadline = start_time + (deadline - start_time) * self.SOFT_SHARE
+        self.deadline = deadline
+        self.stop_requested = False
+        self.out_of_time = False
+        self.countdown = 0
+
+    def new_search(self):
+        """
+        Forget the iterations of the last search.
+        """
+        self.iteration_times = []
+        self.best_moves = []
+
+    def stop(self):
+        self.stop_requested = True
+
+    def time_exceeded(self):
+        """
+        Check if the search has to stop. The clock is only read every CHECK_INTERVAL calls.
+        """
+        if self.stop_requested:
+            return True
+        self.countdown -= 1
+        if self.countdown <= 0:
+            self.countdown = self.CHECK_INTERVAL
+            self.out_of_time = time.monotonic() > self.deadline
+        return self.out_of_time
+
+    def remaining(self):
+        """
+        Seconds left until the deadline.
+        """
+        return self.deadline - time.monotonic()
+
+    def iteration_done(self, seconds, best_move):
+        """
+        Record a finished iteration.
+        """
+        self.iteration_times.append(seconds)
+        self.best_moves.append(best_move)
+
+    def branching_factor(self):
+        """
+        How much longer an iteration takes than the one before. Odd and even depths grow differently, so when
+        there are three iterations the growth over the last two is averaged.
+        """
+        times = self.iteration_times
+        if len(times) >= 3 and times[-3] >= self.MIN_MEASURED_TIME:
+            growth = (times[-1] / times[-3]) ** 0.5
+        elif len(times) >= 2 and times[-2] >= self.MIN_MEASURED_TIME:
+            growth = times[-1] / times[-2]
+        else:
+            return self.DEFAULT_BRANCHING
+        return min(max(growth, self.MIN_BRANCHING), self.MAX_BRANCHING)
+
+    def best_move_changed(self):
+        """
+        True if the last iteration changed the best move.
+        """
+        moves = self.best_moves
+        return len(moves) >= 2 and moves[-1] is not None and moves[-2] is not None and (
+            moves[-1].is_pass_move, moves[-1].row, moves[-1].col) != (moves[-2].is_pass_move, moves[-2].row,
+                                                                        moves[-2].col)
+
+    def should_start_iteration(self):
+        """
+        Decide whether to start the next iteration: only if it is expected to finish before the soft target, or
+        before the deadline while the best move is unstable.
+        """
+        if self.stop_requested:
+            return False
+        now = time.monotonic()
+        if now >= self.deadline:
+            return False
+        if not self.iteration_times:
+            return True
+        finish = now + self.iteration_times[-1] * self.branching_factor()
+        return finish <= (self.deadline if self.best_move_changed() else self.soft_deadline)
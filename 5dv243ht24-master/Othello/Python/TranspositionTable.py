@@ -0,0 +1,159 @@
+import numpy as np
+from OthelloAction import OthelloAction
+
+# Bound types of a stored score
+EXACT = 0  # The score is the exact value of the position
+LOWER = 1  # The search failed high, the value is at least the score
+UPPER = 2  # The search failed low, the value is at most the score
+
+PASS_MOVE = 64
+NO_MOVE = 255
+
+# Layout of the 64-bit data word of an entry
+SCORE_OFFSET = 1 << 31  # Scores are stored as unsigned 32-bit numbers
+DEPTH_SHIFT = 32
+MOVE_SHIFT = 40
+BOUND_SHIFT = 48
+AGE_SHIFT = 50
+
+
+def encode_move(action):
+    """
+    Encode an OthelloAction as a square number, PASS_MOVE or NO_MOVE.
+    """
+    if action is None:
+        return NO_MOVE
+    if action.is_pass_move:
+        return PASS_MOVE
+    return (action.row - 1) * 8 + (action.col - 1)
+
+
+def decode_move(code):
+    """
+    Turn a move code from encode_move back into an OthelloAction (or None).
+    """
+    if code == NO_MOVE:
+        return None
+    if code == PASS_MOVE:
+        return OthelloAction(0, 0, is_pass_move=True)
+    return OthelloAction(code // 8 + 1, code % 8 + 1)
+
+
+class TranspositionTable(object):
+    """
+    A fixed-size transposition table. Every entry is two 64-bit words in preallocated arrays: the position key
+    and a packed data word (score, depth, best move, bound type and age). The key is stored XOR'ed with the
+    data, so an entry whose two words do not belong together is never returned.
+
+    The entries are grouped in buckets of two. The first slot keeps the deepest result of the current search,
+    the second slot is always replaced.
+
+    The arrays can live in a buffer provided by the caller, such as shared memory, so that several processes
+    search with one table. Concurrent writes need no locking: a torn entry fails the key check.
+    """
+    ENTRY_BYTES = 16
+    BUCKET_SIZE = 2
+
+    def __init__(self, size_mb=16, buffer=None):
+        """
+        Allocate the table.
+        :param size_mb: Memory for the entries in megabytes. Rounded down to a power of two number of buckets.
+        :param buffer: Optional writable buffer of at least memory_size(size_mb) bytes to hold the entries.
+        """
+        buckets = self.bucket_count(size_mb)
+        self.bucket_mask = buckets - 1
+        entries = buckets * self.BUCKET_SIZE
+        if buffer is None:
+            self.key_array = np.zeros(entries, dtype=np.uint64)
+            self.data_array = np.zeros(entries, dtype=np.uint64)
+        else:
+            self.key_array, self.data_array = np.ndarray((2, entries), dtype=np.uint64, buffer=buffer)
+        # Element access through memoryviews is much faster than indexing the NumPy arrays directly
+        self.keys = memoryview(self.key_array).cast('B').cast('Q')
+        self.data = memoryview(self.data_array).cast('B').cast('Q')
+        self.age = 0
+
+    @classmethod
+    def bucket_count(cls, size_mb):
+        """
+        The number of buckets of a table of the given size.
+        """
+        buckets = max(1, int(size_mb * 2 ** 20) // (cls.ENTRY_BYTES * cls.BUCKET_SIZE))
+        return 1 << (buckets.bit_length() - 1)
+
+    @classmethod
+    def memory_size(cls, size_mb):
+        """
+        The number of bytes the entries of a table of the given size take.
+        """
+        return cls.bucket_count(size_mb) * cls.BUCKET_SIZE * cls.ENTRY_BYTES
+
+    def release(self):
+        """
+        Drop the views of the arrays, so that a buffer given to the constructor can be closed.
+        """
+        self.keys.release()
+        self.data.release()
+        self.key_array = self.data_array = None
+
+    def __len__(self):
+        """
+        The number of entries in the table.
+        """
+        return len(self.keys)
+
+    def new_search(self):
+        """
+        Start a new search. Entries of earlier searches are the first to be replaced.
+        """
+        self.age = (self.age + 1) & 0xFF
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        self.key_array.fill(0)
+        self.data_array.fill(0)
+        self.age = 0
+
+    def probe(self, key):
+        """
+        Look up a position.
+        :param key: The Zobrist key of the position.
+        :return: A tuple (score, depth, move, bound) or None if the position is not in the table.
+        """
+        index = (key & self.bucket_mask) * self.BUCKET_SIZE
+        for slot in range(index, index + self.BUCKET_SIZE):
+            data = self.data[slot]
+            if data and self.keys[slot] ^ data == key:
+                return ((data & 0xFFFFFFFF) - SCORE_OFFSET,
+                        (data >> DEPTH_SHIFT) & 0xFF,
+                        decode_move((data >> MOVE_SHIFT) & 0xFF),
+                        (data >> BOUND_SHIFT) & 0x3)
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        """
+        Store the result of a search.
+        :param key: The Zobrist key of the position.
+        :param depth: The remaining search depth of the result.
+        :param score: The score of the position.
+        :param bound: EXACT, LOWER or UPPER.
+        :param move: The best move as an OthelloAction, or None.
+        """
+        score = min(max(int(score), -SCORE_OFFSET + 1), SCORE_OFFSET - 1)
+        data = ((score + SCORE_OFFSET)
+                | min(depth, 0xFF) << DEPTH_SHIFT
+                | encode_move(move) << MOVE_SHIFT
+                | bound << BOUND_SHIFT
+                | self.age << AGE_SHIFT)
+
+        index = (key & self.bucket_mask) * self.BUCKET_SIZE
+        old = self.data[index]
+        if (not old or self.keys[index] ^ old == key or (old >> AGE_SHIFT) & 0xFF != self.age
+                or depth >= (old >> DEPTH_SHIFT) & 0xFF):
+            slot = index
+        else:
+            slot = index + 1
+        self.keys[slot] = key ^ data
+        self.data[slot] = data
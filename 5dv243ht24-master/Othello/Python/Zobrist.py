@@ -0,0 +1,56 @@
+import random
+
+# The keys come from a fixed seed so that every process, and every file written with them, agrees on them.
+_rng = random.Random(5243)
+
+WHITE_KEYS = [_rng.getrandbits(64) for _ in range(64)]  # One key per square for a white disc
+BLACK_KEYS = [_rng.getrandbits(64) for _ in range(64)]  # One key per square for a black disc
+FLIP_KEYS = [w ^ b for w, b in zip(WHITE_KEYS, BLACK_KEYS)]  # Changes the colour of the disc on a square
+SIDE_KEY = _rng.getrandbits(64)  # Part of the key when white is to move
+
+
+def _byte_keys(square_keys):
+    """
+    Tables of the combined keys of the squares set in a byte: tables[i][value] for byte i of a bitboard.
+    """
+    tables = []
+    for byte in range(8):
+        table = [0] * 256
+        for value in range(1, 256):
+            low = value & -value
+            table[value] = table[value ^ low] ^ square_keys[byte * 8 + low.bit_length() - 1]
+        tables.append(table)
+    return tables
+
+
+# Computing a key a byte at a time takes 16 lookups instead of one per disc
+WHITE_BYTE_KEYS = _byte_keys(WHITE_KEYS)
+BLACK_BYTE_KEYS = _byte_keys(BLACK_KEYS)
+
+
+def compute_key(white, black, white_to_move):
+    """
+    Compute the Zobrist key of a position from scratch.
+    :param white: Bitboard of the white discs.
+    :param black: Bitboard of the black discs.
+    :param white_to_move: True if white has the move.
+    :return: The 64-bit key of the position.
+    """
+    key = SIDE_KEY if white_to_move else 0
+    for table, value in zip(WHITE_BYTE_KEYS, white.to_bytes(8, 'little')):
+        key ^= table[value]
+    for table, value in zip(BLACK_BYTE_KEYS, black.to_bytes(8, 'little')):
+        key ^= table[value]
+    return key
+
+
+def flips_key(flips):
+    """
+    The key change caused by flipping all discs of a bitboard.
+    """
+    key = 0
+    while flips:
+        low = flips & -flips
+        key ^= FLIP_KEYS[low.bit_length() - 1]
+        flips ^= low
+    return key
@@ -1,27 +1,172 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
 
-# Create a logger instance
-logger = logging.getLogger()
+# All engine loggers are children of this one: "othello.search", "othello.server", ...
+ROOT_NAME = 'othello'
 
-# Set the logging level
-logger.setLevel(logging.INFO)
+# Nothing is logged until configure() is called. Importing this module has no side effects.
+logger = logging.getLogger(ROOT_NAME)
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
 
-# Create file handler which logs to 'game_log.txt'
-file_handler = logging.FileHandler('game_log.txt')
-file_handler.setLevel(logging.INFO)
+_listener = None
 
-# Create console handler which logs to console (stdout)
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
 
-# Create a formatter and set it for both handlers
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-console_handler.setFormatter(formatter)
+def get_logger(component):
+    """
+    The logger of a component of the engine, e.g. get_logger('search').
+    """
+    return logging.getLogger(f"{ROOT_NAME}.{component}")
 
-# Add the handlers to the logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
 
-# Now, the logger will write to both the file and the console
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line: time, level, component, message, and the fields given to
+    the call as extra={'fields': {...}}.
+    """
 
+    def format(self, record):
+        entry = {'time': round(record.created, 6), 'level': record.levelname,
+                 'component': record.name[len(ROOT_NAME) + 1:] or ROOT_NAME, 'message': record.getMessage()}
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the queue as they are. The standard QueueHandler formats the message first, in the logging
+    thread; here all formatting happens in the writer thread. Arguments of a log call must not be changed
+    after the call.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def parse_levels(text):
+    """
+    Read levels written as "INFO,search=DEBUG,server=WARNING": an optional default level and levels per
+    component.
+    :return: A tuple (default level or None, dict of component levels).
+    """
+    level, levels = None, {}
+    for part in filter(None, (part.strip() for part in text.split(','))):
+        if '=' in part:
+            component, component_level = part.split('=', 1)
+            levels[component.strip()] = component_level.strip().upper()
+        else:
+            level = part.upper()
+    return level, levels
+
+
+def configure(path='game_log.txt', level=logging.INFO, levels=None, console=False):
+    """
+    Start logging. Records go through a queue to a background thread, which formats them as JSON lines and
+    writes them, so a log call only costs the engine a level check and putting the record on the queue.
+    Calling configure again replaces the earlier configuration.
+    :param path: The file to append to, or None for no file.
+    :param level: The level of components without their own.
+    :param levels: Levels per component, e.g. {'search': 'DEBUG', 'server': 'WARNING'}. Also read from the
+        OTHELLO_LOG_LEVELS environment variable, as "search=DEBUG,server=WARNING".
+    :param console: Also write to stderr.
+    """
+    global _listener
+    shutdown()
+
+    handlers = []
+    if path:
+        handlers.append(logging.FileHandler(path))
+    if console:
+        handlers.append(logging.StreamHandler(sys.stderr))
+    formatter = JsonFormatter()
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    logger.handlers.clear()
+    logger.addHandler(_DeferredQueueHandler(records))
+    logger.setLevel(level)
+
+    levels = dict(levels or {})
+    for component, component_level in parse_levels(os.environ.get('OTHELLO_LOG_LEVELS', ''))[1].items():
+        levels.setdefault(component, component_level)
+    for component, component_level in levels.items():
+        get_logger(component).setLevel(component_level.upper() if isinstance(component_level, str)
+                                       else component_level)
+
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown():
+    """
+    Write the records still in the queue and stop the background thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    logger.handlers.clear()
+    logger.addHandler(logging.NullHandler())
+
+
+atexit.register(shutdown)
+
+
+class HotPathLogger(object):
+    """
+    Logging for code that runs very often, like the search. A call returns at once when the level is off, and
+    otherwise only every sample_every-th call, and at most max_per_second calls per second, are logged.
+    Callers with expensive arguments check `enabled` first:
+
+        if search_log.enabled:
+            search_log("node %s", position.get_board_string(), depth=depth)
+    """
+
+    def __init__(self, logger, level=logging.DEBUG, sample_every=1, max_per_second=None):
+        self.logger = logger
+        self.level = level
+        self.sample_every = sample_every
+        self.max_per_second = max_per_second
+        self.calls = 0
+        self.window_start = 0.0  # Start of the current one-second window of the rate limit
+        self.window_count = 0
+        self.dropped = 0  # Calls dropped by the rate limit since the last logged one
+
+    @property
+    def enabled(self):
+        return self.logger.isEnabledFor(self.level)
+
+    def __call__(self, message, *args, **fields):
+        """
+        Log a message with %-style arguments and structured fields, unless it is filtered out.
+        """
+        if not self.logger.isEnabledFor(self.level):
+            return
+        self.calls += 1
+        if self.calls % self.sample_every:
+            return
+        if self.max_per_second is not None:
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.window_start, self.window_count = now, 0
+            if self.window_count >= self.max_per_second:
+                self.dropped += 1
+                return
+            self.window_count += 1
+        if self.dropped:
+            fields['dropped'] = self.dropped
+            self.dropped = 0
+        self.logger.log(self.level, message, *args, extra={'fields': fields})
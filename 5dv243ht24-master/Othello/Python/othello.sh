@@ -52,7 +52,9 @@ elif [ "$do_compile" -eq 0 ]; then
     # Run Python or Java
     if [ -f "../Python/Othello.py" ]; then
 		#echo "Behanchod Run Nhi Ho Raha Hai"
-        python3 -u ../Python/Othello.py "$position" "$time_limit"
+        # The client hands the move to a long-lived engine (started on first use), so the
+        # interpreter and the transposition table stay warm between moves
+        python3 -u ../Python/OthelloClient.py "$position" "$time_limit"
     elif [ -f "Othello.class" ]; then
         java Othello "$position" "$time_limit"
     else
@@ -0,0 +1,64 @@
+import pytest
+from OthelloPosition import OthelloPosition
+from BitboardPosition import BitboardPosition
+from CountingEvaluator import AdvancedEvaluator
+from Benchmark import reference_positions
+
+POSITION_CLASSES = [OthelloPosition, BitboardPosition]
+DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+def square_moves(cells, player, opponent):
+    """
+    The number of legal moves of a player, square by square, 1 for a player who has to pass.
+    :param cells: The 64 board characters in row order.
+    """
+    def flips(row, col, dr, dc):
+        r, c, count = row + dr, col + dc, 0
+        while 0 <= r < 8 and 0 <= c < 8 and cells[r * 8 + c] == opponent:
+            r, c, count = r + dr, c + dc, count + 1
+        return count and 0 <= r < 8 and 0 <= c < 8 and cells[r * 8 + c] == player
+
+    moves = sum(1 for row in range(8) for col in range(8)
+                if cells[row * 8 + col] == 'E' and any(flips(row, col, dr, dc) for dr, dc in DIRECTIONS))
+    return max(moves, 1)
+
+
+def baseline_evaluation(board):
+    """
+    The square-by-square evaluation AdvancedEvaluator had before it worked on bitboards.
+    """
+    cells = board[1:]
+    weights = AdvancedEvaluator.positional_weights
+    counts = {'O': [0, 0, 0, 0], 'X': [0, 0, 0, 0]}  # Discs, corners, X-squares, positional score
+    for i in range(1, 9):
+        for j in range(1, 9):
+            item = cells[(i - 1) * 8 + j - 1]
+            if item in counts:
+                counts[item][0] += 1
+                counts[item][1] += (i, j) in AdvancedEvaluator.corners
+                counts[item][2] += (i, j) in AdvancedEvaluator.x_squares
+                counts[item][3] += weights[i - 1][j - 1]
+    empty_squares = 64 - counts['O'][0] - counts['X'][0]
+    if empty_squares > 40:
+        mobility_weight, positional_weight, corner_weight, x_square_penalty_weight, piece_weight = 10, 5, 10, 20, 2
+    elif empty_squares > 20:
+        mobility_weight, positional_weight, corner_weight, x_square_penalty_weight, piece_weight = 7, 4, 15, 15, 3
+    else:
+        mobility_weight, positional_weight, corner_weight, x_square_penalty_weight, piece_weight = 5, 2, 25, 10, 10
+    white, black = counts['O'], counts['X']
+    return (piece_weight * (white[0] - black[0]) +
+            corner_weight * (white[1] - black[1]) +
+            mobility_weight * (square_moves(cells, 'O', 'X') - square_moves(cells, 'X', 'O')) +
+            positional_weight * (white[3] - black[3]) -
+            x_square_penalty_weight * (black[2] - white[2]))
+
+
+@pytest.mark.parametrize('position_class', POSITION_CLASSES)
+def test_bitboard_evaluation_matches_baseline(position_class):
+    evaluator = AdvancedEvaluator()
+    for board in reference_positions(150):
+        position = position_class(board)
+        white, black = position.get_bitboards()
+        assert evaluator.evaluate(position) == baseline_evaluation(board)
+        assert evaluator.evaluate_bitboards(white, black) == baseline_evaluation(board)
@@ -0,0 +1,71 @@
+import random
+import pytest
+from BitboardPosition import legal_moves_mask, flips_mask
+from EndgameSolver import EndgameSolver, final_score
+from test_positions import POSITION_CLASSES, start_position, random_move
+
+MAX_EMPTIES = 9  # A plain search of more empties takes seconds
+
+
+def negamax(player, opponent, alpha=-65, beta=65, passed=False):
+    """
+    The final disc differential for the player, by a plain alpha-beta search in square order.
+    """
+    moves = legal_moves_mask(player, opponent)
+    if not moves:
+        if passed:
+            return final_score(player, opponent)
+        return -negamax(opponent, player, -beta, -alpha, True)
+    for square in range(64):
+        if moves >> square & 1:
+            flips = flips_mask(player, opponent, square)
+            score = -negamax(opponent ^ flips, player | flips | 1 << square, -beta, -alpha)
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+    return alpha
+
+
+def endgame_positions(position_class, seed):
+    """
+    Positions of a random game with 1 to MAX_EMPTIES empty squares, one per count the game went through.
+    """
+    rng = random.Random(seed)
+    position, positions = start_position(position_class), []
+    while True:
+        empties = 64 - sum(position.disc_counts())
+        if empties <= MAX_EMPTIES and not position.is_game_over():
+            positions.append(position.clone())
+        move = random_move(position, rng)
+        if move is None:
+            return positions
+        position.apply_move(move)
+
+
+def sign(score):
+    return (score > 0) - (score < 0)
+
+
+def sides(position):
+    white, black = position.get_bitboards()
+    return (white, black) if position.maxPlayer else (black, white)
+
+
+@pytest.mark.parametrize('position_class', POSITION_CLASSES)
+def test_solver_matches_negamax(position_class):
+    """
+    The exact score, the sign of the WLD score and the outcome of the moves the solver picks must agree with
+    the plain search.
+    """
+    exact, wld = EndgameSolver(), EndgameSolver(wld=True)
+    for seed in range(3):
+        for position in endgame_positions(position_class, seed):
+            player, opponent = sides(position)
+            expected = negamax(player, opponent)
+            score, move = exact.solve(position)
+            assert score == expected
+            assert -negamax(*sides(position.make_move(move))) == expected
+            wld_score, move = wld.solve(position)
+            assert sign(wld_score) == sign(expected)
+            assert sign(-negamax(*sides(position.make_move(move)))) == sign(expected)
+
@@ -0,0 +1,48 @@
+import json
+import random
+import numpy as np
+import pytest
+from CountingEvaluator import CountingEvaluator, AdvancedEvaluator
+from PatternEvaluator import PatternEvaluator, PHASES, WEIGHTS_PER_PHASE
+from test_positions import POSITION_CLASSES, start_position, random_move
+
+
+def game_positions(position_class, seed):
+    """
+    Every position of a random game, reached with make_move as in the search.
+    """
+    rng = random.Random(seed)
+    positions = [start_position(position_class)]
+    while True:
+        move = random_move(positions[-1], rng)
+        if move is None:
+            return positions
+        positions.append(positions[-1].make_move(move))
+
+
+def tuned_advanced_weights(path, rng):
+    with open(path, 'w') as file:
+        json.dump({'evaluator': 'AdvancedEvaluator',
+                   'positional': [rng.randint(-50, 50) for _ in range(3 * 64)],
+                   'phase_weights': [rng.randint(0, 30) for _ in range(3 * 5)]}, file)
+    return str(path)
+
+
+def evaluators(tmp_path):
+    rng = random.Random(1010)
+    return [CountingEvaluator(), AdvancedEvaluator(),
+            AdvancedEvaluator(tuned_advanced_weights(tmp_path / 'weights.json', rng)), PatternEvaluator(),
+            PatternEvaluator(np.random.default_rng(1010).integers(-500, 500, (PHASES, WEIGHTS_PER_PHASE)))]
+
+
+@pytest.mark.parametrize('position_class', POSITION_CLASSES)
+def test_batch_matches_single_evaluations(position_class, tmp_path):
+    """
+    evaluate_batch must give every position the score evaluate gives it, in the same order.
+    """
+    positions = [position for seed in range(4) for position in game_positions(position_class, seed)]
+    for evaluator in evaluators(tmp_path):
+        scores = evaluator.evaluate_batch(positions)
+        assert scores.shape == (len(positions),)
+        assert scores.tolist() == [evaluator.evaluate(position) for position in positions]
+        assert evaluator.evaluate_batch(positions[:1]).tolist() == [evaluator.evaluate(positions[0])]
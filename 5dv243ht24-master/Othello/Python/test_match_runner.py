@@ -0,0 +1,23 @@
+import pytest
+from AlphaBeta import AlphaBeta
+from MatchRunner import EngineSpec
+
+
+def test_depth_is_only_capped_when_given():
+    engine = EngineSpec.parse('evaluator=advanced')
+    assert (engine.name, engine.depth) == ('advanced', AlphaBeta.MAX_SEARCH_DEPTH)
+    engine = EngineSpec.parse('evaluator=advanced,depth=4')
+    assert (engine.name, engine.depth) == ('advanced-d4', 4)
+
+
+def test_command_runs_to_the_end_of_the_spec():
+    engine = EngineSpec.parse('name=old,command=./othello.sh {position} {time} 0,1')
+    assert (engine.name, engine.command) == ('old', './othello.sh {position} {time} 0,1')
+    assert EngineSpec.parse('command=../test_code/othello_naive').name == 'othello_naive'
+
+
+def test_unknown_options_are_rejected():
+    with pytest.raises(ValueError):
+        EngineSpec.parse('evaluator=advanced,speed=3')
+    with pytest.raises(ValueError):
+        EngineSpec.parse('engine=alphabeta,probcut=probcut.json')
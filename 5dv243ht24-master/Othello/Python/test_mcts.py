@@ -0,0 +1,35 @@
+import random
+import time
+from MCTS import MCTS
+from OthelloAction import OthelloAction
+from OthelloPosition import OthelloPosition
+from MatchRunner import random_opening
+
+
+def legal(position, move_string):
+    moves = position.get_moves()
+    if not moves:
+        return move_string == "pass"
+    return move_string in {f"({move.row},{move.col})" for move in moves}
+
+
+def test_answers_within_the_time_limit():
+    engine = MCTS(seed=1)
+    for seed, time_limit in enumerate([0.0, 0.02, 0.1, 0.3, 0.02]):
+        position = random_opening(6 + seed, seed)[0]
+        start_time = time.monotonic()
+        move = engine.evaluate(position, time_limit)
+        assert time.monotonic() - start_time < time_limit + 0.01
+        assert legal(position, move)
+
+
+def test_finished_game_searched_twice():
+    rng = random.Random(3)
+    position = OthelloPosition()
+    position.initialize()
+    while not position.is_game_over():
+        moves = position.get_moves()
+        position = position.make_move(rng.choice(moves) if moves else OthelloAction(0, 0, is_pass_move=True))
+    engine = MCTS(seed=1)
+    assert engine.evaluate(position.clone(), 0.1) == "pass"
+    assert engine.evaluate(position.clone(), 0.1) == "pass"
@@ -0,0 +1,24 @@
+import random
+from OthelloAction import OthelloAction
+from OthelloPosition import OthelloPosition
+from ParallelAlphaBeta import ParallelAlphaBeta
+
+
+def test_helpers_search_every_move():
+    """
+    The helpers must start afresh on every move: timings left over from earlier moves must not keep them from
+    starting their iterations.
+    """
+    rng = random.Random(7)
+    position = OthelloPosition()
+    position.initialize()
+    engine = ParallelAlphaBeta(workers=3)
+    try:
+        for _ in range(6):
+            move = OthelloAction.from_string(engine.evaluate(position, 1))
+            assert len(engine.helper_depths) == 2 and min(engine.helper_depths) > 0
+            position = position.make_move(move)
+            moves = position.get_moves()
+            position = position.make_move(rng.choice(moves) if moves else OthelloAction(0, 0, is_pass_move=True))
+    finally:
+        engine.close()
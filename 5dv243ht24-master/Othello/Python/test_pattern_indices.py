@@ -0,0 +1,54 @@
+import random
+import numpy as np
+import pytest
+from PatternEvaluator import (compute_indices, update_indices, indices_array, INSTANCES, INSTANCE_OFFSETS, EMPTY,
+                              WHITE, BLACK)
+from test_positions import POSITION_CLASSES, start_position, random_move
+
+
+def read_indices(position):
+    return position.derived('patterns', compute_indices, update_indices)
+
+
+def square_digits(white, black, indices):
+    """
+    The squares of every pattern instance, read back from its index as base-3 digits.
+    """
+    for (_, squares), index, offset in zip(INSTANCES, indices, INSTANCE_OFFSETS):
+        index -= offset
+        for square in squares:
+            expected = WHITE if white >> square & 1 else BLACK if black >> square & 1 else EMPTY
+            assert index % 3 == expected
+            index //= 3
+        assert index == 0
+
+
+@pytest.mark.parametrize('position_class', POSITION_CLASSES)
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_indices_match_computed(position_class, seed):
+    """
+    The indices a position keeps through apply_move, undo_move and make_move, read now and then so that some
+    reads replay several moves, must be those computed from scratch.
+    """
+    rng = random.Random(seed)
+    position = start_position(position_class)
+    depth = 0
+    for _ in range(150):
+        if rng.random() < 0.4:
+            white, black = position.get_bitboards()
+            indices = read_indices(position)
+            assert indices == compute_indices(white, black)
+            square_digits(white, black, indices)
+            assert indices_array(np.array([white], dtype=np.uint64),
+                                 np.array([black], dtype=np.uint64)).tolist() == [indices]
+        move = random_move(position, rng)
+        if depth and (move is None or rng.random() < 0.2):
+            position.undo_move()
+            depth -= 1
+            continue
+        if move is None:
+            break
+        child = position.make_move(move)
+        assert read_indices(child) == compute_indices(*child.get_bitboards())
+        position.apply_move(move)
+        depth += 1
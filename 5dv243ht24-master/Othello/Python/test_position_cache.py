@@ -0,0 +1,38 @@
+import random
+import pytest
+from test_positions import POSITION_CLASSES, start_position, move_keys, random_move
+
+
+def derived_values(position):
+    """
+    Everything a position caches, read through the cache.
+    """
+    return (move_keys(position.get_moves()), position.get_moves_mask(True), position.get_moves_mask(False),
+            position.mobility(), position.disc_counts(), position.is_game_over())
+
+
+@pytest.mark.parametrize('position_class', POSITION_CLASSES)
+def test_derived_values_follow_moves(position_class):
+    """
+    The cached moves, mobility, disc counts and game end must match a fresh position from the board string
+    after every apply_move, undo_move, make_move and clone.
+    """
+    rng = random.Random(2243)
+    for _ in range(10):
+        position = start_position(position_class)
+        depth = 0
+        while True:
+            derived = derived_values(position)
+            assert derived == derived_values(position_class(position.get_board_string()))
+            assert derived == derived_values(position.clone())
+            move = random_move(position, rng)
+            if move is None:
+                break
+            assert derived_values(position.make_move(move)) == derived_values(
+                position_class(position.make_move(move).get_board_string()))
+            if depth and rng.random() < 0.25:
+                position.undo_move()
+                depth -= 1
+            else:
+                position.apply_move(move)
+                depth += 1
@@ -0,0 +1,85 @@
+import json
+import numpy as np
+import pytest
+from OthelloAction import OthelloAction
+from AlphaBeta import AlphaBeta
+from TranspositionTable import decode_move, NO_MOVE
+from Benchmark import reference_positions
+from MatchRunner import random_opening
+from PositionDataset import (PositionDataset, PositionWriter, POSITION_DTYPE, HAS_SCORE, HAS_RESULT, HAS_GAME,
+                             from_strings, to_strings, to_position, encode_positions, encode_games, read_games)
+from test_positions import POSITION_CLASSES
+
+
+def random_game(seed):
+    """
+    A game as MatchRunner writes it, of random moves to the end.
+    """
+    position, moves = random_opening(60, seed)
+    white_discs, black_discs = position.disc_counts()
+    return {'moves': moves, 'result': white_discs - black_discs, 'forfeit': None}
+
+
+@pytest.mark.parametrize('position_class', POSITION_CLASSES)
+def test_board_strings_round_trip(position_class):
+    boards = reference_positions(30)
+    records = from_strings(boards)
+    assert records.dtype == POSITION_DTYPE
+    assert to_strings(records).tolist() == boards
+    assert [to_position(record).get_board_string() for record in records] == boards
+    assert (records['move'] == NO_MOVE).all() and (records['flags'] == 0).all()
+
+    encoded = encode_positions([position_class(board) for board in boards])
+    assert encoded.tobytes() == records.tobytes()
+    assert len(from_strings([])) == 0
+    for bad in ['W' + 'E' * 63, 'W' + 'E' * 63 + 'Q', 'Q' + 'E' * 64]:
+        with pytest.raises(ValueError):
+            from_strings([bad])
+
+
+def test_writer_and_dataset_round_trip(tmp_path):
+    boards = reference_positions(30)
+    records = encode_positions([position_class(board) for board in boards for position_class in POSITION_CLASSES],
+                               scores=list(range(60)), game=7)
+    path = str(tmp_path / 'positions.npy')
+    with PositionWriter(path) as writer:
+        writer.write(records[:25])
+        writer.write(records[25:])
+        with pytest.raises(ValueError):
+            writer.write(np.zeros(1, dtype=np.int64))
+    assert writer.count == 60
+
+    dataset = PositionDataset(path)
+    assert len(dataset) == 60
+    assert dataset.records.tobytes() == records.tobytes()
+    assert np.concatenate(list(dataset.chunks(size=16, start=5, stop=50))).tobytes() == records[5:50].tobytes()
+    assert dataset.position(3).get_board_string() == boards[1]
+    assert (records['flags'] == HAS_SCORE | HAS_GAME).all()
+
+    with PositionWriter(str(tmp_path / 'empty.npy')):
+        pass
+    assert len(PositionDataset(str(tmp_path / 'empty.npy'))) == 0
+
+
+def test_games_round_trip(tmp_path):
+    """
+    The records of a game are the positions it went through, with the move played from each, the result and
+    the game id. Forfeited games are left out but keep their id.
+    """
+    games = [random_game(seed) for seed in range(4)]
+    games[1]['forfeit'] = {'side': 'white'}
+    path = tmp_path / 'games.jsonl'
+    path.write_text(''.join(json.dumps(game) + '\n' for game in games))
+
+    encoded = list(encode_games(read_games(str(path)), first_game=10))
+    assert len(encoded) == 3
+    for records, game_id, game in zip(encoded, [10, 12, 13], [games[0], games[2], games[3]]):
+        position, _ = random_opening(0, 0)
+        assert len(records) == len(game['moves'])
+        for record, move in zip(records, game['moves']):
+            assert to_position(record).get_board_string() == position.get_board_string()
+            assert AlphaBeta.move_string(decode_move(record['move'])) == move
+            position = position.make_move(OthelloAction.from_string(move))
+        assert position.is_game_over()
+        assert (records['result'] == game['result']).all() and (records['game'] == game_id).all()
+        assert (records['flags'] == HAS_RESULT | HAS_GAME).all()
@@ -0,0 +1,69 @@
+import random
+import pytest
+from OthelloAction import OthelloAction
+from OthelloPosition import OthelloPosition
+from BitboardPosition import BitboardPosition
+from Benchmark import perft, PERFT_START
+
+POSITION_CLASSES = [OthelloPosition, BitboardPosition]
+PASS = OthelloAction(0, 0, is_pass_move=True)
+
+
+def start_position(position_class):
+    position = position_class()
+    position.initialize()
+    return position
+
+
+def move_keys(moves):
+    return sorted((move.is_pass_move, move.row, move.col) for move in moves)
+
+
+def random_move(position, rng):
+    """
+    A random legal move, a pass if there is none. None when the game is over.
+    """
+    if position.is_game_over():
+        return None
+    moves = position.get_moves()
+    return rng.choice(moves) if moves else PASS
+
+
+@pytest.mark.parametrize('position_class', POSITION_CLASSES)
+def test_perft_matches_known_counts(position_class):
+    for depth in range(1, 6):
+        assert perft(start_position(position_class), depth) == PERFT_START[depth]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_walks_agree(seed):
+    """
+    Both position classes play the same random game with apply_move, taking moves back now and then, and must
+    agree on the board, the Zobrist key and the legal moves at every step.
+    """
+    rng = random.Random(seed)
+    positions = [start_position(position_class) for position_class in POSITION_CLASSES]
+    history = []
+    for _ in range(200):
+        board, key = positions[0].get_board_string(), positions[0].zobrist_key
+        for position in positions:
+            assert position.get_board_string() == board
+            assert position.zobrist_key == key == position.compute_zobrist_key()
+        assert move_keys(positions[0].get_moves()) == move_keys(positions[1].get_moves())
+
+        if history and (rng.random() < 0.2 or positions[0].is_game_over()):
+            for _ in range(rng.randint(1, len(history))):
+                board, key = history.pop()
+                for position in positions:
+                    position.undo_move()
+                    assert (position.get_board_string(), position.zobrist_key) == (board, key)
+            continue
+        move = random_move(positions[0], rng)
+        if move is None:
+            break
+        history.append((board, key))
+        for position in positions:
+            made = position.make_move(move)
+            position.apply_move(move)
+            assert (made.get_board_string(), made.zobrist_key) == (position.get_board_string(),
+                                                                   position.zobrist_key)
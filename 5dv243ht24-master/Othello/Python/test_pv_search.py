@@ -0,0 +1,50 @@
+import pytest
+from PVSearch import PVSearch
+from CountingEvaluator import AdvancedEvaluator
+from Benchmark import reference_positions
+from test_positions import POSITION_CLASSES
+
+INFINITY = float('inf')
+
+
+def negamax(position, depth, evaluate):
+    """
+    The score from the side to move of a full-width search without pruning or tables. Leaves are scored as in
+    PVSearch.leaf_score: with the evaluator near the horizon, by disc count when the game ends earlier.
+    """
+    if depth == 0 or position.is_game_over():
+        if depth > 2:
+            white_discs, black_discs = position.disc_counts()
+            score = white_discs - black_discs
+        else:
+            score = int(evaluate(position))
+        return score if position.maxPlayer else -score
+    return max(-negamax(position.make_move(move), depth - 1, evaluate) for move in position.get_moves())
+
+
+def new_engine(canonical_keys):
+    engine = PVSearch(evaluator=AdvancedEvaluator(), tt_size_mb=1)
+    engine.canonical_keys = canonical_keys
+    engine.new_search()
+    engine.start_clock(3600)
+    return engine
+
+
+@pytest.mark.parametrize('position_class', POSITION_CLASSES)
+@pytest.mark.parametrize('canonical_keys', [False, True])
+def test_pvs_matches_negamax(position_class, canonical_keys):
+    """
+    From the full window pvs returns the negamax score, with a principal variation whose first move has that
+    score. Null windows below and above the score fail on the right side.
+    """
+    evaluate = AdvancedEvaluator().evaluate
+    for board in reference_positions(8):
+        for depth in range(1, 4):
+            expected = negamax(position_class(board), depth, evaluate)
+            engine = new_engine(canonical_keys)
+            position = position_class(board)
+            assert engine.pvs(position, depth, -INFINITY, INFINITY, 0) == expected
+            assert position.get_board_string() == board
+            assert -negamax(position.make_move(engine.pv_lines[0][0]), depth - 1, evaluate) == expected
+            assert new_engine(canonical_keys).pvs(position, depth, expected - 1, expected, 0) >= expected
+            assert new_engine(canonical_keys).pvs(position, depth, expected, expected + 1, 0) <= expected
@@ -0,0 +1,68 @@
+import pytest
+import Symmetry
+from OthelloAction import OthelloAction
+from Benchmark import reference_positions
+from test_positions import POSITION_CLASSES, move_keys
+
+PASS = OthelloAction(0, 0, is_pass_move=True)
+
+
+def transform_board(board, symmetry):
+    """
+    Apply a symmetry to a board string.
+    """
+    cells = [None] * 64
+    for square, cell in enumerate(board[1:]):
+        cells[Symmetry.SQUARE_MAPS[symmetry][square]] = cell
+    return board[0] + ''.join(cells)
+
+
+def action_key(action):
+    return action.is_pass_move, action.row, action.col
+
+
+def test_square_maps_are_symmetries():
+    """
+    Every map is a permutation keeping neighbouring squares neighbours, the maps are all different and each
+    is undone by its inverse.
+    """
+    assert len({tuple(squares) for squares in Symmetry.SQUARE_MAPS}) == 8
+    assert Symmetry.SQUARE_MAPS[0] == list(range(64))
+    for symmetry in Symmetry.SYMMETRIES:
+        squares = Symmetry.SQUARE_MAPS[symmetry]
+        assert sorted(squares) == list(range(64))
+        for a in range(64):
+            for b in range(64):
+                distance = max(abs(a // 8 - b // 8), abs(a % 8 - b % 8))
+                mapped = max(abs(squares[a] // 8 - squares[b] // 8), abs(squares[a] % 8 - squares[b] % 8))
+                assert distance == mapped
+            assert Symmetry.SQUARE_MAPS[Symmetry.INVERSE[symmetry]][squares[a]] == a
+        for square in (64, 255):
+            assert Symmetry.transform_square(square, symmetry) == square
+
+
+@pytest.mark.parametrize('position_class', POSITION_CLASSES)
+def test_symmetric_positions_share_canonical_key(position_class):
+    """
+    All orientations of a position have its canonical key, their moves are its moves mapped through the
+    symmetry, and moves of the canonical orientation map back to the moves of each orientation.
+    """
+    for board in reference_positions(40):
+        position = position_class(board)
+        white, black = position.get_bitboards()
+        key = position.canonical_key()[0]
+        moves = position.get_moves()
+        for symmetry in Symmetry.SYMMETRIES:
+            symmetric = position_class(transform_board(board, symmetry))
+            assert symmetric.get_bitboards() == (Symmetry.transform(white, symmetry),
+                                                 Symmetry.transform(black, symmetry))
+            assert move_keys(symmetric.get_moves()) == move_keys(
+                [Symmetry.transform_action(move, symmetry) for move in moves])
+
+            symmetric_key, to_canonical = symmetric.canonical_key()
+            assert symmetric_key == key
+            for move in symmetric.get_moves():
+                canonical_move = Symmetry.transform_action(move, to_canonical)
+                assert action_key(Symmetry.from_canonical(canonical_move, to_canonical)) == action_key(move)
+        assert Symmetry.transform_action(PASS, 5) is PASS
+        assert Symmetry.transform_action(None, 5) is None
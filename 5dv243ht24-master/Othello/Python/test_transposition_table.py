@@ -0,0 +1,40 @@
+import random
+import pytest
+from OthelloAction import OthelloAction
+from TranspositionTable import TranspositionTable, EXACT, LOWER, UPPER, SCORE_OFFSET, encode_move, decode_move
+
+PASS = OthelloAction(0, 0, is_pass_move=True)
+
+
+def test_move_codes_round_trip():
+    for move in [None, PASS] + [OthelloAction(row, col) for row in range(1, 9) for col in range(1, 9)]:
+        decoded = decode_move(encode_move(move))
+        assert (None if decoded is None else (decoded.is_pass_move, decoded.row, decoded.col)) == \
+            (None if move is None else (move.is_pass_move, move.row, move.col))
+
+
+@pytest.mark.parametrize('buffer', [False, True])
+def test_transposition_table_round_trip(buffer):
+    """
+    Every field of an entry comes back as it was stored, in a table of its own or in a caller's buffer.
+    """
+    size_mb = 1
+    table = TranspositionTable(size_mb, buffer=bytearray(TranspositionTable.memory_size(size_mb)) if buffer else None)
+    rng = random.Random(7)
+    moves = [None, PASS] + [OthelloAction(row, col) for row in range(1, 9) for col in range(1, 9)]
+    for score in [0, 1, -1, 64, -64, 123456, -123456, SCORE_OFFSET - 1, -SCORE_OFFSET + 1]:
+        for bound in (EXACT, LOWER, UPPER):
+            key = rng.getrandbits(64)
+            depth = rng.randint(0, 255)
+            move = rng.choice(moves)
+            table.store(key, depth, score, bound, move)
+            cached_score, cached_depth, cached_move, cached_bound = table.probe(key)
+            assert (cached_score, cached_depth, cached_bound) == (score, depth, bound)
+            assert (None if cached_move is None else (cached_move.is_pass_move, cached_move.row, cached_move.col)) \
+                == (None if move is None else (move.is_pass_move, move.row, move.col))
+            # Another key of the same bucket must not find the entry
+            assert table.probe(key ^ (1 << 63)) is None
+
+    key = rng.getrandbits(64)
+    table.store(key, 300, 10 ** 12, EXACT, None)  # Out of range depth and score are clamped
+    assert table.probe(key)[:2] == (SCORE_OFFSET - 1, 255)